@@ -4,7 +4,7 @@ from django.urls import reverse_lazy
 from django.shortcuts import redirect
 from django.contrib import messages
 from django.db.models import Sum, Count
-from excel_processor.models import ExcelProcess, PDFProcessHistory, RegistroExcel
+from excel_processor.models import ExcelProcess, PDFBatch, RegistroExcel
 from production_sheets.models import ProductionSheet, ProductionDetail
 
 class AdminViewMixin(UserPassesTestMixin):
@@ -19,7 +19,7 @@ class AdminHomeView(AdminViewMixin, TemplateView):
         # Estadísticas generales
         context['stats'] = {
             'excel_processes': ExcelProcess.objects.count(),
-            'pdf_processes': PDFProcessHistory.objects.count(),
+            'pdf_processes': PDFBatch.objects.count(),
             'production_sheets': ProductionSheet.objects.count(),
             'production_details': ProductionDetail.objects.count(),
             'registros_excel': RegistroExcel.objects.count(),
@@ -104,16 +104,16 @@ class RegistroExcelDeleteView(AdminViewMixin, DeleteView):
         messages.success(request, f'Registro Excel eliminado correctamente.')
         return redirect(success_url)
 
-# Vistas para PDFProcessHistory
+# Vistas para PDFBatch (PDFs combinados)
 class PDFProcessListView(AdminViewMixin, ListView):
-    model = PDFProcessHistory
+    model = PDFBatch
     template_name = 'admin/pdf_process_list.html'
     context_object_name = 'pdfs'
     ordering = ['-process_date']
     paginate_by = 100
 
 class PDFProcessDeleteView(AdminViewMixin, DeleteView):
-    model = PDFProcessHistory
+    model = PDFBatch
     template_name = 'admin/confirm_delete.html'
     success_url = reverse_lazy('custom_admin:pdf_process_list')
 
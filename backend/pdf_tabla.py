@@ -0,0 +1,243 @@
+"""
+Tablas grandes en PDF dibujadas directamente sobre el canvas de ReportLab.
+
+Los reportes (histórico de cálculos, planillas de producción) usaban una sola
+Table de platypus con todas las filas: platypus mide cada celda y vuelve a
+partir la tabla en cada página, así que el tiempo crece más que la cantidad de
+filas y el documento completo vive en memoria. TablaPDF fija los anchos de las
+columnas con una muestra de las primeras filas (y el valor más largo de cada
+columna, si quien llama lo conoce) y dibuja página por página, con un objeto de
+texto y un trazo por página; el tiempo es proporcional a las filas.
+
+    tabla = TablaPDF(salida, ['Referencia', 'Talla', ...])
+    tabla.agregar_filas(filas)  # cualquier iterable, se puede llamar varias veces
+    tabla.cerrar()
+"""
+from itertools import chain, islice
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import letter
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from reportlab.pdfgen import canvas
+
+# Filas usadas para calcular el ancho de las columnas
+MUESTRA_ANCHOS = 500
+
+# Espacio entre el texto y los bordes de la celda (los mismos de platypus)
+PADDING = 6
+PADDING_VERTICAL = 3
+
+# Textos distintos cuyo ancho se recuerda; en los reportes se repiten mucho
+# (tallas, cantidades, fechas) y medir cada celda es lo más costoso del dibujo
+MAX_ANCHOS_GUARDADOS = 50000
+
+
+class TablaPDF:
+    """
+    Tabla con encabezado repetido en cada página y fila de pie opcional.
+
+    El encabezado y el pie van en negrita sobre fondo gris con texto claro; las
+    filas en Helvetica, centradas y con cuadrícula, igual que el estilo que
+    usaban los reportes con platypus. Los textos que no caben en su columna se
+    dibujan con letra más pequeña, nunca se recortan. `al_iniciar_pagina(canvas)`
+    se llama en cada página antes de la tabla (títulos, fechas). `anchos` fija el
+    ancho de cada columna; si no se indica se calcula con el encabezado, el pie,
+    las primeras MUESTRA_ANCHOS filas y `mas_largos` (el valor más largo de cada
+    columna en todas las filas, o None si no se conoce), reduciéndolo si no cabe
+    en la página.
+    """
+
+    fuente = 'Helvetica'
+    fuente_negrita = 'Helvetica-Bold'
+    color_fondo = colors.grey
+    color_texto_encabezado = colors.whitesmoke
+
+    def __init__(self, salida, encabezados, pagesize=letter, margenes=(72, 72, 72, 72), anchos=None,
+                 pie=None, al_iniciar_pagina=None, tamano_texto=10, tamano_encabezado=12, mas_largos=None):
+        """margenes es (izquierdo, derecho, superior, inferior) en puntos."""
+        self.encabezados = [str(valor) for valor in encabezados]
+        self.pie = [str(valor) for valor in pie] if pie is not None else None
+        self.ancho_pagina, self.alto_pagina = pagesize
+        self.margen_izq, self.margen_der, self.margen_sup, self.margen_inf = margenes
+        self.anchos = list(anchos) if anchos else None
+        self.mas_largos = ['' if valor is None else valor for valor in mas_largos] if mas_largos else None
+        self.al_iniciar_pagina = al_iniciar_pagina
+        self.tamano_texto = tamano_texto
+        self.tamano_encabezado = tamano_encabezado
+        # Alto de fila como en platypus: interlineado de 1.2 veces la fuente más el padding
+        self.alto_fila = tamano_texto * 1.2 + 2 * PADDING_VERTICAL
+        self.alto_encabezado = tamano_encabezado * 1.2 + PADDING_VERTICAL + 12
+        self.c = canvas.Canvas(salida, pagesize=pagesize, pageCompression=1)
+        self.bordes = None
+        self.anchos_texto = {}
+        self.paginas = 0
+        self.filas = 0
+        self.pagina_abierta = False
+
+    # --- Anchos de columna ---------------------------------------------------
+
+    def _calcular_anchos(self, muestra):
+        """
+        Ancho de cada columna: el de su contenido más largo. Si la tabla no cabe, las
+        filas conservan su ancho y el espacio que sobra se reparte entre los
+        encabezados que no caben (su letra se reduce, ver _fila_destacada); solo
+        si ni las filas caben se reducen todas las columnas y la letra de los
+        textos que ya no caben (ver _ajustar).
+        """
+        destacadas = [self.encabezados] + ([self.pie] if self.pie else [])
+        cabecera = [
+            max(stringWidth(fila[i], self.fuente_negrita, self.tamano_encabezado) for fila in destacadas) + 2 * PADDING
+            for i in range(len(self.encabezados))
+        ]
+        cuerpo = [2 * PADDING] * len(cabecera)
+        for fila in muestra:
+            for i, valor in enumerate(fila[:len(cuerpo)]):
+                ancho = stringWidth(str(valor), self.fuente, self.tamano_texto) + 2 * PADDING
+                if ancho > cuerpo[i]:
+                    cuerpo[i] = ancho
+        natural = [max(a, b) for a, b in zip(cabecera, cuerpo)]
+        disponible = self.ancho_pagina - self.margen_izq - self.margen_der
+        if sum(natural) <= disponible:
+            return natural
+        if sum(cuerpo) >= disponible:
+            return [ancho * disponible / sum(cuerpo) for ancho in cuerpo]
+        faltantes = [max(0, a - b) for a, b in zip(cabecera, cuerpo)]
+        sobrante = disponible - sum(cuerpo)
+        return [ancho + faltante * sobrante / sum(faltantes) for ancho, faltante in zip(cuerpo, faltantes)]
+
+    def _preparar_columnas(self, muestra=()):
+        if self.anchos is None:
+            self.anchos = self._calcular_anchos(chain(muestra, [self.mas_largos] if self.mas_largos else []))
+        disponible = self.ancho_pagina - self.margen_izq - self.margen_der
+        # La tabla va centrada entre los márgenes, como en SimpleDocTemplate
+        x = self.margen_izq + max(0, disponible - sum(self.anchos)) / 2
+        self.bordes = [x]
+        for ancho in self.anchos:
+            self.bordes.append(self.bordes[-1] + ancho)
+        self.centros = [x + ancho / 2 for x, ancho in zip(self.bordes, self.anchos)]
+        self.maximos = [ancho - 2 * PADDING for ancho in self.anchos]
+
+    def _ajustar(self, ancho, i, tamano):
+        """
+        Tamaño de letra con el que un texto de `ancho` (medido con `tamano`) cabe
+        en la columna i, y su ancho con ese tamaño. El texto siempre se dibuja completo.
+        """
+        if ancho <= self.maximos[i]:
+            return tamano, ancho
+        escala = max(self.maximos[i], 0) / ancho
+        return tamano * escala, ancho * escala
+
+    # --- Páginas ---------------------------------------------------------------
+
+    def _fila_destacada(self, valores, y_superior):
+        """Dibuja una fila en negrita sobre fondo gris (encabezado o pie) y retorna su borde inferior."""
+        c = self.c
+        y_inferior = y_superior - self.alto_encabezado
+        c.setFillColor(self.color_fondo)
+        c.rect(self.bordes[0], y_inferior, self.bordes[-1] - self.bordes[0], self.alto_encabezado, stroke=0, fill=1)
+        c.setFillColor(self.color_texto_encabezado)
+        base = y_inferior + 12 + self.tamano_encabezado * 0.2
+        for i, valor in enumerate(valores[:len(self.anchos)]):
+            # Si el texto no cabe se reduce la letra en lugar de cortarlo
+            tamano, ancho = self._ajustar(stringWidth(valor, self.fuente_negrita, self.tamano_encabezado), i,
+                                          self.tamano_encabezado)
+            c.setFont(self.fuente_negrita, tamano)
+            c.drawString(self.centros[i] - ancho / 2, base, valor)
+        c.setFillColor(colors.black)
+        return y_inferior
+
+    def _iniciar_pagina(self):
+        c = self.c
+        if self.al_iniciar_pagina:
+            c.saveState()
+            self.al_iniciar_pagina(c)
+            c.restoreState()
+        self.y_tabla = self.alto_pagina - self.margen_sup
+        self.y = self._fila_destacada(self.encabezados, self.y_tabla)
+        self.texto = c.beginText()
+        self.texto.setFont(self.fuente, self.tamano_texto)
+        self.texto.setFillColor(colors.black)
+        self.lineas = c.beginPath()
+        self.lineas.moveTo(self.bordes[0], self.y)
+        self.lineas.lineTo(self.bordes[-1], self.y)
+        self.pagina_abierta = True
+        self.paginas += 1
+
+    def _terminar_pagina(self):
+        """Dibuja de una vez el texto y la cuadrícula de la página."""
+        c = self.c
+        c.drawText(self.texto)
+        for x in self.bordes:
+            self.lineas.moveTo(x, self.y_tabla)
+            self.lineas.lineTo(x, self.y)
+        self.lineas.moveTo(self.bordes[0], self.y_tabla)
+        self.lineas.lineTo(self.bordes[-1], self.y_tabla)
+        c.setLineWidth(1)
+        c.setStrokeColor(colors.black)
+        c.drawPath(self.lineas, stroke=1, fill=0)
+        self.pagina_abierta = False
+
+    def agregar_filas(self, filas):
+        """Dibuja las filas (iterables de valores, uno por columna), pasando de página cuando se llena."""
+        filas = iter(filas)
+        if self.bordes is None:
+            muestra = list(islice(filas, MUESTRA_ANCHOS))
+            self._preparar_columnas(muestra)
+            filas = chain(muestra, filas)
+        if not self.pagina_abierta:
+            self._iniciar_pagina()
+        fuente, tamano = self.fuente, self.tamano_texto
+        centros, maximos = self.centros, self.maximos
+        anchos = self.anchos_texto
+        izquierda, derecha = self.bordes[0], self.bordes[-1]
+        alto = self.alto_fila
+        desplazamiento = PADDING_VERTICAL + tamano * 0.2  # Base del texto sobre el borde inferior
+        limite = self.margen_inf + alto
+        for fila in filas:
+            if self.y < limite:
+                self._terminar_pagina()
+                self.c.showPage()
+                self._iniciar_pagina()
+            y = self.y - alto
+            texto = self.texto
+            for i, valor in enumerate(fila):
+                valor = str(valor)
+                if not valor:
+                    continue
+                ancho = anchos.get(valor)
+                if ancho is None:
+                    ancho = stringWidth(valor, fuente, tamano)
+                    if len(anchos) < MAX_ANCHOS_GUARDADOS:
+                        anchos[valor] = ancho
+                # textLine no vuelve a medir el texto como textOut; cada celda fija su origen
+                if ancho > maximos[i]:
+                    # No cabe en la columna: se dibuja completo con letra más pequeña
+                    reducido, ancho = self._ajustar(ancho, i, tamano)
+                    texto.setFont(fuente, reducido)
+                    texto.setTextOrigin(centros[i] - ancho / 2, y + desplazamiento)
+                    texto.textLine(valor)
+                    texto.setFont(fuente, tamano)
+                    continue
+                texto.setTextOrigin(centros[i] - ancho / 2, y + desplazamiento)
+                texto.textLine(valor)
+            self.lineas.moveTo(izquierda, y)
+            self.lineas.lineTo(derecha, y)
+            self.y = y
+            self.filas += 1
+
+    def cerrar(self):
+        """Dibuja el pie, termina el documento y lo guarda en la salida."""
+        if self.bordes is None:
+            self._preparar_columnas()
+        if not self.pagina_abierta:
+            self._iniciar_pagina()
+        if self.pie:
+            if self.y - self.alto_encabezado < self.margen_inf:
+                self._terminar_pagina()
+                self.c.showPage()
+                self._iniciar_pagina()
+            y_superior = self.y
+            self.y = self._fila_destacada(self.pie, y_superior)
+            self.lineas.moveTo(self.bordes[0], self.y)
+            self.lineas.lineTo(self.bordes[-1], self.y)
+        self._terminar_pagina()
+        self.c.save()
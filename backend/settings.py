@@ -66,6 +66,9 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Base de pruebas en archivo y no en memoria: las pruebas de concurrencia
+        # usan una conexión por hilo, como las solicitudes reales
+        'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
     }
 }
 
@@ -105,11 +108,11 @@ MEDIA_ROOT = BASE_DIR / 'media'
 
 # Configuración para subida de archivos grandes
 DATA_UPLOAD_MAX_MEMORY_SIZE = 1073741824  # 1GB
-FILE_UPLOAD_MAX_MEMORY_SIZE = 1073741824  # 1GB
 DATA_UPLOAD_MAX_NUMBER_FILES = 1000  # Permitir hasta 1000 archivos
 FILE_UPLOAD_PERMISSIONS = 0o644
 FILE_UPLOAD_DIRECTORY_PERMISSIONS = 0o755
 FILE_UPLOAD_HANDLERS = [
+    'excel_processor.upload_handlers.HashingUploadHandler',  # SHA-256 durante la subida
     'django.core.files.uploadhandler.MemoryFileUploadHandler',
     'django.core.files.uploadhandler.TemporaryFileUploadHandler',
 ]
@@ -120,7 +123,54 @@ DATA_UPLOAD_MAX_NUMBER_FIELDS = 10240
 
 # Configuraciones adicionales para archivos grandes
 FILE_UPLOAD_TEMP_DIR = None  # Usar el directorio temporal del sistema
-FILE_UPLOAD_MAX_MEMORY_SIZE = 524288000  # 500MB
+# Los archivos subidos de más de 2.5MB se reciben en un archivo temporal, no en memoria
+FILE_UPLOAD_MAX_MEMORY_SIZE = 2621440
+
+# Ingesta de planillas Excel en modo streaming (read_only, por bloques de filas)
+EXCEL_INGEST_STREAMING = False
+EXCEL_STREAMING_CHUNK_SIZE = 1000
+# Modo delta por defecto: solo guardar filas nuevas o cambiadas respecto a la
+# carga anterior del mismo archivo (se puede pedir por carga con delta=1)
+EXCEL_INGEST_DELTA = False
+
+# Reparto de las filas en planillas, una por bodega. Cada fila va a la primera
+# regla cuya columna tenga uno de los valores; la regla sin columna recibe el resto.
+EXCEL_RUTAS_PLANILLAS = [
+    {'bodega': '3_7', 'titulo': 'iny 3/7', 'columna': 'iny', 'valores': [3, 7]},
+    {'bodega': 'otros', 'titulo': 'otros'},
+]
+# Procesos para leer las hojas y dibujar las planillas de una carga en paralelo
+# (None = uno por CPU, 0 = en serie)
+EXCEL_PLANILLAS_PROCESOS = None
+# Las planillas PDF se dibujan al pedirlas y se guardan en una caché en disco;
+# al superar este tamaño se borran las menos usadas
+EXCEL_PLANILLAS_CACHE_MB = 512
+# Máximo de planillas que se pueden reimprimir juntas en un solo PDF
+EXCEL_REIMPRESION_MAX = 1000
+# Procesos para combinar lotes grandes de PDFs subidos (0 = en serie, None = uno por CPU).
+# En serie por defecto; comparar con `python manage.py bench_lotes_pdf` antes de activarlo
+PDF_LOTE_PROCESOS = 0
+# Motor para combinar los lotes de PDFs: 'incremental' (copia los objetos de cada
+# página al archivo a medida que se leen), 'pypdf2' (PdfWriter, todo en memoria) o
+# 'pdfium' (requiere pypdfium2). Comparar con `python manage.py bench_motores_pdf`
+PDF_LOTE_MOTOR = 'incremental'
+# Tamaño máximo de cada PDF de un lote
+PDF_LOTE_MAX_ARCHIVO_MB = 500
+# Subida de PDFs por partes (reanudable): tamaño de cada parte y horas tras las
+# que se borra una subida que dejó de recibir datos
+PDF_SUBIDA_BLOQUE_MB = 8
+PDF_SUBIDA_HORAS = 24
+# Horas que se conservan los archivos abandonados en media/temp_uploads (los borra
+# `python manage.py limpiar_temporales` o el worker de procesar_trabajos)
+PDF_TEMP_RETENCION_HORAS = 1
+# Sincronizar con el disco los PDFs temporales que se combinan en la misma solicitud
+# (los que esperan en la cola de trabajos se sincronizan siempre)
+PDF_TEMP_FSYNC = False
+
+# Cola de trabajos en segundo plano (ejecutar `python manage.py procesar_trabajos`).
+# Si está activo, las cargas se encolan aunque no envíen el parámetro async=1.
+TRABAJOS_EN_SEGUNDO_PLANO = False
+TRABAJOS_TIMEOUT = 3600  # Segundos antes de reintentar un trabajo abandonado
 
 # Configuración para servir archivos en desarrollo
 if DEBUG:
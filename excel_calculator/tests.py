@@ -1,3 +1,25 @@
+import io
+
 from django.test import TestCase
+from django.urls import reverse
+from PyPDF2 import PdfReader
+
+from .models import ResultadoCalculo
+
+
+class HistoricoPDFTests(TestCase):
+    """El PDF del histórico nunca recorta valores, aunque el más largo no esté en las primeras filas."""
 
-# Create your tests here.
+    def test_referencia_larga_despues_de_la_muestra(self):
+        # El PDF va del cálculo más reciente al más antiguo: el más largo queda de último
+        larga = 'REFERENCIA-MUY-LARGA-' * 4
+        ResultadoCalculo.objects.create(referencia=larga, talla='XXL', balance=-123456789)
+        ResultadoCalculo.objects.bulk_create(
+            ResultadoCalculo(referencia=f'R{n}', talla='S', balance=n) for n in range(600)
+        )
+        respuesta = self.client.get(reverse('historico_calculos'), {'export': 'pdf'})
+        self.assertEqual(respuesta.status_code, 200)
+        lector = PdfReader(io.BytesIO(b''.join(respuesta.streaming_content)))
+        texto = ''.join(pagina.extract_text() for pagina in lector.pages)
+        self.assertIn(larga, texto.replace('\n', ''))
+        self.assertIn('-123456789', texto)
@@ -1,15 +1,35 @@
+import tempfile
 from django.shortcuts import render
-from django.http import HttpResponse
+from django.http import FileResponse, HttpResponse
 from django.core.paginator import Paginator
+from django.db.models import Max, Min
+from django.db.models.functions import Length
 from django.contrib import messages
 import openpyxl
 from .models import ResultadoCalculo
 from datetime import datetime
 from io import BytesIO
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle
-from reportlab.lib.units import inch
+from backend.pdf_tabla import TablaPDF
+
+# Columnas numéricas del PDF del histórico, en orden
+COLUMNAS_NUMERICAS = ['ventas', 'inventario', 'produccion', 'total_disponible', 'balance']
+
+def _mas_largos(resultados):
+    """
+    Valor más largo de cada columna del PDF entre todos los resultados, para que
+    TablaPDF calcule los anchos con él y no solo con las primeras filas.
+    """
+    textos = [
+        resultados.annotate(largo=Length(campo)).order_by('-largo').values_list(campo, flat=True).first()
+        for campo in ('referencia', 'talla')
+    ]
+    extremos = resultados.aggregate(**{f'{campo}_{nombre}': funcion(campo) for campo in COLUMNAS_NUMERICAS
+                                       for nombre, funcion in (('min', Min), ('max', Max))})
+    # El número más largo es el mayor o, si es negativo, el menor
+    numeros = [max((str(extremos[f'{campo}_{nombre}']) for nombre in ('min', 'max')
+                    if extremos[f'{campo}_{nombre}'] is not None), key=len, default=None)
+               for campo in COLUMNAS_NUMERICAS]
+    return textos + numeros + [None]
 
 def historico_calculos(request):
     """
@@ -46,55 +66,36 @@ def historico_calculos(request):
         
         # Si se solicita exportar a PDF
         if request.GET.get('export') == 'pdf':
-            buffer = BytesIO()
-            
+            # El PDF se dibuja página por página a un archivo temporal, que se envía por partes
+            salida = tempfile.TemporaryFile()
             try:
-                doc = SimpleDocTemplate(buffer, pagesize=letter)
-                elements = []
-                
-                # Preparar datos para la tabla
-                data = [['Referencia', 'Talla', 'Ventas Pendientes', 'Inventario',
-                         'Producción', 'Total Disponible', 'Balance', 'Fecha Cálculo']]
-                
-                for resultado in resultados:
-                    data.append([
-                        str(resultado.referencia),
-                        str(resultado.talla),
-                        str(resultado.ventas),
-                        str(resultado.inventario),
-                        str(resultado.produccion),
-                        str(resultado.total_disponible),
-                        str(resultado.balance),
+                tabla = TablaPDF(salida, ['Referencia', 'Talla', 'Ventas Pendientes', 'Inventario',
+                                          'Producción', 'Total Disponible', 'Balance', 'Fecha Cálculo'],
+                                 mas_largos=_mas_largos(resultados))
+                tabla.agregar_filas(
+                    [
+                        resultado.referencia,
+                        resultado.talla,
+                        resultado.ventas,
+                        resultado.inventario,
+                        resultado.produccion,
+                        resultado.total_disponible,
+                        resultado.balance,
                         resultado.fecha_calculo.strftime('%Y-%m-%d %H:%M')
-                    ])
-                
-                # Crear tabla
-                table = Table(data)
-                table.setStyle(TableStyle([
-                    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-                    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                    ('FONTSIZE', (0, 0), (-1, 0), 12),
-                    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                    ('TEXTCOLOR', (0, 1), (-1, -1), colors.black),
-                    ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-                    ('FONTSIZE', (0, 1), (-1, -1), 10),
-                    ('GRID', (0, 0), (-1, -1), 1, colors.black),
-                    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-                ]))
-                
-                elements.append(table)
-                doc.build(elements)
-                
-                buffer.seek(0)
-                response = HttpResponse(buffer.getvalue(), content_type='application/pdf')
-                response['Content-Disposition'] = f'attachment; filename=resultados_{datetime.now().strftime("%Y%m%d_%H%M")}.pdf'
-                return response
-                
-            finally:
-                buffer.close()
+                    ]
+                    for resultado in resultados.iterator(chunk_size=2000)
+                )
+                tabla.cerrar()
+            except Exception:
+                salida.close()
+                raise
+            salida.seek(0)
+            return FileResponse(
+                salida,
+                as_attachment=True,
+                filename=f'resultados_{datetime.now().strftime("%Y%m%d_%H%M")}.pdf',
+                content_type='application/pdf'
+            )
         
         # Si se solicita exportar a Excel
         if request.GET.get('export') == 'excel':
@@ -0,0 +1,249 @@
+"""
+Planillas PDF dibujadas bajo demanda, con una caché en disco de tamaño acotado.
+
+Las cargas ya no dibujan las planillas: la primera vez que se pide una planilla
+se dibuja en memoria desde sus RegistroExcel y se guarda en la caché con el
+nombre <consecutivo>_v<version_datos>.pdf. Las siguientes solicitudes leen ese
+archivo. Cuando la caché supera TAMANO_CACHE se borran las planillas usadas
+hace más tiempo (cada lectura actualiza la fecha de modificación del archivo).
+
+Las planillas de las cargas delta se siguen dibujando al cargar, en
+media/planilla_<consecutivo>.pdf: incluyen filas cambiadas que pertenecen a
+planillas anteriores, así que no se pueden reconstruir desde sus registros.
+"""
+import io
+import logging
+import os
+import tempfile
+import time
+from django.conf import settings
+from django.urls import reverse
+from django.utils import timezone
+from .models import ExcelProcess, RegistroExcel
+from .paralelo import mapear
+from .pdf_utils import combinar_en
+from .pdf_planilla import MIN_FILAS_PARALELO, dibujar_pdf, ruta_planilla
+
+# Carpeta de la caché de planillas dibujadas
+DIR_CACHE = getattr(settings, 'EXCEL_PLANILLAS_CACHE_DIR', os.path.join(settings.MEDIA_ROOT, 'cache_planillas'))
+
+# Tamaño máximo de la caché; al superarlo se borran las planillas menos usadas
+TAMANO_CACHE = getattr(settings, 'EXCEL_PLANILLAS_CACHE_MB', 512) * 1024 * 1024
+
+# Fracción de TAMANO_CACHE hasta la que se recorta: así la caché no se vuelve a
+# recorrer con cada planilla guardada apenas llega al límite
+RECORTE_HASTA = 0.9
+
+# Registros leídos de la base de datos por consulta al dibujar una planilla
+BLOQUE_REGISTROS = 2000
+
+# Planillas que se dibujan a la vez al reimprimir; acota las filas en memoria
+LOTE_DIBUJO = 32
+
+logger = logging.getLogger(__name__)
+
+# Tamaño de la caché según este proceso: el del último recorte más lo que se ha
+# guardado desde entonces (None hasta el primer recorte). Solo cuenta lo que
+# escribe este proceso; el recorte vuelve a medir la carpeta completa.
+_tamano_cache = None
+
+
+def url_planilla(consecutivo):
+    """URL de la vista que entrega la planilla de un consecutivo."""
+    return reverse('planilla_pdf', args=[consecutivo])
+
+
+def _ruta_cache(proceso):
+    return os.path.join(DIR_CACHE, f'{proceso.consecutivo}_v{proceso.version_datos}.pdf')
+
+
+def _numero(valor):
+    # Los FloatField devuelven 10.0 donde el Excel tenía 10: se dibuja como entero
+    if isinstance(valor, float) and valor.is_integer():
+        return int(valor)
+    return valor
+
+
+def filas_proceso(proceso):
+    """Filas de la planilla de un proceso, en el orden de carga y en el formato canónico de las filas."""
+    registros = RegistroExcel.objects.filter(proceso=proceso).order_by('id').values_list(
+        'orden', 'produccion', 'cant_orig', 'saldo_entregar', 'cant_produc', 'iny',
+    )
+    for orden, produccion, cant_orig, saldo, cant_produc, iny in registros.iterator(chunk_size=BLOQUE_REGISTROS):
+        yield (orden, produccion, _numero(cant_orig), _numero(saldo), None, None, None, None, None,
+               _numero(cant_produc), iny)
+
+
+def _argumentos_dibujo(proceso):
+    # La fecha del encabezado es la de la carga, no la del momento en que se dibuja
+    return proceso.consecutivo, timezone.localtime(proceso.fecha_carga), list(filas_proceso(proceso))
+
+
+def dibujar_planilla(proceso):
+    """Dibuja en memoria la planilla de un proceso y retorna los bytes del PDF."""
+    return dibujar_pdf(*_argumentos_dibujo(proceso))
+
+
+def _es_delta(proceso):
+    return bool(proceso.carga_id and proceso.carga.delta)
+
+
+def planilla_disponible(proceso):
+    """Indica si la planilla del proceso se puede entregar: las delta solo mientras su PDF esté en disco."""
+    return not _es_delta(proceso) or os.path.exists(ruta_planilla('planilla', proceso.consecutivo))
+
+
+def _ruta_guardada(proceso):
+    """Ruta del PDF ya dibujado de un proceso (en la caché o, si es delta, en media), o None."""
+    if _es_delta(proceso):
+        ruta = ruta_planilla('planilla', proceso.consecutivo)
+        return ruta if os.path.exists(ruta) else None
+    ruta = _ruta_cache(proceso)
+    try:
+        # La fecha de modificación marca el último uso para el recorte de la caché
+        os.utime(ruta)
+    except OSError:
+        return None
+    return ruta
+
+
+def _guardar_en_cache(ruta, contenido):
+    os.makedirs(DIR_CACHE, exist_ok=True)
+    # Temporal + renombrar: quien lea la caché al mismo tiempo nunca ve un PDF a medias
+    fd, tmp_path = tempfile.mkstemp(dir=DIR_CACHE, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as destino:
+            destino.write(contenido)
+        os.replace(tmp_path, ruta)
+    except OSError:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    global _tamano_cache
+    if _tamano_cache is not None:
+        _tamano_cache += len(contenido)
+    # La carpeta solo se recorre al superar el límite (o la primera vez)
+    if _tamano_cache is None or _tamano_cache > TAMANO_CACHE:
+        recortar_cache(TAMANO_CACHE * RECORTE_HASTA)
+
+
+def recortar_cache(limite=None):
+    """Borra las planillas usadas hace más tiempo hasta que la caché quede bajo el límite."""
+    global _tamano_cache
+    limite = TAMANO_CACHE if limite is None else limite
+    archivos = []
+    try:
+        for entrada in os.scandir(DIR_CACHE):
+            if entrada.name.endswith('.pdf'):
+                estado = entrada.stat()
+                archivos.append((estado.st_mtime, estado.st_size, entrada.path))
+    except FileNotFoundError:
+        _tamano_cache = 0
+        return 0
+    archivos.sort()
+    total = sum(tamano for _, tamano, _ in archivos)
+    borrados = 0
+    for _, tamano, ruta in archivos:
+        if total <= limite:
+            break
+        try:
+            os.remove(ruta)
+        except OSError:
+            continue  # En Windows no se puede borrar si se está enviando en este momento
+        total -= tamano
+        borrados += 1
+    _tamano_cache = total
+    return borrados
+
+
+def abrir_planilla(proceso):
+    """
+    Retorna un archivo binario abierto con el PDF de la planilla del proceso,
+    listo para enviarlo en la respuesta, o None si no se puede obtener (planilla
+    delta cuyo PDF ya no está en disco). Si la planilla no está en la caché se
+    dibuja y se guarda.
+    """
+    ruta = _ruta_guardada(proceso)
+    if ruta:
+        try:
+            return open(ruta, 'rb')
+        except FileNotFoundError:
+            pass  # Se borró de la caché justo ahora: se vuelve a dibujar
+    if _es_delta(proceso):
+        return None
+
+    inicio = time.perf_counter()
+    contenido = dibujar_planilla(proceso)
+    logger.debug("Planilla %s dibujada en %.3fs (%.0f KB)", proceso.consecutivo, time.perf_counter() - inicio,
+                 len(contenido) / 1024)
+    _guardar_planilla(proceso, contenido)
+    return io.BytesIO(contenido)
+
+
+def _guardar_planilla(proceso, contenido):
+    try:
+        _guardar_en_cache(_ruta_cache(proceso), contenido)
+    except OSError as e:
+        logger.warning("No se pudo guardar la planilla %s en la caché: %s", proceso.consecutivo, e)
+
+
+def reunir_planillas(procesos):
+    """
+    PDFs de varias planillas, en el orden de `procesos`, para combinarlos: la ruta
+    de las que ya están dibujadas y un BytesIO con las que faltaban. Las que
+    faltan se dibujan en paralelo (por lotes de LOTE_DIBUJO) y quedan en la
+    caché. Las planillas delta sin PDF en disco se omiten.
+    Retorna (fuentes, dibujadas).
+    """
+    from . import ingest  # ingest importa este módulo; PROCESOS_PLANILLAS se lee al llamar
+
+    fuentes = []
+    faltantes = []
+    for proceso in procesos:
+        ruta = _ruta_guardada(proceso)
+        if ruta:
+            fuentes.append(ruta)
+        elif _es_delta(proceso):
+            logger.warning("Planilla %s omitida: su PDF ya no está en disco", proceso.consecutivo)
+        else:
+            faltantes.append((len(fuentes), proceso))
+            fuentes.append(None)
+
+    inicio = time.perf_counter()
+    for desde in range(0, len(faltantes), LOTE_DIBUJO):
+        lote = faltantes[desde:desde + LOTE_DIBUJO]
+        argumentos = [_argumentos_dibujo(proceso) for _, proceso in lote]
+        # Enviar pocas filas a otro proceso cuesta más que dibujarlas aquí
+        filas = sum(len(filas_planilla) for _, _, filas_planilla in argumentos)
+        procesos_pool = ingest.PROCESOS_PLANILLAS if filas >= MIN_FILAS_PARALELO else 0
+        for (i, proceso), contenido in zip(lote, mapear(dibujar_pdf, argumentos, procesos_pool)):
+            _guardar_planilla(proceso, contenido)
+            fuentes[i] = io.BytesIO(contenido)
+    if faltantes:
+        logger.debug("%d planillas dibujadas en %.3fs (%d ya estaban en caché)", len(faltantes),
+                     time.perf_counter() - inicio, len(fuentes) - len(faltantes))
+    return fuentes, len(faltantes)
+
+
+def combinar_planillas(fuentes, motor=None):
+    """
+    Combina los PDFs (rutas o archivos abiertos) en un archivo temporal y lo
+    retorna abierto al inicio. Usa el mismo motor que los lotes de PDFs (ver
+    pdf_utils.combinar_en), sin páginas en blanco entre planillas; las que no
+    se pueden leer se omiten. Lanza ValueError si no se pudo leer ninguna.
+    """
+    salida = tempfile.TemporaryFile()
+    try:
+        archivos, _ = combinar_en(fuentes, salida, motor=motor, blancos=False)
+        if not archivos:
+            raise ValueError('Ninguna de las planillas se pudo leer')
+    except Exception:
+        salida.close()
+        raise
+    salida.seek(0)
+    return salida
+
+
+def buscar_proceso(consecutivo):
+    """El ExcelProcess de un consecutivo, o None."""
+    return ExcelProcess.objects.select_related('carga').filter(consecutivo=consecutivo).order_by('-id').first()
@@ -0,0 +1,466 @@
+"""
+Lectura y clasificación de las hojas de un libro de planillas (xlsx, xls o CSV).
+
+Este módulo no usa Django: leer_hoja se ejecuta en los procesos del pool (ver
+paralelo.mapear), así que solo puede depender de openpyxl, xlrd, numpy y pandas.
+"""
+import csv
+import os
+import posixpath
+import xml.etree.ElementTree as ET
+import zipfile
+from operator import itemgetter
+import numpy as np
+import openpyxl
+import pandas as pd
+from .utils import COLUMNAS_REQUERIDAS, validar_encabezado
+
+# Firmas con las que empieza cada formato: xlsx/xlsm son un zip y xls un
+# documento OLE2. Lo que no tenga ninguna de las dos se lee como CSV.
+FIRMA_XLSX = b'PK\x03\x04'
+FIRMA_XLS = b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'
+
+# Bytes que se leen para detectar el separador y la codificación de un CSV
+MUESTRA_CSV = 64 * 1024
+
+# Filas que pandas lee por bloque de un CSV
+BLOQUE_CSV = 50000
+
+# Etiquetas del XML de una hoja xlsx (lectura parcial, ver LibroXlsx.filas)
+_NS_HOJA = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+_FILA, _CELDA, _VALOR, _TEXTO = (_NS_HOJA + etiqueta for etiqueta in ('row', 'c', 'v', 't'))
+_NS_RELACION = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+_NS_ID = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id'
+
+
+class ErrorFormatoExcel(Exception):
+    """El archivo no tiene el formato esperado; el mensaje se muestra al usuario."""
+
+
+def _columna_numerica(filas, idx):
+    """
+    Extrae una columna como arreglo float; los valores vacíos o no numéricos quedan en 0.
+    """
+    valores = [row[idx] for row in filas]
+    try:
+        # Camino rápido: columnas con números y celdas vacías (None -> NaN)
+        columna = np.array(valores, dtype=float)
+    except (ValueError, TypeError):
+        columna = pd.to_numeric(pd.Series(valores, dtype=object), errors='coerce').to_numpy(dtype=float)
+    return np.nan_to_num(columna, nan=0.0)
+
+
+def _columna_texto(filas, idx):
+    return np.array([str(row[idx]).strip().lower() if row[idx] is not None else '' for row in filas], dtype=object)
+
+
+def clasificar_filas(filas, columnas, rutas):
+    """
+    Reparte las filas con cantidad nueva > 0 entre las planillas según las rutas
+    (reglas normalizadas por ingest.cargar_rutas).
+
+    Las reglas se evalúan en una sola pasada vectorizada sobre las columnas
+    resueltas por validar_encabezado, así que no depende de la posición de las
+    columnas en el archivo. Las filas retornadas quedan en el orden canónico de
+    COLUMNAS_REQUERIDAS (orden en 0, ..., nuevo en 9, iny en 10).
+    Retorna una lista de filas por cada ruta, en el mismo orden de las rutas.
+    """
+    filas = filas if isinstance(filas, list) else list(filas)
+    grupos = [[] for _ in rutas]
+    if not filas:
+        return grupos
+    # Solo las filas con nuevo > 0 pasan a evaluar las reglas
+    seleccion = np.flatnonzero(_columna_numerica(filas, columnas['nuevo']) > 0)
+    if not len(seleccion):
+        return grupos
+    seleccionadas = [filas[i] for i in seleccion]
+
+    destino = np.full(len(seleccionadas), -1)
+    extraidas = {}
+    for i, regla in enumerate(rutas):
+        pendientes = destino < 0
+        if regla['columna'] is None:
+            destino[pendientes] = i
+            break
+        clave = (regla['columna'], regla['numerica'])
+        if clave not in extraidas:
+            idx = columnas[regla['columna']]
+            extraidas[clave] = (np.trunc(_columna_numerica(seleccionadas, idx)) if regla['numerica']
+                                else _columna_texto(seleccionadas, idx))
+        destino[pendientes & np.isin(extraidas[clave], regla['valores'])] = i
+
+    canonica = itemgetter(*[columnas[nombre] for nombre in COLUMNAS_REQUERIDAS])
+    for j in np.flatnonzero(destino >= 0):
+        grupos[destino[j]].append(canonica(seleccionadas[j]))
+    return grupos
+
+
+def columnas_de_clasificacion(columnas, rutas):
+    """Índices de las columnas que clasificar_filas necesita leer: nuevo e iny y las de las reglas."""
+    nombres = {'nuevo', 'iny'} | {regla['columna'] for regla in rutas if regla['columna']}
+    return {columnas[nombre] for nombre in nombres}
+
+
+def filas_de_hoja(ws):
+    """Recorre las filas de datos (desde la fila 2) de una hoja abierta en read_only."""
+    # En read_only las filas pueden venir recortadas si el archivo no declara sus
+    # dimensiones; se rellenan hasta el ancho del encabezado.
+    ancho = len(next(ws.iter_rows(min_row=1, max_row=1, values_only=True), ()))
+    return ws.iter_rows(min_row=2, max_col=ancho or None, values_only=True)
+
+
+def _indice_columna(referencia):
+    """Índice (desde 0) de la columna de una referencia de celda: 'J12' -> 9."""
+    indice = 0
+    for letra in referencia:
+        if letra.isdigit():
+            break
+        indice = indice * 26 + ord(letra) - 64
+    return indice - 1
+
+
+def _relaciones(zip_libro, parte):
+    """{id: ruta en el zip} de las relaciones de una parte del paquete (p. ej. xl/workbook.xml)."""
+    carpeta, nombre = posixpath.split(parte)
+    with zip_libro.open(posixpath.join(carpeta, '_rels', nombre + '.rels')) as xml:
+        raiz = ET.parse(xml).getroot()
+    relaciones = {}
+    for relacion in raiz.iter(_NS_RELACION + 'Relationship'):
+        destino = relacion.get('Target', '')
+        ruta = destino[1:] if destino.startswith('/') else posixpath.normpath(posixpath.join(carpeta, destino))
+        relaciones[relacion.get('Id')] = (relacion.get('Type', ''), ruta)
+    return relaciones
+
+
+def partes_xlsx(zip_libro):
+    """
+    Ubica en el zip de un xlsx la hoja de cada nombre y la tabla de textos
+    compartidos, siguiendo workbook.xml y sus relaciones como indica el formato.
+    Retorna ({nombre de hoja: ruta}, ruta de los textos compartidos o None).
+    """
+    principal = next(ruta for tipo, ruta in _relaciones(zip_libro, '').values() if tipo.endswith('/officeDocument'))
+    relaciones = _relaciones(zip_libro, principal)
+    with zip_libro.open(principal) as xml:
+        raiz = ET.parse(xml).getroot()
+    hojas = {hoja.get('name'): relaciones[hoja.get(_NS_ID)][1] for hoja in raiz.iter(_NS_HOJA + 'sheet')}
+    textos = next((ruta for tipo, ruta in relaciones.values() if tipo.endswith('/sharedStrings')), None)
+    return hojas, textos
+
+
+def leer_textos_compartidos(zip_libro, ruta):
+    """Tabla de textos compartidos (sharedStrings.xml); en los textos con formato se unen sus partes."""
+    textos = []
+    if ruta is None:
+        return textos
+    with zip_libro.open(ruta) as xml:
+        for _, elemento in ET.iterparse(xml):
+            if elemento.tag == _NS_HOJA + 'si':
+                # Texto simple (<t>) o con formato (<r><t>); la guía fonética (<rPh>) no se incluye
+                texto = elemento.find(_TEXTO)
+                partes = [texto.text or ''] if texto is not None else []
+                partes += [r.findtext(_TEXTO) or '' for r in elemento.findall(_NS_HOJA + 'r')]
+                textos.append(''.join(partes))
+                elemento.clear()
+    return textos
+
+
+class LibroXlsx:
+    """
+    Libro xlsx/xlsm leído con openpyxl en modo read_only. La lectura parcial de
+    columnas (ver filas) recorre el zip directamente con zipfile.
+    """
+
+    def __init__(self, archivo):
+        self.archivo = archivo
+        self.wb = openpyxl.load_workbook(archivo, read_only=True)
+        self.hojas = self.wb.sheetnames
+        self._zip = None
+        self._partes = None
+        self._textos = None
+
+    def encabezado(self, hoja):
+        return next(self.wb[hoja].iter_rows(min_row=1, max_row=1, values_only=True), ())
+
+    def filas(self, hoja, solo=None):
+        """
+        Filas de datos de la hoja. Con `solo` (índices de columna) se leen únicamente
+        esas columnas y las demás quedan en None.
+        """
+        if solo is None:
+            return filas_de_hoja(self.wb[hoja])
+        return self._filas_parciales(hoja, set(solo))
+
+    def _ruta_hoja(self, hoja):
+        """Ruta del XML de la hoja dentro del zip, o None si no se puede ubicar."""
+        if self._partes is None:
+            try:
+                self._zip = zipfile.ZipFile(self.archivo)
+                self._partes = partes_xlsx(self._zip)
+            except (KeyError, StopIteration, zipfile.BadZipFile, ET.ParseError):
+                self._partes = ({}, None)
+        ruta = self._partes[0].get(hoja)
+        if ruta is None or ruta not in self._zip.namelist():
+            return None
+        with self._zip.open(ruta) as xml:
+            if _NS_HOJA[1:-1].encode() not in xml.read(2048):
+                return None  # Otro espacio de nombres (p. ej. OOXML estricto)
+        return ruta
+
+    def _filas_parciales(self, hoja, solo):
+        # openpyxl construye un objeto por cada celda; aquí se recorre el XML de la
+        # hoja directamente y solo se decodifican las celdas de las columnas pedidas.
+        # Las fechas quedan como número de serie: no se usan para clasificar.
+        ancho = len(self.encabezado(hoja))
+        ruta = self._ruta_hoja(hoja)
+        if ruta is None:
+            # No se pudo ubicar la hoja en el zip: lectura completa con openpyxl
+            yield from filas_de_hoja(self.wb[hoja])
+            return
+        if self._textos is None:
+            self._textos = leer_textos_compartidos(self._zip, self._partes[1])
+        textos = self._textos
+        with self._zip.open(ruta) as xml:
+            numero_fila = 0
+            fila = [None] * ancho
+            columna = -1
+            for _, elemento in ET.iterparse(xml):
+                etiqueta = elemento.tag
+                if etiqueta == _CELDA:
+                    referencia = elemento.get('r')
+                    columna = _indice_columna(referencia) if referencia else columna + 1
+                    if columna in solo and columna < ancho:
+                        fila[columna] = self._valor_celda(elemento, textos)
+                elif etiqueta == _FILA:
+                    numero_fila = int(elemento.get('r') or numero_fila + 1)
+                    if numero_fila > 1:
+                        yield tuple(fila)
+                    fila = [None] * ancho
+                    columna = -1
+                    elemento.clear()
+
+    @staticmethod
+    def _valor_celda(celda, textos):
+        """Valor de una celda con los mismos tipos que entrega openpyxl."""
+        tipo = celda.get('t', 'n')
+        if tipo == 'inlineStr':
+            return ''.join(t.text or '' for t in celda.iter(_TEXTO))
+        valor = celda.findtext(_VALOR)
+        if valor is None:
+            return None
+        if tipo == 'n':
+            return float(valor) if ('.' in valor or 'E' in valor or 'e' in valor) else int(valor)
+        if tipo == 's':
+            return textos[int(valor)]
+        if tipo == 'b':
+            return bool(int(valor))
+        return valor  # 'str' (resultado de fórmula), 'e' (error) o 'd' (fecha ISO)
+
+    def cerrar(self):
+        if self._zip is not None:
+            self._zip.close()
+        self.wb.close()
+
+
+class LibroXls:
+    """
+    Libro .xls (Excel 97-2003) leído con xlrd. Los valores se convierten a los
+    mismos tipos que entrega openpyxl: enteros sin decimales, fechas como
+    datetime y celdas vacías como None.
+    """
+
+    def __init__(self, archivo):
+        try:
+            import xlrd
+        except ImportError:
+            raise ErrorFormatoExcel("Para cargar archivos .xls se necesita el paquete xlrd (pip install xlrd).")
+        self.xlrd = xlrd
+        if isinstance(archivo, str):
+            self.libro = xlrd.open_workbook(archivo, on_demand=True)
+        else:
+            self.libro = xlrd.open_workbook(file_contents=archivo.read(), on_demand=True)
+            archivo.seek(0)
+        self.hojas = self.libro.sheet_names()
+
+    def _valor(self, tipo, valor):
+        xlrd = self.xlrd
+        if tipo == xlrd.XL_CELL_NUMBER:
+            return int(valor) if valor.is_integer() else valor
+        if tipo == xlrd.XL_CELL_DATE:
+            return xlrd.xldate.xldate_as_datetime(valor, self.libro.datemode)
+        if tipo == xlrd.XL_CELL_TEXT:
+            return valor if valor != '' else None
+        if tipo == xlrd.XL_CELL_BOOLEAN:
+            return bool(valor)
+        return None  # Vacía, en blanco o con error
+
+    def _fila(self, hoja, i, ancho=None):
+        tipos = hoja.row_types(i, 0, ancho)
+        valores = hoja.row_values(i, 0, ancho)
+        fila = tuple(self._valor(tipo, valor) for tipo, valor in zip(tipos, valores))
+        return fila + (None,) * ((ancho or 0) - len(fila))
+
+    def encabezado(self, hoja):
+        hoja = self.libro.sheet_by_name(hoja)
+        return self._fila(hoja, 0) if hoja.nrows else ()
+
+    def filas(self, hoja, solo=None):
+        # xlrd ya tiene todo el libro en memoria: siempre se leen las filas completas
+        hoja = self.libro.sheet_by_name(hoja)
+        ancho = hoja.row_len(0) if hoja.nrows else 0
+        for i in range(1, hoja.nrows):
+            yield self._fila(hoja, i, ancho)
+
+    def cerrar(self):
+        self.libro.release_resources()
+
+
+def _tipar_columna(serie, decimal_coma):
+    """
+    Convierte una columna de texto del CSV a los tipos que tendría en Excel: los
+    números como int o float, las celdas vacías como None y el resto como texto.
+    Los códigos con ceros a la izquierda (00123) se conservan como texto.
+    """
+    texto = serie.fillna('').str.strip()
+    numeros = pd.to_numeric(texto.str.replace(',', '.', regex=False) if decimal_coma else texto, errors='coerce')
+    numeros[texto.str.match(r'^-?0\d')] = np.nan
+    valores = texto.astype(object).where(texto != '', None)
+    es_numero = numeros.notna()
+    valores[es_numero] = numeros[es_numero].astype(object)
+    enteros = es_numero & (numeros % 1 == 0)
+    valores[enteros] = numeros[enteros].astype('int64').astype(object)
+    return valores
+
+
+class LibroCSV:
+    """
+    Archivo CSV exportado por el ERP, leído con el lector en C de pandas. Se
+    presenta como un libro de una sola hoja con el nombre del archivo. El
+    separador (coma, punto y coma, tabulador o barra) y la codificación (UTF-8 o
+    Windows-1252) se detectan con una muestra; con punto y coma se asume coma
+    decimal, como en los CSV de Excel en español.
+    """
+
+    def __init__(self, archivo):
+        self.archivo = archivo
+        nombre = archivo if isinstance(archivo, str) else getattr(archivo, 'name', '') or 'csv'
+        self.hojas = [os.path.splitext(os.path.basename(nombre))[0] or 'csv']
+        muestra = _cabecera(archivo, MUESTRA_CSV)
+        if b'\x00' in muestra:
+            raise ErrorFormatoExcel("Formato de archivo no reconocido: se esperaba un libro Excel (.xlsx, .xls) o un CSV.")
+        # Solo las líneas completas, para no cortar un carácter ni una fila a la mitad
+        if len(muestra) == MUESTRA_CSV and b'\n' in muestra:
+            muestra = muestra[:muestra.rfind(b'\n')]
+        try:
+            texto = muestra.decode('utf-8-sig')
+            self.codificacion = 'utf-8-sig'
+        except UnicodeDecodeError:
+            texto = muestra.decode('cp1252', errors='replace')
+            self.codificacion = 'cp1252'
+        try:
+            self.separador = csv.Sniffer().sniff(texto, delimiters=',;\t|').delimiter
+        except csv.Error:
+            self.separador = ','
+        self.decimal_coma = self.separador == ';'
+
+    def _leer(self, **opciones):
+        fuente = self.archivo
+        if not isinstance(fuente, str):
+            fuente.seek(0)
+            # Los File de Django no declaran su modo; pandas solo decodifica la
+            # codificación pedida si recibe el archivo binario de abajo
+            fuente = getattr(fuente, 'file', fuente)
+        try:
+            return pd.read_csv(
+                fuente, sep=self.separador, encoding=self.codificacion, header=None,
+                dtype=str, keep_default_na=False, engine='c', **opciones
+            )
+        except pd.errors.ParserError as e:
+            raise ErrorFormatoExcel(f"El archivo CSV no se pudo leer: {e}")
+
+    def encabezado(self, hoja):
+        try:
+            primera = self._leer(nrows=1)
+        except pd.errors.EmptyDataError:
+            return ()
+        return tuple(primera.iloc[0]) if len(primera) else ()
+
+    def filas(self, hoja, solo=None):
+        ancho = len(self.encabezado(hoja))
+        opciones = {'usecols': sorted(i for i in solo if i < ancho)} if solo is not None else {}
+        try:
+            bloques = self._leer(skiprows=1, chunksize=BLOQUE_CSV, **opciones)
+            for bloque in bloques:
+                bloque = bloque.reindex(columns=range(ancho))
+                for columna in bloque.columns:
+                    if solo is not None and columna not in solo:
+                        bloque[columna] = None
+                        continue
+                    bloque[columna] = _tipar_columna(bloque[columna], self.decimal_coma)
+                yield from bloque.itertuples(index=False, name=None)
+        except pd.errors.EmptyDataError:
+            return
+        except pd.errors.ParserError as e:
+            raise ErrorFormatoExcel(f"El archivo CSV no se pudo leer: {e}")
+
+    def cerrar(self):
+        if not isinstance(self.archivo, str):
+            self.archivo.seek(0)
+
+
+def _cabecera(archivo, n):
+    """Primeros n bytes de un archivo (ruta o archivo abierto), sin moverlo."""
+    if isinstance(archivo, str):
+        with open(archivo, 'rb') as f:
+            return f.read(n)
+    archivo.seek(0)
+    datos = archivo.read(n)
+    archivo.seek(0)
+    return datos
+
+
+def abrir_libro(archivo):
+    """
+    Abre un libro de planillas según su contenido (no su extensión): xlsx/xlsm,
+    xls o CSV. archivo puede ser una ruta o un archivo abierto en modo binario.
+    El libro retornado expone hojas, encabezado(hoja), filas(hoja, solo=None) y cerrar().
+    """
+    firma = _cabecera(archivo, 8)
+    if firma.startswith(FIRMA_XLSX):
+        return LibroXlsx(archivo)
+    if firma.startswith(FIRMA_XLS):
+        return LibroXls(archivo)
+    return LibroCSV(archivo)
+
+
+def revisar_hojas(libro):
+    """
+    Valida el encabezado de cada hoja del libro.
+
+    Retorna (validas, omitidas): validas es una lista de (nombre, columnas) en el
+    orden del libro y omitidas una lista de {'hoja', 'error'} con las hojas que
+    tienen datos pero no el formato esperado. Las hojas vacías se ignoran.
+    """
+    validas = []
+    omitidas = []
+    for hoja in libro.hojas:
+        encabezado = libro.encabezado(hoja)
+        if not any(valor not in (None, '') for valor in encabezado):
+            continue
+        es_valido, mensaje, columnas = validar_encabezado(encabezado)
+        if es_valido:
+            validas.append((hoja, columnas))
+        else:
+            omitidas.append({'hoja': hoja, 'error': mensaje})
+    return validas, omitidas
+
+
+def leer_hoja(ruta, hoja, columnas, rutas):
+    """
+    Abre el libro, lee una hoja y retorna sus filas clasificadas (una lista por
+    ruta). Pensada para ejecutarse en un proceso del pool.
+    """
+    libro = abrir_libro(ruta)
+    try:
+        return clasificar_filas(libro.filas(hoja), columnas, rutas)
+    finally:
+        libro.cerrar()
@@ -0,0 +1,641 @@
+"""
+Servicio de ingesta de planillas Excel compartido por upload_excel y upload_excel_web.
+"""
+import os
+import time
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.db.models import F, Max, Q
+from .cache_planillas import url_planilla
+from .hojas import (
+    ErrorFormatoExcel, abrir_libro, clasificar_filas as _clasificar_filas, columnas_de_clasificacion, leer_hoja,
+    revisar_hojas,
+)
+from .models import CargaExcel, ExcelProcess, RegistroExcel, Secuencia
+from .paralelo import mapear
+from .pdf_planilla import generar_planillas, ruta_planilla
+from .storage import almacenamiento_excels, guardar_excel, sha256_archivo
+from .utils import COLUMNAS_REQUERIDAS, validar_encabezado
+
+# Cantidad de registros por INSERT en bulk_create
+BATCH_SIZE = 1000
+
+# Nombre de la Secuencia que numera las planillas (ExcelProcess.consecutivo)
+SECUENCIA_CONSECUTIVO = 'excel_process'
+
+# Filas leídas por bloque en el modo streaming; acota la memoria usada por carga
+CHUNK_SIZE = getattr(settings, 'EXCEL_STREAMING_CHUNK_SIZE', 1000)
+
+# Procesos usados para leer las hojas y dibujar las planillas de una carga en
+# paralelo (None = uno por CPU, 0 = en serie)
+PROCESOS_PLANILLAS = getattr(settings, 'EXCEL_PLANILLAS_PROCESOS', None)
+if PROCESOS_PLANILLAS is None:
+    PROCESOS_PLANILLAS = os.cpu_count() or 1
+
+# Reglas por defecto: iny 3 o 7 a una bodega y todo lo demás a la otra
+RUTAS_POR_DEFECTO = [
+    {'bodega': '3_7', 'titulo': 'iny 3/7', 'columna': 'iny', 'valores': [3, 7]},
+    {'bodega': 'otros', 'titulo': 'otros'},
+]
+
+
+def cargar_rutas(rutas):
+    """
+    Valida y normaliza las reglas de enrutamiento de filas a planillas.
+
+    Cada regla es un diccionario con 'bodega' (identificador), 'titulo' opcional,
+    'columna' (una de COLUMNAS_REQUERIDAS) y 'valores'. Las reglas se evalúan en
+    orden y cada fila va a la primera que coincide; una regla sin columna recibe
+    todas las filas restantes. Los valores numéricos se comparan con la parte
+    entera de la celda y los de texto sin distinguir mayúsculas.
+    """
+    columnas_validas = {nombre.lower(): nombre for nombre in COLUMNAS_REQUERIDAS}
+    normalizadas = []
+    for regla in rutas:
+        bodega = str(regla.get('bodega', '')).strip()
+        if not bodega:
+            raise ImproperlyConfigured(f"EXCEL_RUTAS_PLANILLAS: regla sin bodega: {regla}")
+        columna = regla.get('columna')
+        valores = list(regla.get('valores', []))
+        if columna is not None:
+            if str(columna).lower() not in columnas_validas:
+                raise ImproperlyConfigured(
+                    f"EXCEL_RUTAS_PLANILLAS: la columna '{columna}' de la bodega {bodega} "
+                    f"no es una de las columnas requeridas"
+                )
+            columna = columnas_validas[str(columna).lower()]
+            if not valores:
+                raise ImproperlyConfigured(f"EXCEL_RUTAS_PLANILLAS: la bodega {bodega} no tiene valores")
+        numerica = all(isinstance(v, (int, float)) for v in valores)
+        normalizadas.append({
+            'bodega': bodega,
+            'titulo': regla.get('titulo', bodega),
+            'columna': columna,
+            'valores': valores if numerica else [str(v).strip().lower() for v in valores],
+            'numerica': numerica,
+        })
+    if len({regla['bodega'] for regla in normalizadas}) != len(normalizadas):
+        raise ImproperlyConfigured("EXCEL_RUTAS_PLANILLAS: hay bodegas repetidas")
+    return normalizadas
+
+
+RUTAS = cargar_rutas(getattr(settings, 'EXCEL_RUTAS_PLANILLAS', RUTAS_POR_DEFECTO))
+
+
+def clasificar_filas(filas, columnas, rutas=None):
+    """
+    Reparte las filas de una hoja entre las planillas según las rutas configuradas
+    (ver hojas.clasificar_filas). Retorna una lista de filas por cada ruta, en el
+    mismo orden de las rutas (con las rutas por defecto: [doc_iny_3_7, doc_iny_otros]).
+    """
+    return _clasificar_filas(filas, columnas, rutas or RUTAS)
+
+
+def _destinos(rutas, hojas):
+    """Una planilla por cada hoja y ruta: lista de (hoja, regla), hoja por hoja."""
+    return [(hoja, regla) for hoja in hojas for regla in rutas]
+
+
+def leer_hojas(archivo, libro, hojas, sha256='', rutas=None):
+    """
+    Lee y clasifica las hojas válidas del libro abierto con abrir_libro (hojas es
+    la lista de (nombre, columnas) de revisar_hojas). Con varias hojas, cada una se lee en un proceso
+    del pool desde la copia guardada del archivo, así que el tiempo es el de la
+    hoja más grande. Retorna los grupos de filas de todas las hojas en el orden
+    de _destinos.
+    """
+    rutas = rutas or RUTAS
+    if len(hojas) > 1 and PROCESOS_PLANILLAS >= 2:
+        ruta = almacenamiento_excels.path(guardar_excel(archivo, sha256))
+        por_hoja = mapear(leer_hoja, [(ruta, hoja, columnas, rutas) for hoja, columnas in hojas], PROCESOS_PLANILLAS)
+    else:
+        por_hoja = [clasificar_filas(libro.filas(hoja), columnas, rutas) for hoja, columnas in hojas]
+    return [grupo for grupos in por_hoja for grupo in grupos]
+
+
+def construir_registros(proceso, filas):
+    """Construye en memoria los RegistroExcel de un proceso, sin tocar la base de datos."""
+    return [
+        RegistroExcel(
+            proceso=proceso,
+            orden=row[0],
+            produccion=row[1],
+            cant_orig=row[2],
+            saldo_entregar=row[3],
+            cant_produc=row[9],
+            iny=row[10] if len(row) > 10 else '',
+            otros=''  # puedes mapear más campos si lo deseas
+        )
+        for row in filas
+    ]
+
+
+def _ultimo_consecutivo():
+    return ExcelProcess.objects.aggregate(ultimo=Max('consecutivo'))['ultimo'] or 0
+
+
+def reservar_consecutivos(cantidad):
+    """Reserva `cantidad` consecutivos contiguos de planilla en una sola operación."""
+    return Secuencia.reservar(SECUENCIA_CONSECUTIVO, cantidad, inicial=_ultimo_consecutivo)
+
+
+def _asignar_consecutivos(archivo, sha256='', guardado=None, delta=False, rutas=None, hojas=('',), filas=None):
+    """
+    Crea la CargaExcel y un ExcelProcess por hoja y ruta, con consecutivos contiguos.
+    Todos los procesos apuntan a la misma copia del archivo (guardado, ver guardar_excel).
+    filas es la cantidad de filas de cada planilla, si ya se conoce.
+    Retorna (carga, procesos) con los procesos en el orden de _destinos.
+    """
+    destinos = _destinos(rutas or RUTAS, hojas)
+    # La reserva debe ser la primera escritura de la transacción: en SQLite así se
+    # toma el bloqueo de escritura de inmediato y las cargas concurrentes esperan.
+    consecutivos = reservar_consecutivos(len(destinos))
+    guardado = guardado or guardar_excel(archivo, sha256)
+    nombre_archivo = os.path.basename(archivo.name)
+    version = CargaExcel.objects.filter(nombre_archivo=nombre_archivo).aggregate(ultima=Max('version'))['ultima'] or 0
+    carga = CargaExcel.objects.create(
+        sha256=sha256 or '',
+        nombre_archivo=nombre_archivo,
+        version=version + 1,
+        delta=delta,
+    )
+    filas = filas or [0] * len(destinos)
+    procesos = ExcelProcess.objects.bulk_create([
+        ExcelProcess(archivo=guardado, consecutivo=consecutivo, carga=carga, bodega=regla['bodega'], hoja=hoja,
+                     filas=cantidad)
+        for consecutivo, (hoja, regla), cantidad in zip(consecutivos, destinos, filas)
+    ])
+    return carga, procesos
+
+
+def _estadisticas(filas, inicio):
+    segundos = time.perf_counter() - inicio
+    filas_por_segundo = filas / segundos if segundos > 0 else float(filas)
+    print(f"Ingesta completada: {filas} filas en {segundos:.3f}s ({filas_por_segundo:.0f} filas/s)")
+    return {
+        'filas': filas,
+        'segundos': round(segundos, 3),
+        'filas_por_segundo': round(filas_por_segundo, 1),
+    }
+
+
+def _planillas(destinos, procesos, grupos):
+    """Resumen por planilla que acompaña al resultado de una carga."""
+    return [
+        {
+            'hoja': hoja,
+            'bodega': regla['bodega'],
+            'titulo': regla['titulo'],
+            'consecutivo': proceso.consecutivo if proceso else None,
+            'filas': len(filas),
+            'pdf': None,
+        }
+        for (hoja, regla), proceso, filas in zip(destinos, procesos, grupos)
+    ]
+
+
+def _agrupar_por_hoja(planillas):
+    """Las planillas agrupadas por hoja: [{'hoja', 'planillas'}] en el orden del libro."""
+    hojas = {}
+    for planilla in planillas:
+        hojas.setdefault(planilla['hoja'], []).append(planilla)
+    return [{'hoja': hoja, 'planillas': planillas_hoja} for hoja, planillas_hoja in hojas.items()]
+
+
+def _agregar_pdfs(resultado, pdfs):
+    """
+    Completa el resultado con la URL del PDF de cada planilla y las agrupa por
+    hoja en resultado['hojas']. También deja las claves consecutivo_<bodega> y
+    pdf_<bodega> (consecutivo_3_7, pdf_otros, ...) que usan los clientes de la
+    API; en un libro con varias hojas corresponden a la primera.
+    """
+    for planilla, pdf in zip(resultado['planillas'], pdfs):
+        planilla['pdf'] = pdf
+        if f"pdf_{planilla['bodega']}" not in resultado:
+            resultado[f"consecutivo_{planilla['bodega']}"] = planilla['consecutivo']
+            resultado[f"pdf_{planilla['bodega']}"] = pdf
+    resultado['hojas'] = _agrupar_por_hoja(resultado['planillas'])
+    return resultado
+
+
+def ingestar_planillas(archivo, grupos, sha256='', rutas=None, hojas=('',)):
+    """
+    Crea un ExcelProcess por hoja y ruta y todos sus RegistroExcel en una sola
+    transacción, insertando los registros por lotes con bulk_create. grupos son
+    las filas de cada planilla en el orden de _destinos (ver leer_hojas).
+
+    Retorna un diccionario con las planillas creadas (bodega y consecutivo), el
+    total de filas, la duración de la escritura y las filas por segundo.
+    """
+    rutas = rutas or RUTAS
+    inicio = time.perf_counter()
+    # El archivo se guarda antes de abrir la transacción para no alargar el bloqueo
+    guardado = guardar_excel(archivo, sha256)
+    with transaction.atomic():
+        carga, procesos = _asignar_consecutivos(archivo, sha256, guardado, rutas=rutas, hojas=hojas,
+                                                filas=[len(filas) for filas in grupos])
+        registros = []
+        for proceso, filas in zip(procesos, grupos):
+            registros += construir_registros(proceso, filas)
+        RegistroExcel.objects.bulk_create(registros, batch_size=BATCH_SIZE)
+        CargaExcel.objects.filter(pk=carga.pk).update(filas=len(registros))
+
+    resultado = {'planillas': _planillas(_destinos(rutas, hojas), procesos, grupos)}
+    resultado.update(_estadisticas(len(registros), inicio))
+    return resultado
+
+
+def _urls_planillas(resultado):
+    """Las planillas se dibujan cuando se piden (ver cache_planillas): se agrega la URL de cada una."""
+    return _agregar_pdfs(resultado, [url_planilla(planilla['consecutivo']) for planilla in resultado['planillas']])
+
+
+def renderizar_planillas(resultado, grupos, nombre_pdf='planilla'):
+    """
+    Dibuja las planillas del resultado en paralelo y agrega la URL de cada una
+    (la vista planilla_pdf entrega el PDF ya dibujado; la ruta en disco no sale
+    del servidor).
+    """
+    consecutivos = [planilla['consecutivo'] for planilla in resultado['planillas']]
+    inicio = time.perf_counter()
+    pdfs = generar_planillas(nombre_pdf, grupos, consecutivos, procesos=PROCESOS_PLANILLAS)
+    print(f"{len(pdfs)} planillas generadas en {time.perf_counter() - inicio:.3f}s")
+    return _urls_planillas(resultado)
+
+
+# --- Modo streaming -------------------------------------------------------
+# Las etapas se encadenan como generadores: leer_bloques -> clasificar_bloques
+# -> inserción por lotes. En memoria solo vive un bloque a la vez.
+
+def _parametro_activo(request, nombre):
+    valor = request.POST.get(nombre, request.GET.get(nombre))
+    if valor is None:
+        return None
+    return valor.lower() in ('1', 'true', 'si', 'on')
+
+
+def modo_streaming(request):
+    """Indica si la carga debe usar el modo streaming (parámetro `streaming` o settings)."""
+    activo = _parametro_activo(request, 'streaming')
+    if activo is not None:
+        return activo
+    return getattr(settings, 'EXCEL_INGEST_STREAMING', False)
+
+
+def leer_bloques(filas, tamano_bloque=CHUNK_SIZE):
+    """Entrega las filas de datos de una hoja (libro.filas) en bloques de tamaño acotado."""
+    bloque = []
+    for row in filas:
+        bloque.append(row)
+        if len(bloque) >= tamano_bloque:
+            yield bloque
+            bloque = []
+    if bloque:
+        yield bloque
+
+
+def clasificar_bloques(bloques, columnas, rutas=None):
+    """Clasifica cada bloque y entrega la lista de grupos (uno por ruta) del bloque."""
+    for bloque in bloques:
+        yield clasificar_filas(bloque, columnas, rutas)
+
+
+def ingestar_streaming(archivo, libro, hojas, sha256='', tamano_bloque=CHUNK_SIZE, rutas=None):
+    """
+    Ingesta las hojas de un libro abierto con abrir_libro sin cargar todas las
+    filas en memoria (salvo en los .xls, que xlrd lee completos).
+
+    Las hojas se recorren una tras otra y cada bloque clasificado se inserta con
+    bulk_create antes de leer el siguiente. hojas es la lista de (nombre,
+    columnas) retornada por revisar_hojas.
+    Retorna el mismo diccionario que ingestar_planillas.
+    """
+    rutas = rutas or RUTAS
+    destinos = _destinos(rutas, [hoja for hoja, _ in hojas])
+    inicio = time.perf_counter()
+    filas = 0
+    conteos = [0] * len(destinos)
+    guardado = guardar_excel(archivo, sha256)
+    with transaction.atomic():
+        carga, procesos = _asignar_consecutivos(archivo, sha256, guardado, rutas=rutas,
+                                                hojas=[hoja for hoja, _ in hojas])
+        for n, (hoja, columnas) in enumerate(hojas):
+            desde = n * len(rutas)
+            for grupos in clasificar_bloques(leer_bloques(libro.filas(hoja), tamano_bloque), columnas, rutas):
+                registros = []
+                for i, grupo in enumerate(grupos, start=desde):
+                    registros += construir_registros(procesos[i], grupo)
+                    conteos[i] += len(grupo)
+                RegistroExcel.objects.bulk_create(registros, batch_size=BATCH_SIZE)
+                filas += len(registros)
+        for proceso, cantidad in zip(procesos, conteos):
+            proceso.filas = cantidad
+        ExcelProcess.objects.bulk_update(procesos, ['filas'])
+        CargaExcel.objects.filter(pk=carga.pk).update(filas=filas)
+
+    resultado = {'planillas': _planillas(destinos, procesos, [range(n) for n in conteos])}
+    resultado.update(_estadisticas(filas, inicio))
+    return resultado
+
+
+# --- Modo delta -------------------------------------------------------------
+# Los operadores vuelven a subir la misma planilla del día varias veces con
+# cambios. En modo delta la nueva versión se compara contra lo ya cargado del
+# mismo archivo (mismo nombre) usando orden + produccion como clave: solo se
+# insertan las filas nuevas, se actualizan las cantidades que cambiaron y la
+# planilla PDF contiene únicamente esas filas.
+
+# Campos de RegistroExcel que se comparan y posición de la columna en la fila canónica
+CAMPOS_DELTA = (
+    ('cant_orig', 2),
+    ('saldo_entregar', 3),
+    ('cant_produc', 9),
+    ('iny', 10),
+)
+
+
+def modo_delta(request):
+    """Indica si la carga debe usar el modo delta (parámetro `delta` o settings)."""
+    activo = _parametro_activo(request, 'delta')
+    if activo is not None:
+        return activo
+    return getattr(settings, 'EXCEL_INGEST_DELTA', False)
+
+
+def _texto(valor):
+    # Mismo texto que guarda Django en los CharField
+    return str(valor) if valor is not None else None
+
+
+def _cantidad(valor):
+    try:
+        return float(valor) if valor is not None else None
+    except (ValueError, TypeError):
+        return None
+
+
+def registros_vigentes(nombre_archivo, hoja=''):
+    """
+    Último RegistroExcel de cada (orden, produccion) en las cargas anteriores del
+    mismo archivo y hoja. Retorna un diccionario {(orden, produccion): registro}.
+    Los registros de cargas anteriores a la lectura por hojas (hoja vacía) valen
+    para cualquier hoja.
+    """
+    vigentes = {}
+    registros = RegistroExcel.objects.filter(
+        Q(proceso__hoja=hoja) | Q(proceso__hoja=''),
+        proceso__carga__nombre_archivo=nombre_archivo,
+    ).only('id', 'proceso', 'orden', 'produccion', *[campo for campo, _ in CAMPOS_DELTA]).order_by('id')
+    for registro in registros.iterator(chunk_size=BATCH_SIZE):
+        vigentes[(registro.orden, registro.produccion)] = registro
+    return vigentes
+
+
+def calcular_delta(filas, vigentes):
+    """
+    Separa las filas en nuevas (clave no cargada antes) y cambiadas.
+    Las cambiadas se retornan como (fila, registro) con el registro ya modificado
+    en memoria; las filas sin cambios se descartan.
+    """
+    nuevas = []
+    cambiadas = []
+    for row in filas:
+        registro = vigentes.get((_texto(row[0]), _texto(row[1])))
+        if registro is None:
+            nuevas.append(row)
+            continue
+        cambio = False
+        for campo, idx in CAMPOS_DELTA:
+            valor = _texto(row[idx]) if campo == 'iny' else _cantidad(row[idx])
+            if valor != getattr(registro, campo):
+                setattr(registro, campo, valor)
+                cambio = True
+        if cambio:
+            cambiadas.append((row, registro))
+    return nuevas, cambiadas
+
+
+def ingestar_delta(archivo, grupos, sha256='', rutas=None, hojas=('',)):
+    """
+    Guarda solo la diferencia contra las cargas anteriores del mismo archivo,
+    comparando cada hoja con lo cargado antes de esa misma hoja.
+
+    Las filas nuevas se insertan en los ExcelProcess de esta carga; las cambiadas
+    se actualizan en su registro original. Retorna (resultado, grupos_delta) donde
+    grupos_delta son, por cada planilla (hoja y ruta), las filas nuevas y
+    cambiadas que van en ella. Si no hay cambios no se crea ninguna carga y los
+    consecutivos del resultado quedan en None.
+    """
+    rutas = rutas or RUTAS
+    destinos = _destinos(rutas, hojas)
+    inicio = time.perf_counter()
+    nombre_archivo = os.path.basename(archivo.name)
+    vigentes = {hoja: registros_vigentes(nombre_archivo, hoja) for hoja in hojas}
+    deltas = [calcular_delta(filas, vigentes[hoja]) for (hoja, _), filas in zip(destinos, grupos)]
+    cambiadas = [registro for _, cambiadas_grupo in deltas for _, registro in cambiadas_grupo]
+    nuevas = sum(len(nuevas_grupo) for nuevas_grupo, _ in deltas)
+    resultado = {
+        'nuevas': nuevas,
+        'actualizadas': len(cambiadas),
+        'sin_cambios': sum(len(filas) for filas in grupos) - nuevas - len(cambiadas),
+    }
+    print(f"Delta contra {sum(len(v) for v in vigentes.values())} registros previos: {nuevas} nuevas, "
+          f"{len(cambiadas)} actualizadas, {resultado['sin_cambios']} sin cambios")
+    grupos_delta = [nuevas_grupo + [row for row, _ in cambiadas_grupo] for nuevas_grupo, cambiadas_grupo in deltas]
+    if not nuevas and not cambiadas:
+        resultado['planillas'] = _planillas(destinos, [None] * len(destinos), grupos_delta)
+        resultado.update(_estadisticas(0, inicio))
+        return _agregar_pdfs(resultado, [None] * len(destinos)), grupos_delta
+
+    guardado = guardar_excel(archivo, sha256)
+    with transaction.atomic():
+        carga, procesos = _asignar_consecutivos(archivo, sha256, guardado, delta=True, rutas=rutas, hojas=hojas,
+                                                filas=[len(filas) for filas in grupos_delta])
+        registros = []
+        for proceso, (nuevas_grupo, _) in zip(procesos, deltas):
+            registros += construir_registros(proceso, nuevas_grupo)
+        RegistroExcel.objects.bulk_create(registros, batch_size=BATCH_SIZE)
+        RegistroExcel.objects.bulk_update(cambiadas, [campo for campo, _ in CAMPOS_DELTA], batch_size=BATCH_SIZE)
+        # Las planillas anteriores con registros cambiados se vuelven a dibujar al pedirlas
+        ExcelProcess.objects.filter(pk__in={registro.proceso_id for registro in cambiadas}).update(
+            version_datos=F('version_datos') + 1)
+        CargaExcel.objects.filter(pk=carga.pk).update(filas=nuevas + len(cambiadas))
+
+    resultado['planillas'] = _planillas(destinos, procesos, grupos_delta)
+    resultado['version'] = carga.version
+    resultado.update(_estadisticas(nuevas + len(cambiadas), inicio))
+    return resultado, grupos_delta
+
+
+# --- Vista previa -------------------------------------------------------------
+# Los operadores suben el libro solo para ver cuántas filas caen en cada bodega
+# y cuánto suman. La vista previa recorre las hojas por bloques y retorna esos
+# conteos sin escribir en la base de datos ni dibujar planillas.
+
+def modo_vista_previa(request):
+    """Indica si se pidió solo la vista previa de la carga (preview=1)."""
+    return bool(_parametro_activo(request, 'preview'))
+
+
+def _hojas_validas(libro):
+    """revisar_hojas, pero lanza ErrorFormatoExcel si ninguna hoja es válida."""
+    validas, omitidas = revisar_hojas(libro)
+    if not validas:
+        raise ErrorFormatoExcel(omitidas[0]['error'] if omitidas else validar_encabezado(())[1])
+    for omitida in omitidas:
+        print(f"Hoja '{omitida['hoja']}' omitida: no tiene el formato esperado")
+    return validas, omitidas
+
+
+def previsualizar_carga(archivo, sha256='', rutas=None):
+    """
+    Cuenta las filas y suma cant_produc (columna nuevo) de cada planilla que
+    generaría el archivo, leyendo las hojas por bloques. No escribe en la base
+    de datos ni genera PDFs. Retorna un diccionario con el mismo formato de
+    planillas y hojas que procesar_carga (con consecutivo y pdf en None), la
+    suma por planilla en 'total_cant_produc' y si el archivo ya se había cargado.
+    Lanza ErrorFormatoExcel si ninguna hoja tiene las columnas requeridas.
+    """
+    rutas = rutas or RUTAS
+    inicio = time.perf_counter()
+    libro = abrir_libro(archivo)
+    try:
+        validas, omitidas = _hojas_validas(libro)
+        destinos = _destinos(rutas, [hoja for hoja, _ in validas])
+        conteos = [0] * len(destinos)
+        totales = [0.0] * len(destinos)
+        for n, (hoja, columnas) in enumerate(validas):
+            desde = n * len(rutas)
+            # Solo se leen las columnas que deciden la planilla y la de cant_produc
+            filas = libro.filas(hoja, solo=columnas_de_clasificacion(columnas, rutas))
+            for grupos in clasificar_bloques(leer_bloques(filas), columnas, rutas):
+                for i, grupo in enumerate(grupos, start=desde):
+                    conteos[i] += len(grupo)
+                    # Misma suma del pie de la planilla: lo que no es número cuenta como 0
+                    totales[i] += sum(_cantidad(row[9]) or 0 for row in grupo)
+    finally:
+        libro.cerrar()
+
+    planillas = _planillas(destinos, [None] * len(destinos), [range(n) for n in conteos])
+    for planilla, total in zip(planillas, totales):
+        planilla['total_cant_produc'] = total
+    segundos = time.perf_counter() - inicio
+    print(f"Vista previa: {sum(conteos)} filas en {segundos:.3f}s")
+    return {
+        'planillas': planillas,
+        'hojas': _agrupar_por_hoja(planillas),
+        'hojas_omitidas': omitidas,
+        'filas': sum(conteos),
+        'total_cant_produc': sum(totales),
+        'segundos': round(segundos, 3),
+        'ya_cargado': bool(sha256) and CargaExcel.objects.filter(sha256=sha256).exists(),
+        'vista_previa': True,
+    }
+
+
+# --- Punto de entrada de las vistas -----------------------------------------
+
+def forzar_reproceso(request):
+    """Indica si se pidió reprocesar un archivo ya cargado (force=1)."""
+    return bool(_parametro_activo(request, 'force'))
+
+
+def sha256_de_carga(request, archivo, campo='archivo'):
+    """
+    Retorna el SHA-256 del archivo subido. Normalmente ya lo calculó
+    HashingUploadHandler durante la subida; si no, se calcula leyendo el archivo.
+    """
+    hashes = getattr(request, 'upload_hashes', {}).get(campo)
+    if hashes:
+        return hashes[0]
+    return sha256_archivo(archivo)
+
+
+def buscar_carga_previa(sha256, rutas=None):
+    """
+    Busca la última carga del mismo archivo. Retorna su resultado (consecutivos y
+    PDFs) o None si no existe, si alguna de sus hojas se repartió en otras bodegas
+    o si es una carga delta y alguno de sus PDFs ya no está en disco.
+    """
+    rutas = rutas or RUTAS
+    if not sha256:
+        return None
+    carga = CargaExcel.objects.filter(sha256=sha256).order_by('-id').first()
+    if not carga:
+        return None
+    por_hoja = {}
+    for proceso in carga.procesos.order_by('consecutivo'):
+        por_hoja.setdefault(proceso.hoja, {})[proceso.bodega] = proceso
+    bodegas = sorted(regla['bodega'] for regla in rutas)
+    if not por_hoja or any(sorted(procesos) != bodegas for procesos in por_hoja.values()):
+        return None
+    destinos = _destinos(rutas, list(por_hoja))
+    procesos = [por_hoja[hoja][regla['bodega']] for hoja, regla in destinos]
+    if carga.delta and not all(os.path.exists(ruta_planilla('planilla', p.consecutivo)) for p in procesos):
+        return None
+    pdfs = [url_planilla(p.consecutivo) for p in procesos]
+    print(f"Archivo ya cargado ({sha256[:12]}), se reutilizan los consecutivos "
+          f"{', '.join(str(p.consecutivo) for p in procesos)}")
+    planillas = _planillas(destinos, procesos, [()] * len(destinos))
+    for planilla, proceso in zip(planillas, procesos):
+        if proceso.filas is None:
+            del planilla['filas']  # Carga delta anterior a ExcelProcess.filas: no se sabe
+        else:
+            planilla['filas'] = proceso.filas
+    resultado = {
+        'planillas': planillas,
+        'filas': carga.filas,
+        'segundos': 0,
+        'filas_por_segundo': 0,
+        'reutilizado': True,
+    }
+    return _agregar_pdfs(resultado, pdfs)
+
+
+def procesar_carga(archivo, streaming=False, sha256='', forzar=False, delta=False):
+    """
+    Procesa un archivo de planilla completo (xlsx, xls o CSV): valida el
+    encabezado de cada hoja, reparte las filas de cada hoja válida entre las
+    bodegas y las guarda, con una planilla por hoja y bodega. Los PDFs se dibujan
+    cuando se piden (ver cache_planillas), salvo los de las cargas delta.
+
+    Las hojas sin el formato esperado se omiten y se informan en
+    resultado['hojas_omitidas']; las hojas vacías se ignoran. Si el mismo
+    contenido (sha256) ya se cargó antes se retorna el resultado anterior, salvo
+    que forzar sea True. Con delta=True solo se guardan las filas nuevas o
+    cambiadas respecto a las cargas anteriores del mismo archivo (el modo delta
+    necesita todas las filas en memoria, así que ignora streaming).
+    Lanza ErrorFormatoExcel si ninguna hoja tiene las columnas requeridas.
+    """
+    if not forzar:
+        previa = buscar_carga_previa(sha256)
+        if previa:
+            return previa
+
+    streaming = streaming and not delta
+    # El formato (xlsx, xls o CSV) se detecta por el contenido del archivo
+    libro = abrir_libro(archivo)
+    try:
+        # Validar los encabezados antes de leer cualquier fila de datos
+        validas, omitidas = _hojas_validas(libro)
+        hojas = [hoja for hoja, _ in validas]
+        if streaming:
+            resultado = ingestar_streaming(archivo, libro, validas, sha256=sha256)
+        else:
+            grupos = leer_hojas(archivo, libro, validas, sha256=sha256)
+            if delta:
+                resultado, grupos = ingestar_delta(archivo, grupos, sha256=sha256, hojas=hojas)
+            else:
+                resultado = ingestar_planillas(archivo, grupos, sha256=sha256, hojas=hojas)
+    finally:
+        libro.cerrar()
+    if not delta:
+        _urls_planillas(resultado)
+    elif resultado['planillas'][0]['consecutivo'] is not None:
+        # Las planillas delta se dibujan con el libro ya cerrado, todas a la vez
+        renderizar_planillas(resultado, grupos)
+    resultado['hojas_omitidas'] = omitidas
+    resultado['reutilizado'] = False
+    resultado['delta'] = delta
+    return resultado
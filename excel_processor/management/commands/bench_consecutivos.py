@@ -0,0 +1,79 @@
+"""
+Prueba de concurrencia del asignador de consecutivos.
+
+Simula cargas simultáneas que reservan dos consecutivos cada una (iny 3/7 y otros)
+y verifica que ningún número se repita. Usa una secuencia propia, así que no
+consume consecutivos reales. Mide solo Secuencia.reservar; la prueba de cargas
+completas simultáneas por /excel/upload_api/ está en excel_processor/tests.py
+(`python manage.py test excel_processor`).
+
+    python manage.py bench_consecutivos --workers 8 --cargas 50
+"""
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from excel_processor.models import Secuencia
+
+SECUENCIA_PRUEBA = 'bench_consecutivos'
+
+
+class Command(BaseCommand):
+    help = 'Reserva consecutivos desde varios hilos en paralelo y verifica que no haya duplicados'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8, help='Cargas simultáneas')
+        parser.add_argument('--cargas', type=int, default=50, help='Cargas por worker')
+        parser.add_argument('--por-carga', type=int, default=2, help='Consecutivos reservados por carga')
+
+    def handle(self, *args, **options):
+        workers = options['workers']
+        cargas = options['cargas']
+        por_carga = options['por_carga']
+        Secuencia.objects.filter(nombre=SECUENCIA_PRUEBA).delete()
+
+        barrera = threading.Barrier(workers)
+
+        def simular_cargas():
+            numeros = []
+            latencias = []
+            barrera.wait()  # Todos los workers arrancan a la vez
+            try:
+                for _ in range(cargas):
+                    inicio = time.perf_counter()
+                    with transaction.atomic():
+                        numeros.extend(Secuencia.reservar(SECUENCIA_PRUEBA, por_carga))
+                    latencias.append(time.perf_counter() - inicio)
+            finally:
+                connection.close()
+            return numeros, latencias
+
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            resultados = list(pool.map(lambda _: simular_cargas(), range(workers)))
+        total = time.perf_counter() - inicio
+
+        numeros = [n for nums, _ in resultados for n in nums]
+        latencias = sorted(l for _, lats in resultados for l in lats)
+        Secuencia.objects.filter(nombre=SECUENCIA_PRUEBA).delete()
+
+        esperados = workers * cargas * por_carga
+        duplicados = len(numeros) - len(set(numeros))
+        self.stdout.write(f"Cargas simuladas: {workers * cargas} ({workers} en paralelo)")
+        self.stdout.write(f"Consecutivos asignados: {len(numeros)} (rango {min(numeros)}-{max(numeros)})")
+        self.stdout.write(f"Duplicados: {duplicados}")
+        self.stdout.write(
+            "Latencia por reserva: "
+            f"p50 {statistics.median(latencias) * 1000:.2f} ms, "
+            f"p95 {latencias[int(len(latencias) * 0.95) - 1] * 1000:.2f} ms, "
+            f"máx {latencias[-1] * 1000:.2f} ms"
+        )
+        self.stdout.write(f"Reservas por segundo: {len(latencias) / total:.0f}")
+
+        if duplicados or sorted(numeros) != list(range(1, esperados + 1)):
+            raise CommandError('Se asignaron consecutivos repetidos o con huecos')
+        self.stdout.write(self.style.SUCCESS('Sin duplicados'))
@@ -0,0 +1,88 @@
+"""
+Compara el tiempo de lectura de una planilla en xlsx y en CSV.
+
+Genera el mismo conjunto de filas en los dos formatos y mide la etapa que
+depende del formato: abrir el archivo, validar el encabezado, leer las filas y
+clasificarlas por bodega. No escribe en la base de datos ni genera PDFs.
+
+    python manage.py bench_formatos --filas 50000
+"""
+import os
+import random
+import statistics
+import tempfile
+import time
+
+import openpyxl
+from django.core.management.base import BaseCommand, CommandError
+
+from excel_processor.hojas import abrir_libro, revisar_hojas
+from excel_processor.ingest import clasificar_filas
+from excel_processor.utils import COLUMNAS_REQUERIDAS
+
+
+def _filas_prueba(cantidad, semilla):
+    aleatorio = random.Random(semilla)
+    for i in range(cantidad):
+        yield [
+            f'OP{100000 + i}', f'PRODUCTO {aleatorio.randint(1, 500)}',
+            aleatorio.randint(10, 500), aleatorio.randint(0, 500), aleatorio.randint(0, 500),
+            aleatorio.choice(['', 'urgente', 'revisar']), f'2025-{aleatorio.randint(1, 12):02d}-15',
+            f'C{i}', aleatorio.randint(0, 50), aleatorio.randint(0, 50), aleatorio.randint(1, 9),
+        ]
+
+
+def _leer(ruta):
+    libro = abrir_libro(ruta)
+    try:
+        validas, _ = revisar_hojas(libro)
+        return [clasificar_filas(libro.filas(hoja), columnas) for hoja, columnas in validas]
+    finally:
+        libro.cerrar()
+
+
+class Command(BaseCommand):
+    help = 'Mide la lectura y clasificación de la misma planilla en formato xlsx y CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--filas', type=int, default=50000, help='Filas de la planilla de prueba')
+        parser.add_argument('--repeticiones', type=int, default=3, help='Lecturas por formato')
+        parser.add_argument('--semilla', type=int, default=1)
+
+    def handle(self, *args, **options):
+        filas = options['filas']
+        with tempfile.TemporaryDirectory() as directorio:
+            ruta_xlsx = os.path.join(directorio, 'planilla.xlsx')
+            ruta_csv = os.path.join(directorio, 'planilla.csv')
+
+            wb = openpyxl.Workbook(write_only=True)
+            ws = wb.create_sheet('Planilla')
+            ws.append(COLUMNAS_REQUERIDAS)
+            with open(ruta_csv, 'w', encoding='utf-8', newline='') as csv:
+                csv.write(','.join(COLUMNAS_REQUERIDAS) + '\n')
+                for fila in _filas_prueba(filas, options['semilla']):
+                    ws.append(fila)
+                    csv.write(','.join(str(valor) for valor in fila) + '\n')
+            wb.save(ruta_xlsx)
+
+            tiempos = {}
+            grupos = {}
+            for formato, ruta in (('xlsx', ruta_xlsx), ('csv', ruta_csv)):
+                tiempos[formato] = []
+                for _ in range(options['repeticiones']):
+                    inicio = time.perf_counter()
+                    grupos[formato] = _leer(ruta)
+                    tiempos[formato].append(time.perf_counter() - inicio)
+                mediana = statistics.median(tiempos[formato])
+                tamano = os.path.getsize(ruta) / (1024 * 1024)
+                self.stdout.write(
+                    f"{formato:>4}: {mediana:.3f}s ({filas / mediana:.0f} filas/s, "
+                    f"mín {min(tiempos[formato]):.3f}s, archivo {tamano:.1f} MB)"
+                )
+
+        if grupos['xlsx'] != grupos['csv']:
+            raise CommandError('Los dos formatos no produjeron las mismas filas')
+        clasificadas = sum(len(grupo) for hoja in grupos['csv'] for grupo in hoja)
+        self.stdout.write(f"Filas clasificadas en las planillas: {clasificadas} (iguales en ambos formatos)")
+        razon = statistics.median(tiempos['xlsx']) / statistics.median(tiempos['csv'])
+        self.stdout.write(self.style.SUCCESS(f"CSV es {razon:.1f}x más rápido que xlsx"))
@@ -0,0 +1,78 @@
+"""
+Mide la combinación de un lote grande de PDFs en serie y en paralelo.
+
+Genera --archivos PDFs de prueba (de 1 a 4 páginas, con texto y gráficos) en
+una carpeta temporal, los combina con combinar_archivos en serie y con
+--procesos procesos, y reporta el tiempo de cada modo. Verifica que ambos
+combinen los mismos archivos con las mismas páginas. Los PDFs de prueba se
+borran al terminar.
+
+    python manage.py bench_lotes_pdf --archivos 500 --procesos 4
+"""
+import os
+import random
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+from reportlab.lib.pagesizes import letter
+from reportlab.pdfgen import canvas
+
+from excel_processor.pdf_utils import PROCESOS_LOTE, combinar_archivos
+
+
+def _generar_pdfs(carpeta, cantidad, semilla):
+    aleatorio = random.Random(semilla)
+    rutas = []
+    for n in range(cantidad):
+        ruta = os.path.join(carpeta, f'prueba_{n:04d}.pdf')
+        c = canvas.Canvas(ruta, pagesize=letter)
+        for pagina in range(aleatorio.randint(1, 4)):
+            c.setFont('Helvetica-Bold', 16)
+            c.drawString(72, 720, f'Documento {n} - página {pagina + 1}')
+            c.setFont('Helvetica', 9)
+            for linea in range(60):
+                c.drawString(72, 690 - linea * 10, ' '.join(
+                    f'{aleatorio.randint(0, 99999):05d}' for _ in range(12)))
+            c.rect(400, 60, aleatorio.randint(20, 120), 40, fill=1)
+            c.showPage()
+        c.save()
+        rutas.append(ruta)
+    return rutas
+
+
+class Command(BaseCommand):
+    help = 'Compara la combinación de un lote de PDFs en serie y en paralelo'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--archivos', type=int, default=500, help='PDFs de prueba del lote')
+        parser.add_argument('--procesos', type=int, default=max(PROCESOS_LOTE, os.cpu_count() or 1, 2),
+                            help='Procesos del modo paralelo')
+        parser.add_argument('--semilla', type=int, default=1)
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory(prefix='bench_lotes_pdf_') as carpeta:
+            inicio = time.perf_counter()
+            rutas = _generar_pdfs(carpeta, options['archivos'], options['semilla'])
+            tamano = sum(os.path.getsize(ruta) for ruta in rutas)
+            self.stdout.write(f"{len(rutas)} PDFs de prueba ({tamano / 1024 / 1024:.1f} MB) "
+                              f"generados en {time.perf_counter() - inicio:.1f}s")
+
+            resultados = {}
+            for nombre, procesos in (('serie', 0), ('paralelo', options['procesos'])):
+                salida = os.path.join(carpeta, f'combinado_{nombre}.pdf')
+                inicio = time.perf_counter()
+                archivos, paginas = combinar_archivos(rutas, salida, procesos)
+                segundos = time.perf_counter() - inicio
+                resultados[nombre] = (archivos, paginas, segundos)
+                self.stdout.write(
+                    f"{nombre:<8} ({procesos} procesos): {segundos:7.2f}s, {paginas} páginas, "
+                    f"{os.path.getsize(salida) / 1024 / 1024:.1f} MB, "
+                    f"{segundos / len(rutas) * 1000:.1f} ms por archivo"
+                )
+
+        serie, paralelo = resultados['serie'], resultados['paralelo']
+        if serie[:2] != paralelo[:2]:
+            self.stderr.write(self.style.ERROR('Los modos no combinaron los mismos archivos y páginas'))
+            return
+        self.stdout.write(self.style.SUCCESS(f"Mismo resultado; aceleración x{serie[2] / paralelo[2]:.2f}"))
@@ -0,0 +1,140 @@
+"""
+Compara los motores para combinar lotes de PDFs (ver pdf_utils.MOTORES).
+
+Genera un lote de prueba en una carpeta temporal: --archivos PDFs de texto (como
+en bench_lotes_pdf) y, entre ellos, una parte (--escaneados) de páginas
+escaneadas, es decir, una imagen JPEG grande por página. Cada motor combina el
+mismo lote en serie en un proceso nuevo y se reporta el tiempo, el pico de
+memoria (RSS) del proceso y el tamaño del PDF combinado. Los motores que no se
+pueden usar (p. ej. 'pdfium' sin pypdfium2) se omiten. Los PDFs de prueba se
+borran al terminar.
+
+    python manage.py bench_motores_pdf --archivos 300 --escaneados 0.2
+    python manage.py bench_motores_pdf --motores incremental,pypdf2
+"""
+import contextlib
+import io
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from PIL import Image
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.utils import ImageReader
+from reportlab.pdfgen import canvas
+
+from excel_processor.management.commands.bench_lotes_pdf import _generar_pdfs
+from excel_processor.pdf_utils import MOTORES, combinar_grupo
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def _generar_escaneados(carpeta, cantidad, semilla):
+    # Páginas de 1240x1754 px (A4 a 150 ppp) en escala de grises con ruido, que
+    # se comprime mal como un escaneo real
+    aleatorio = random.Random(semilla)
+    rutas = []
+    for n in range(cantidad):
+        ruta = os.path.join(carpeta, f'escaneo_{n:04d}.pdf')
+        c = canvas.Canvas(ruta, pagesize=letter)
+        for pagina in range(aleatorio.randint(1, 3)):
+            imagen = Image.frombytes('L', (620, 877), aleatorio.randbytes(620 * 877)).resize((1240, 1754))
+            jpeg = io.BytesIO()
+            imagen.save(jpeg, 'JPEG', quality=75)
+            jpeg.seek(0)
+            c.drawImage(ImageReader(jpeg), 0, 0, *letter)
+            c.showPage()
+        c.save()
+        rutas.append(ruta)
+    return rutas
+
+
+def _pico_memoria_mb():
+    # VmHWM es el pico del proceso actual; ru_maxrss en Linux conserva el del
+    # proceso que lo lanzó (el que generó el lote de prueba)
+    try:
+        with open('/proc/self/status') as estado:
+            for linea in estado:
+                if linea.startswith('VmHWM:'):
+                    return int(linea.split()[1]) / 1024
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024 / 1024  # Bytes en macOS
+
+
+def _medir(motor, rutas, salida):
+    # Corre en un proceso nuevo para que el pico de memoria sea solo el del motor
+    import django
+    django.setup()
+    pico_inicial = _pico_memoria_mb()
+    inicio = time.perf_counter()
+    with open(os.devnull, 'w') as nulo, contextlib.redirect_stdout(nulo):
+        archivos, paginas = combinar_grupo(rutas, salida, motor=motor)
+    segundos = time.perf_counter() - inicio
+    return len(archivos), paginas, segundos, pico_inicial, _pico_memoria_mb()
+
+
+def _disponible(motor):
+    try:
+        with tempfile.TemporaryFile() as salida:
+            MOTORES[motor](salida)
+        return True
+    except Exception:
+        return False
+
+
+class Command(BaseCommand):
+    help = 'Compara el tiempo, la memoria y el tamaño de salida de los motores para combinar PDFs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--archivos', type=int, default=300, help='PDFs de prueba del lote')
+        parser.add_argument('--escaneados', type=float, default=0.2,
+                            help='Fracción de los PDFs con páginas escaneadas (imágenes)')
+        parser.add_argument('--motores', default=','.join(MOTORES),
+                            help='Motores a comparar, separados por coma')
+        parser.add_argument('--semilla', type=int, default=1)
+
+    def handle(self, *args, **options):
+        motores = [motor.strip() for motor in options['motores'].split(',') if motor.strip()]
+        desconocidos = [motor for motor in motores if motor not in MOTORES]
+        if desconocidos:
+            raise CommandError(f"Motores desconocidos: {', '.join(desconocidos)} (opciones: {', '.join(MOTORES)})")
+        for motor in [motor for motor in motores if not _disponible(motor)]:
+            self.stdout.write(self.style.WARNING(f"Motor {motor} no disponible en este entorno; se omite"))
+            motores.remove(motor)
+
+        contexto = multiprocessing.get_context('spawn')
+        with tempfile.TemporaryDirectory(prefix='bench_motores_pdf_') as carpeta:
+            inicio = time.perf_counter()
+            escaneados = round(options['archivos'] * options['escaneados'])
+            rutas = _generar_pdfs(carpeta, options['archivos'] - escaneados, options['semilla'])
+            rutas += _generar_escaneados(carpeta, escaneados, options['semilla'])
+            random.Random(options['semilla']).shuffle(rutas)
+            tamano = sum(os.path.getsize(ruta) for ruta in rutas)
+            self.stdout.write(f"{len(rutas)} PDFs de prueba ({escaneados} escaneados, {tamano / 1024 / 1024:.1f} MB) "
+                              f"generados en {time.perf_counter() - inicio:.1f}s")
+
+            resultados = {}
+            for motor in motores:
+                salida = os.path.join(carpeta, f'combinado_{motor}.pdf')
+                with contexto.Pool(1) as pool:
+                    archivos, paginas, segundos, pico_inicial, pico = pool.apply(_medir, (motor, rutas, salida))
+                resultados[motor] = (archivos, paginas)
+                memoria = f"{pico:7.1f} MB pico (+{pico - pico_inicial:.1f})" if pico is not None else "pico n/d"
+                self.stdout.write(
+                    f"{motor:<12} {segundos:7.2f}s, {memoria}, {paginas} páginas, "
+                    f"{os.path.getsize(salida) / 1024 / 1024:.1f} MB de salida"
+                )
+
+        if len(set(resultados.values())) > 1:
+            self.stderr.write(self.style.ERROR('Los motores no combinaron los mismos archivos y páginas'))
+            return
+        self.stdout.write(self.style.SUCCESS('Todos los motores combinaron los mismos archivos y páginas'))
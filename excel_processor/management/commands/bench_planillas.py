@@ -0,0 +1,58 @@
+"""
+Mide el dibujo de una planilla PDF grande.
+
+Genera filas de prueba, dibuja la planilla varias veces con PlanillaPDF y
+reporta el tiempo, las páginas y el tamaño del archivo. Los PDFs de prueba se
+borran al terminar.
+
+    python manage.py bench_planillas --filas 10000
+"""
+import os
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+
+from excel_processor.pdf_planilla import PlanillaPDF
+
+
+def _filas_prueba(cantidad, semilla):
+    aleatorio = random.Random(semilla)
+    return [
+        (f'OP{100000 + i}', f'PRODUCTO {aleatorio.randint(1, 500)}', aleatorio.randint(10, 500),
+         aleatorio.randint(0, 500), 0, '', '', '', 0, aleatorio.randint(1, 50), aleatorio.randint(1, 9))
+        for i in range(cantidad)
+    ]
+
+
+class Command(BaseCommand):
+    help = 'Mide el tiempo de dibujo y el tamaño de una planilla PDF con muchas filas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--filas', type=int, default=10000, help='Filas de la planilla de prueba')
+        parser.add_argument('--repeticiones', type=int, default=3, help='Planillas dibujadas')
+        parser.add_argument('--semilla', type=int, default=1)
+
+    def handle(self, *args, **options):
+        filas = _filas_prueba(options['filas'], options['semilla'])
+        tiempos = []
+        for n in range(options['repeticiones']):
+            inicio = time.perf_counter()
+            planilla = PlanillaPDF('bench_planilla', n)
+            planilla.agregar_filas(filas)
+            ruta = planilla.cerrar()
+            tiempos.append(time.perf_counter() - inicio)
+            paginas = planilla.pagina
+            tamano = os.path.getsize(ruta)
+            os.remove(ruta)
+
+        mediana = statistics.median(tiempos)
+        self.stdout.write(f"Filas: {len(filas)}, páginas: {paginas}")
+        self.stdout.write(
+            f"Dibujo: {mediana:.3f}s (mín {min(tiempos):.3f}s), "
+            f"{len(filas) / mediana:.0f} filas/s, {mediana / paginas * 1000:.2f} ms por página"
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Tamaño: {tamano / 1024:.0f} KB ({tamano / paginas / 1024:.1f} KB por página)"
+        ))
@@ -0,0 +1,87 @@
+"""
+Mide la exportación a PDF de tablas grandes (histórico de cálculos).
+
+Dibuja la misma tabla de prueba con TablaPDF para cada cantidad de filas y, hasta
+--max-platypus filas, también con una Table de platypus como la que usaban los
+reportes. Reporta el tiempo, el tiempo por fila (constante si la exportación es
+lineal), las páginas y el tamaño del PDF.
+
+    python manage.py bench_tablas --filas 1000 10000 100000
+"""
+import io
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import letter
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle
+
+from backend.pdf_tabla import TablaPDF
+
+ENCABEZADOS = ['Referencia', 'Talla', 'Ventas Pendientes', 'Inventario',
+               'Producción', 'Total Disponible', 'Balance', 'Fecha Cálculo']
+
+
+def _filas_prueba(cantidad, semilla):
+    aleatorio = random.Random(semilla)
+    for i in range(cantidad):
+        ventas, inventario, produccion = (aleatorio.randint(0, 900) for _ in range(3))
+        yield [f'REF{aleatorio.randint(1000, 9999)}', aleatorio.choice(['S', 'M', 'L', 'XL', '10', '12']),
+               ventas, inventario, produccion, inventario + produccion, inventario + produccion - ventas,
+               f'2025-{aleatorio.randint(1, 12):02d}-{aleatorio.randint(1, 28):02d} 10:{i % 60:02d}']
+
+
+def _tabla_pdf(filas):
+    salida = io.BytesIO()
+    tabla = TablaPDF(salida, ENCABEZADOS)
+    tabla.agregar_filas(filas)
+    tabla.cerrar()
+    return salida.getvalue(), tabla.paginas
+
+
+def _platypus(filas):
+    salida = io.BytesIO()
+    paginas = []
+    doc = SimpleDocTemplate(salida, pagesize=letter)
+    table = Table([ENCABEZADOS] + [[str(valor) for valor in fila] for fila in filas])
+    table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 12),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('FONTSIZE', (0, 1), (-1, -1), 10),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+    ]))
+    doc.build([table], onLaterPages=lambda c, d: paginas.append(1))
+    return salida.getvalue(), len(paginas) + 1
+
+
+class Command(BaseCommand):
+    help = 'Mide la exportación a PDF de tablas grandes con TablaPDF y con platypus'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--filas', type=int, nargs='+', default=[1000, 10000, 100000],
+                            help='Cantidades de filas a medir')
+        parser.add_argument('--max-platypus', type=int, default=10000,
+                            help='Mayor cantidad de filas que se mide también con platypus')
+        parser.add_argument('--semilla', type=int, default=1)
+
+    def handle(self, *args, **options):
+        for cantidad in sorted(options['filas']):
+            filas = list(_filas_prueba(cantidad, options['semilla']))
+            motores = [('TablaPDF', _tabla_pdf)]
+            if cantidad <= options['max_platypus']:
+                motores.append(('platypus', _platypus))
+            for nombre, dibujar in motores:
+                inicio = time.perf_counter()
+                pdf, paginas = dibujar(filas)
+                segundos = time.perf_counter() - inicio
+                self.stdout.write(
+                    f"{cantidad:>7} filas, {nombre:<8}: {segundos:7.3f}s "
+                    f"({segundos / cantidad * 1e6:5.1f} µs por fila, {paginas} páginas, {len(pdf) / 1024:.0f} KB)"
+                )
+        self.stdout.write(self.style.SUCCESS('Listo'))
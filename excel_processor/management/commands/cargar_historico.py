@@ -0,0 +1,181 @@
+"""
+Carga masiva de planillas históricas (Excel o CSV) desde un directorio.
+
+Recorre el directorio (y sus subdirectorios) y procesa cada libro con la misma
+lógica de upload_excel (procesar_carga), repartiendo los archivos entre varios
+procesos. Cada archivo terminado se anota en un archivo de control, así que si
+la carga se interrumpe basta con volver a ejecutar el comando para continuar.
+
+    python manage.py cargar_historico D:/planillas --workers 4
+"""
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connections
+
+ARCHIVO_CONTROL = '.cargar_historico.jsonl'
+EXTENSIONES = ('.xlsx', '.xlsm', '.xls', '.csv')
+REINTENTOS_BLOQUEO = 5
+
+
+def _inicializar_worker():
+    # En Windows los workers arrancan desde cero y hay que configurar Django
+    django.setup()
+    from excel_processor import ingest
+    # Los archivos ya se procesan en paralelo; cada worker lee sus hojas y dibuja sus planillas en serie
+    ingest.PROCESOS_PLANILLAS = 0
+
+
+def _sha256(ruta):
+    hasher = hashlib.sha256()
+    with open(ruta, 'rb') as f:
+        for bloque in iter(lambda: f.read(1024 * 1024), b''):
+            hasher.update(bloque)
+    return hasher.hexdigest()
+
+
+def _cargar_archivo(ruta, sha256, streaming):
+    """Procesa un archivo dentro de un worker y retorna un resumen serializable."""
+    from django.core.files import File
+    from excel_processor.ingest import ErrorFormatoExcel, procesar_carga
+
+    inicio = time.perf_counter()
+    for intento in range(1, REINTENTOS_BLOQUEO + 1):
+        try:
+            with open(ruta, 'rb') as f:
+                archivo = File(f, name=os.path.basename(ruta))
+                resultado = procesar_carga(archivo, streaming=streaming, sha256=sha256)
+            return {
+                'estado': 'ok',
+                'filas': resultado['filas'],
+                'reutilizado': resultado['reutilizado'],
+                'consecutivos': [planilla['consecutivo'] for planilla in resultado['planillas']],
+                'segundos': round(time.perf_counter() - inicio, 3),
+            }
+        except ErrorFormatoExcel as e:
+            return {'estado': 'formato', 'error': str(e).splitlines()[0]}
+        except OperationalError as e:
+            # SQLite admite un solo escritor; si la espera se agota se reintenta
+            if 'locked' not in str(e) or intento == REINTENTOS_BLOQUEO:
+                return {'estado': 'error', 'error': str(e)}
+            time.sleep(intento)
+        except Exception as e:
+            return {'estado': 'error', 'error': f"{type(e).__name__}: {e}"}
+
+
+class Command(BaseCommand):
+    help = 'Carga en paralelo todos los libros Excel de un directorio, con reanudación'
+
+    def add_arguments(self, parser):
+        parser.add_argument('directorio', help='Directorio con las planillas históricas')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Procesos en paralelo (por defecto uno por CPU)')
+        parser.add_argument('--control', default=None,
+                            help=f'Archivo de control para reanudar (por defecto <directorio>/{ARCHIVO_CONTROL})')
+        parser.add_argument('--streaming', action='store_true',
+                            help='Leer los libros en modo streaming (menos memoria por worker)')
+        parser.add_argument('--reintentar-errores', action='store_true',
+                            help='Volver a procesar los archivos que fallaron en ejecuciones anteriores')
+
+    def _leer_control(self, ruta_control, reintentar_errores):
+        terminados = set()
+        if not os.path.exists(ruta_control):
+            return terminados
+        with open(ruta_control, encoding='utf-8') as f:
+            for linea in f:
+                try:
+                    entrada = json.loads(linea)
+                except ValueError:
+                    continue  # Línea incompleta de una ejecución interrumpida
+                if entrada['estado'] == 'ok' or not reintentar_errores:
+                    terminados.add(entrada['archivo'])
+        return terminados
+
+    def _registrar(self, control, resumen, relativa, n, total):
+        """Anota el resultado de un archivo en el control y en la consola."""
+        resumen['archivo'] = relativa
+        control.write(json.dumps(resumen, ensure_ascii=False) + '\n')
+        control.flush()
+        if resumen['estado'] != 'ok':
+            self.stdout.write(self.style.WARNING(f"[{n}/{total}] {relativa}: {resumen['error']}"))
+            return resumen['estado'], 0
+        if resumen['reutilizado']:
+            self.stdout.write(f"[{n}/{total}] {relativa}: {resumen['filas']} filas (ya cargado)")
+            return 'reutilizado', 0
+        self.stdout.write(f"[{n}/{total}] {relativa}: {resumen['filas']} filas")
+        return 'ok', resumen['filas']
+
+    def handle(self, *args, **options):
+        directorio = os.path.abspath(options['directorio'])
+        if not os.path.isdir(directorio):
+            raise CommandError(f"No existe el directorio {directorio}")
+        ruta_control = options['control'] or os.path.join(directorio, ARCHIVO_CONTROL)
+        terminados = self._leer_control(ruta_control, options['reintentar_errores'])
+
+        pendientes = []
+        for raiz, _, archivos in os.walk(directorio):
+            for nombre in sorted(archivos):
+                if not nombre.lower().endswith(EXTENSIONES) or nombre.startswith('~$'):
+                    continue
+                relativa = os.path.relpath(os.path.join(raiz, nombre), directorio)
+                if relativa not in terminados:
+                    pendientes.append(relativa)
+        pendientes.sort()
+        self.stdout.write(f"Archivos pendientes: {len(pendientes)} (ya cargados: {len(terminados)})")
+        if not pendientes:
+            return
+
+        inicio = time.perf_counter()
+        # Los archivos con el mismo contenido (copias) esperan a que termine el
+        # primero; así no se cargan dos veces en paralelo y luego se reutilizan
+        copias = {}
+        for relativa in pendientes:
+            copias.setdefault(_sha256(os.path.join(directorio, relativa)), []).append(relativa)
+
+        # Los workers no deben heredar la conexión abierta del proceso principal
+        connections.close_all()
+        conteo = {'ok': 0, 'reutilizado': 0, 'formato': 0, 'error': 0}
+        filas = 0
+        with open(ruta_control, 'a', encoding='utf-8') as control, \
+                ProcessPoolExecutor(max_workers=options['workers'], initializer=_inicializar_worker) as pool:
+            futuros = {}
+
+            def enviar(relativa, sha256):
+                futuro = pool.submit(_cargar_archivo, os.path.join(directorio, relativa), sha256, options['streaming'])
+                futuros[futuro] = (relativa, sha256)
+
+            for sha256, relativas in copias.items():
+                enviar(relativas.pop(0), sha256)
+            n = 0
+            try:
+                while futuros:
+                    terminados_ahora, _ = wait(futuros, return_when=FIRST_COMPLETED)
+                    for futuro in terminados_ahora:
+                        relativa, sha256 = futuros.pop(futuro)
+                        for copia in copias.pop(sha256, []):
+                            enviar(copia, sha256)
+                        n += 1
+                        clave, filas_archivo = self._registrar(control, futuro.result(), relativa, n, len(pendientes))
+                        conteo[clave] += 1
+                        filas += filas_archivo
+            except KeyboardInterrupt:
+                # Los archivos en curso no quedan en el control: se repiten al reanudar
+                pool.shutdown(wait=False, cancel_futures=True)
+                self.stdout.write(self.style.WARNING('Interrumpido; vuelva a ejecutar el comando para continuar'))
+
+        segundos = time.perf_counter() - inicio
+        procesados = sum(conteo.values())
+        self.stdout.write(
+            f"Cargados: {conteo['ok']}, ya existentes: {conteo['reutilizado']}, "
+            f"formato inválido: {conteo['formato']}, con error: {conteo['error']}"
+        )
+        self.stdout.write(
+            f"{procesados} archivos y {filas} filas en {segundos:.1f}s: "
+            f"{procesados / segundos:.2f} archivos/s, {filas / segundos:.0f} filas/s"
+        )
+        self.stdout.write(self.style.SUCCESS(f"Progreso guardado en {ruta_control}"))
@@ -0,0 +1,56 @@
+"""
+Migra los libros Excel ya cargados al almacenamiento por contenido.
+
+Antes cada ExcelProcess guardaba su propia copia del archivo (de ahí los
+duplicados con sufijo _xxxxxxx en media/excels). Este comando apunta cada
+proceso a la copia única excels/ab/<sha256>.xlsx y, con --borrar, elimina las
+copias antiguas que quedan sin referencias.
+
+    python manage.py deduplicar_excels --borrar
+"""
+import os
+
+from django.core.management.base import BaseCommand
+from django.core.files import File
+
+from excel_processor.models import ExcelProcess
+from excel_processor.storage import DIR_EXCELS, almacenamiento_excels, guardar_excel
+
+
+class Command(BaseCommand):
+    help = 'Reemplaza las copias repetidas de los Excel cargados por una copia única por contenido'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--borrar', action='store_true',
+                            help='Elimina las copias antiguas después de migrarlas')
+
+    def handle(self, *args, **options):
+        guardados = {}  # nombre antiguo -> nombre por contenido
+        antiguos = set()
+        sin_archivo = 0
+        for proceso in ExcelProcess.objects.exclude(archivo='').iterator():
+            nombre = proceso.archivo.name
+            if nombre.count('/') == 2 and nombre.startswith(f'{DIR_EXCELS}/'):
+                continue  # Ya está en el almacenamiento por contenido
+            if nombre not in guardados:
+                ruta = almacenamiento_excels.path(nombre)
+                if not os.path.exists(ruta):
+                    sin_archivo += 1
+                    continue
+                with open(ruta, 'rb') as f:
+                    guardados[nombre] = guardar_excel(File(f, name=nombre))
+                antiguos.add(ruta)
+            ExcelProcess.objects.filter(pk=proceso.pk).update(archivo=guardados[nombre])
+
+        copias = len(set(guardados.values()))
+        self.stdout.write(f"Archivos migrados: {len(guardados)} -> {copias} copias únicas")
+        if sin_archivo:
+            self.stdout.write(self.style.WARNING(f"Procesos cuyo archivo ya no existe: {sin_archivo}"))
+
+        if options['borrar']:
+            liberados = 0
+            for ruta in antiguos:
+                liberados += os.path.getsize(ruta)
+                os.remove(ruta)
+            self.stdout.write(f"Copias antiguas eliminadas: {len(antiguos)} ({liberados / (1024 * 1024):.1f} MB)")
+        self.stdout.write(self.style.SUCCESS('Listo'))
@@ -0,0 +1,40 @@
+"""
+Borra los archivos temporales abandonados de los lotes de PDFs.
+
+Los archivos de media/temp_uploads con más de --horas horas (por defecto
+PDF_TEMP_RETENCION_HORAS) y las subidas por partes que dejaron de recibir datos
+hace más de PDF_SUBIDA_HORAS. El worker de procesar_trabajos hace lo mismo cada
+pocos minutos; este comando sirve cuando no hay worker (cron) o con --continuo.
+
+    python manage.py limpiar_temporales
+    python manage.py limpiar_temporales --continuo --intervalo 600
+"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from excel_processor.temporales import RETENCION_TEMPORALES, limpiar_temporales
+
+
+class Command(BaseCommand):
+    help = 'Borra los archivos temporales abandonados de los lotes de PDFs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--horas', type=float, default=RETENCION_TEMPORALES,
+                            help='Antigüedad a partir de la cual se borra un archivo de temp_uploads')
+        parser.add_argument('--continuo', action='store_true',
+                            help='Repite la limpieza hasta que se detenga con Ctrl+C')
+        parser.add_argument('--intervalo', type=float, default=600,
+                            help='Segundos entre limpiezas con --continuo')
+
+    def handle(self, *args, **options):
+        borrados = 0
+        try:
+            while True:
+                borrados += limpiar_temporales(options['horas'])
+                if not options['continuo']:
+                    break
+                time.sleep(options['intervalo'])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(f'Archivos eliminados: {borrados}'))
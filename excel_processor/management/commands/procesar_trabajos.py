@@ -0,0 +1,61 @@
+"""
+Worker de la cola de trabajos en segundo plano.
+
+Toma los trabajos pendientes de la tabla Trabajo (cargas de Excel y combinación
+de PDFs) y los ejecuta uno por uno. Se pueden correr varios workers a la vez.
+Cuando la cola está vacía también borra los archivos temporales abandonados
+(ver limpiar_temporales).
+
+    python manage.py procesar_trabajos
+    python manage.py procesar_trabajos --una-vez
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from excel_processor.temporales import limpiar_temporales
+from excel_processor.trabajos import ejecutar, recuperar_abandonados, tomar_siguiente
+
+# Segundos entre limpiezas de archivos temporales
+INTERVALO_LIMPIEZA = 600
+
+
+class Command(BaseCommand):
+    help = 'Procesa los trabajos en segundo plano encolados por las vistas de carga'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--una-vez', action='store_true',
+                            help='Procesa los trabajos pendientes y termina')
+        parser.add_argument('--intervalo', type=float, default=2.0,
+                            help='Segundos de espera cuando la cola está vacía')
+
+    def handle(self, *args, **options):
+        una_vez = options['una_vez']
+        intervalo = options['intervalo']
+        self.stdout.write('Worker de trabajos iniciado')
+        recuperar_abandonados()
+        procesados = 0
+        ultima_revision = time.monotonic()
+        ultima_limpieza = None
+        try:
+            while True:
+                close_old_connections()
+                trabajo = tomar_siguiente()
+                if trabajo:
+                    ejecutar(trabajo)
+                    procesados += 1
+                    continue
+                if una_vez:
+                    break
+                # Revisar periódicamente si otro worker dejó trabajos a medias
+                if time.monotonic() - ultima_revision > 60:
+                    recuperar_abandonados()
+                    ultima_revision = time.monotonic()
+                if ultima_limpieza is None or time.monotonic() - ultima_limpieza > INTERVALO_LIMPIEZA:
+                    limpiar_temporales()
+                    ultima_limpieza = time.monotonic()
+                time.sleep(intervalo)
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(f'Trabajos procesados: {procesados}'))
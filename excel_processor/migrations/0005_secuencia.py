@@ -0,0 +1,35 @@
+# Generated by Django 5.2.1 on 2026-10-17 20:52
+
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def crear_secuencia_consecutivo(apps, schema_editor):
+    ExcelProcess = apps.get_model('excel_processor', 'ExcelProcess')
+    Secuencia = apps.get_model('excel_processor', 'Secuencia')
+    ultimo = ExcelProcess.objects.aggregate(ultimo=Max('consecutivo'))['ultimo'] or 0
+    Secuencia.objects.update_or_create(nombre='excel_process', defaults={'valor': ultimo})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('excel_processor', '0004_pdfprocesshistory_pages'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Secuencia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=50, unique=True)),
+                ('valor', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='excelprocess',
+            name='consecutivo',
+            field=models.IntegerField(db_index=True),
+        ),
+        migrations.RunPython(crear_secuencia_consecutivo, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.1 on 2026-10-17 20:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('excel_processor', '0005_secuencia'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CargaExcel',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sha256', models.CharField(db_index=True, max_length=64)),
+                ('nombre_archivo', models.CharField(max_length=255)),
+                ('filas', models.IntegerField(default=0)),
+                ('fecha_carga', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='excelprocess',
+            name='carga',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='procesos', to='excel_processor.cargaexcel'),
+        ),
+    ]
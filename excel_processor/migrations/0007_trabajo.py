@@ -0,0 +1,30 @@
+# Generated by Django 5.2.1 on 2026-10-17 20:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('excel_processor', '0006_cargaexcel'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Trabajo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('excel', 'Carga de Excel'), ('pdf_lote', 'Combinación de PDFs')], max_length=20)),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('en_proceso', 'En proceso'), ('completado', 'Completado'), ('error', 'Error')], db_index=True, default='pendiente', max_length=20)),
+                ('parametros', models.JSONField(default=dict)),
+                ('resultado', models.JSONField(blank=True, null=True)),
+                ('error', models.TextField(blank=True, null=True)),
+                ('progreso', models.IntegerField(default=0)),
+                ('mensaje', models.CharField(blank=True, default='', max_length=255)),
+                ('intentos', models.IntegerField(default=0)),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True)),
+                ('fecha_inicio', models.DateTimeField(blank=True, null=True)),
+                ('fecha_fin', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.1 on 2026-10-17 20:59
+
+from django.db import migrations, models
+
+
+def numerar_versiones(apps, schema_editor):
+    CargaExcel = apps.get_model('excel_processor', 'CargaExcel')
+    versiones = {}
+    for carga in CargaExcel.objects.order_by('id'):
+        versiones[carga.nombre_archivo] = versiones.get(carga.nombre_archivo, 0) + 1
+        if versiones[carga.nombre_archivo] > 1:
+            CargaExcel.objects.filter(pk=carga.pk).update(version=versiones[carga.nombre_archivo])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('excel_processor', '0007_trabajo'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cargaexcel',
+            name='delta',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='cargaexcel',
+            name='version',
+            field=models.IntegerField(default=1),
+        ),
+        migrations.AlterField(
+            model_name='cargaexcel',
+            name='nombre_archivo',
+            field=models.CharField(db_index=True, max_length=255),
+        ),
+        migrations.RunPython(numerar_versiones, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.1 on 2026-10-17 21:03
+
+from django.db import migrations, models
+
+
+def asignar_bodegas(apps, schema_editor):
+    # Antes de las rutas configurables cada carga tenía dos planillas: la de
+    # menor consecutivo era iny 3/7 y la otra "otros"
+    CargaExcel = apps.get_model('excel_processor', 'CargaExcel')
+    ExcelProcess = apps.get_model('excel_processor', 'ExcelProcess')
+    for carga_id in CargaExcel.objects.values_list('id', flat=True):
+        procesos = list(ExcelProcess.objects.filter(carga_id=carga_id).order_by('consecutivo'))
+        if len(procesos) == 2:
+            for proceso, bodega in zip(procesos, ('3_7', 'otros')):
+                ExcelProcess.objects.filter(pk=proceso.pk).update(bodega=bodega)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('excel_processor', '0008_cargaexcel_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='excelprocess',
+            name='bodega',
+            field=models.CharField(blank=True, default='', max_length=50),
+        ),
+        migrations.RunPython(asignar_bodegas, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-17 21:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('excel_processor', '0009_excelprocess_bodega'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='excelprocess',
+            name='hoja',
+            field=models.CharField(blank=True, default='', max_length=100),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-17 21:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('excel_processor', '0010_excelprocess_hoja'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='excelprocess',
+            name='version_datos',
+            field=models.IntegerField(default=1),
+        ),
+    ]
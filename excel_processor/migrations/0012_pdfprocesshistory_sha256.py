@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-17 21:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('excel_processor', '0011_excelprocess_version_datos'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pdfprocesshistory',
+            name='sha256',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=64),
+        ),
+    ]
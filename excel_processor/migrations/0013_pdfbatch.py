@@ -0,0 +1,89 @@
+# Generated by Django 5.2.1 on 2026-10-17 22:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+import os
+
+
+def copiar_historial(apps, schema_editor):
+    # Cada PDF combinado era una fila con filepath == output_path y sus archivos
+    # filas con el mismo output_path creadas justo después; las filas que no son
+    # de un lote quedan como un PDFBatch sin archivos
+    PDFProcessHistory = apps.get_model('excel_processor', 'PDFProcessHistory')
+    PDFBatch = apps.get_model('excel_processor', 'PDFBatch')
+    PDFBatchMember = apps.get_model('excel_processor', 'PDFBatchMember')
+    PDFBatch._meta.get_field('process_date').auto_now_add = False  # Conservar las fechas originales
+
+    lotes, miembros, lote_por_ruta = [], [], {}
+    for fila in PDFProcessHistory.objects.order_by('id').iterator(chunk_size=2000):
+        es_miembro = fila.is_batch and fila.output_path and fila.filepath != fila.output_path
+        if es_miembro and fila.output_path in lote_por_ruta:
+            lote = lote_por_ruta[fila.output_path]
+        else:
+            lote = PDFBatch(
+                filename=os.path.basename(fila.output_path) if es_miembro else fila.filename,
+                filepath=fila.output_path if es_miembro else fila.filepath,
+                process_date=fila.process_date,
+                success=fila.success,
+                error_message=fila.error_message,
+                pages=0 if es_miembro else fila.pages,
+                sha256='' if es_miembro else fila.sha256,
+            )
+            lotes.append(lote)
+            if fila.is_batch and fila.output_path:
+                lote_por_ruta[fila.output_path] = lote
+        if es_miembro:
+            miembros.append(PDFBatchMember(
+                lote=lote, orden=lote.archivos, filename=fila.filename,
+                filepath=fila.filepath, pages=fila.pages, sha256=fila.sha256,
+            ))
+            lote.archivos += 1
+
+    PDFBatch.objects.bulk_create(lotes, batch_size=500)
+    for miembro in miembros:
+        miembro.lote_id = miembro.lote.id
+    PDFBatchMember.objects.bulk_create(miembros, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('excel_processor', '0012_pdfprocesshistory_sha256'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PDFBatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('filename', models.CharField(db_index=True, max_length=255)),
+                ('filepath', models.CharField(max_length=500)),
+                ('process_date', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('success', models.BooleanField(default=True)),
+                ('error_message', models.TextField(blank=True, null=True)),
+                ('pages', models.IntegerField(default=0)),
+                ('archivos', models.IntegerField(default=0)),
+                ('sha256', models.CharField(blank=True, db_index=True, default='', max_length=64)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PDFBatchMember',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('orden', models.IntegerField(default=0)),
+                ('filename', models.CharField(db_index=True, max_length=255)),
+                ('filepath', models.CharField(max_length=500)),
+                ('pages', models.IntegerField(default=0)),
+                ('sha256', models.CharField(blank=True, db_index=True, default='', max_length=64)),
+                ('lote', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='miembros', to='excel_processor.pdfbatch')),
+            ],
+        ),
+        migrations.RunPython(copiar_historial, migrations.RunPython.noop),
+        migrations.DeleteModel(
+            name='PDFProcessHistory',
+        ),
+        migrations.AddIndex(
+            model_name='pdfbatchmember',
+            index=models.Index(fields=['lote', 'orden'], name='excel_proce_lote_id_ce42c5_idx'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.1 on 2026-10-17 22:23
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+
+
+def contar_filas(apps, schema_editor):
+    # En las cargas normales las filas de cada planilla son sus registros. En las
+    # delta también cuentan las filas cambiadas, que se guardaron en los registros
+    # de cargas anteriores: no se pueden reconstruir y quedan en None
+    ExcelProcess = apps.get_model('excel_processor', 'ExcelProcess')
+    RegistroExcel = apps.get_model('excel_processor', 'RegistroExcel')
+    conteo = RegistroExcel.objects.filter(proceso=OuterRef('pk')).order_by().values('proceso').annotate(
+        n=Count('id')).values('n')
+    ExcelProcess.objects.exclude(carga__delta=True).update(filas=Subquery(conteo))
+    ExcelProcess.objects.exclude(carga__delta=True).filter(filas__isnull=True).update(filas=0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('excel_processor', '0013_pdfbatch'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='excelprocess',
+            name='filas',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.RunPython(contar_filas, migrations.RunPython.noop),
+    ]
@@ -1,20 +1,76 @@
-from django.db import models
+from django.db import models, transaction, IntegrityError
+from django.db.models import F
 from pathlib import Path
 
+class CargaExcel(models.Model):
+    """
+    Una carga de archivo Excel. Agrupa las planillas (ExcelProcess) que generó y
+    guarda el SHA-256 del archivo para detectar cargas repetidas.
+    """
+    sha256 = models.CharField(max_length=64, db_index=True)
+    nombre_archivo = models.CharField(max_length=255, db_index=True)
+    filas = models.IntegerField(default=0)
+    version = models.IntegerField(default=1)  # Número de carga del mismo nombre de archivo
+    delta = models.BooleanField(default=False)  # True si solo se guardaron las filas nuevas o cambiadas
+    fecha_carga = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.nombre_archivo} ({self.sha256[:12]})"
+
 class ExcelProcess(models.Model):
     archivo = models.FileField(upload_to='excels/')
-    consecutivo = models.IntegerField()
+    consecutivo = models.IntegerField(db_index=True)
     fecha_carga = models.DateTimeField(auto_now_add=True)
+    carga = models.ForeignKey(CargaExcel, on_delete=models.SET_NULL, null=True, blank=True, related_name='procesos')
+    bodega = models.CharField(max_length=50, blank=True, default='')  # Ruta de EXCEL_RUTAS_PLANILLAS
+    hoja = models.CharField(max_length=100, blank=True, default='')  # Hoja del libro (vacío en cargas antiguas)
+    version_datos = models.IntegerField(default=1)  # Aumenta cuando cambian sus registros (invalida el PDF en caché)
+    # Filas de la planilla (en una carga delta, las nuevas y las cambiadas); None en cargas delta antiguas
+    filas = models.IntegerField(null=True, blank=True)
+
+class Secuencia(models.Model):
+    """
+    Contador con nombre para asignar números consecutivos sin repetir.
+    """
+    nombre = models.CharField(max_length=50, unique=True)
+    valor = models.BigIntegerField(default=0)  # Último número asignado
 
-class PDFProcessHistory(models.Model):
-    filename = models.CharField(max_length=255)
+    def __str__(self):
+        return f"{self.nombre}: {self.valor}"
+
+    @classmethod
+    def reservar(cls, nombre, cantidad=1, inicial=0):
+        """
+        Reserva `cantidad` números consecutivos con un único UPDATE atómico.
+        Si la secuencia no existe se crea partiendo de `inicial` (valor o función).
+        Retorna un range con los números reservados.
+        """
+        with transaction.atomic():
+            if not cls.objects.filter(nombre=nombre).update(valor=F('valor') + cantidad):
+                base = inicial() if callable(inicial) else inicial
+                try:
+                    with transaction.atomic():
+                        cls.objects.create(nombre=nombre, valor=base + cantidad)
+                except IntegrityError:
+                    # Otra carga creó la secuencia al mismo tiempo
+                    cls.objects.filter(nombre=nombre).update(valor=F('valor') + cantidad)
+            valor = cls.objects.filter(nombre=nombre).values_list('valor', flat=True).get()
+        return range(valor - cantidad + 1, valor + 1)
+
+class PDFBatch(models.Model):
+    """
+    Un PDF combinado a partir de un lote de PDFs (ver pdf_utils.PDFBatchProcessor).
+    Sus archivos de entrada son los PDFBatchMember del lote, en orden.
+    """
+    filename = models.CharField(max_length=255, db_index=True)
     filepath = models.CharField(max_length=500)
-    output_path = models.CharField(max_length=500, null=True, blank=True)
-    process_date = models.DateTimeField(auto_now_add=True)
+    process_date = models.DateTimeField(auto_now_add=True, db_index=True)
     success = models.BooleanField(default=True)
     error_message = models.TextField(null=True, blank=True)
-    is_batch = models.BooleanField(default=False)  # True si es un PDF combinado
-    pages = models.IntegerField(default=0)  # Número de páginas en el PDF
+    pages = models.IntegerField(default=0)  # Páginas del PDF combinado
+    archivos = models.IntegerField(default=0)  # PDFs que se combinaron
+    # Huella de la lista ordenada de los SHA-256 de sus archivos (ver pdf_utils.huella_lote)
+    sha256 = models.CharField(max_length=64, blank=True, default='', db_index=True)
 
     def __str__(self):
         return f"{self.filename} - {self.process_date.strftime('%Y-%m-%d %H:%M')}"
@@ -22,6 +78,21 @@ class PDFProcessHistory(models.Model):
     def get_file_url(self):
         return str(Path(self.filepath).as_posix())
 
+class PDFBatchMember(models.Model):
+    """Un PDF de entrada de un lote combinado."""
+    lote = models.ForeignKey(PDFBatch, on_delete=models.CASCADE, related_name='miembros')
+    orden = models.IntegerField(default=0)  # Posición en el PDF combinado
+    filename = models.CharField(max_length=255, db_index=True)
+    filepath = models.CharField(max_length=500)
+    pages = models.IntegerField(default=0)
+    sha256 = models.CharField(max_length=64, blank=True, default='', db_index=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['lote', 'orden'])]
+
+    def __str__(self):
+        return f"{self.filename} ({self.lote.filename})"
+
 class RegistroExcel(models.Model):
     proceso = models.ForeignKey(ExcelProcess, on_delete=models.CASCADE, related_name='registros')
     orden = models.CharField(max_length=100, blank=True, null=True)
@@ -32,3 +103,34 @@ class RegistroExcel(models.Model):
     iny = models.CharField(max_length=20, blank=True, null=True)
     otros = models.CharField(max_length=100, blank=True, null=True)
     fecha_registro = models.DateTimeField(auto_now_add=True)
+
+class Trabajo(models.Model):
+    """
+    Trabajo en segundo plano (carga de Excel o combinación de PDFs).
+    Lo ejecuta el comando `python manage.py procesar_trabajos`.
+    """
+    TIPO_CHOICES = [
+        ('excel', 'Carga de Excel'),
+        ('pdf_lote', 'Combinación de PDFs'),
+    ]
+    ESTADO_CHOICES = [
+        ('pendiente', 'Pendiente'),
+        ('en_proceso', 'En proceso'),
+        ('completado', 'Completado'),
+        ('error', 'Error'),
+    ]
+
+    tipo = models.CharField(max_length=20, choices=TIPO_CHOICES)
+    estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default='pendiente', db_index=True)
+    parametros = models.JSONField(default=dict)
+    resultado = models.JSONField(null=True, blank=True)
+    error = models.TextField(null=True, blank=True)
+    progreso = models.IntegerField(default=0)  # Porcentaje de 0 a 100
+    mensaje = models.CharField(max_length=255, blank=True, default='')
+    intentos = models.IntegerField(default=0)
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_inicio = models.DateTimeField(null=True, blank=True)
+    fecha_fin = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Trabajo {self.id} ({self.get_tipo_display()}) - {self.get_estado_display()}"
@@ -0,0 +1,48 @@
+"""
+Pool de procesos compartido para el trabajo pesado de las cargas (lectura de
+hojas y dibujo de planillas).
+"""
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _obtener_pool(procesos):
+    # El pool se crea una vez y se reutiliza entre cargas; crear procesos en cada
+    # solicitud costaría más que el trabajo en sí
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=procesos)
+        return _pool
+
+
+def _descartar_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def mapear(funcion, argumentos, procesos=None):
+    """
+    Ejecuta funcion(*args) por cada tupla de argumentos y retorna los resultados
+    en el mismo orden. Con `procesos` >= 2 y más de un trabajo se usa el pool; si
+    el pool deja de responder se termina en serie. La función y sus argumentos
+    deben poder enviarse a otro proceso (funciones de módulo, datos simples).
+    """
+    argumentos = list(argumentos)
+    if not procesos or procesos < 2 or len(argumentos) < 2:
+        return [funcion(*args) for args in argumentos]
+    try:
+        pool = _obtener_pool(procesos)
+        futuros = [pool.submit(funcion, *args) for args in argumentos]
+        return [futuro.result() for futuro in futuros]
+    except BrokenProcessPool:
+        print("El pool de procesos dejó de responder; se continúa en serie")
+        _descartar_pool()
+        return [funcion(*args) for args in argumentos]
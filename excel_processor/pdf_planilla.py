@@ -0,0 +1,241 @@
+"""
+Generación de las planillas de producción en PDF.
+"""
+import datetime
+import io
+import os
+from reportlab.lib.pagesizes import letter
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from reportlab.pdfgen import canvas
+from .paralelo import mapear
+
+
+def ruta_planilla(nombre, consecutivo):
+    """Ruta absoluta de media/<nombre>_<consecutivo>.pdf."""
+    pdf_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'media')
+    return os.path.abspath(os.path.join(pdf_dir, f'{nombre}_{consecutivo}.pdf'))
+
+
+class PlanillaPDF:
+    """
+    Planilla PDF que se dibuja de forma incremental: las filas se agregan por bloques
+    con agregar_filas() y el pie con los totales se dibuja al llamar cerrar().
+
+    El encabezado fijo se dibuja una vez y se reutiliza en cada página (form
+    XObject); el texto y las líneas de las filas de una página se escriben en un
+    solo objeto de texto y un solo trazo, y las páginas van comprimidas.
+    """
+
+    encabezado = [
+        'ORDEN',
+        'PRODUC.',
+        'CANT.\nORIG',
+        'SALDO P\nENTREGAR',
+        'CANT.\nPRODUC',
+        'ENTREGA',
+        'FALTA\nNTES'
+    ]
+    col_widths = [50, 140, 60, 80, 70, 60, 60]
+    pie_lines = [
+        ("Firma Responsable: _____________________________", 27),
+        ("Firma Quien recibe: ______________________________", 27),
+        ("Verificado seguridad: ______________________________", 27),
+        ("Comentarios: ___________________________________________________________", 17),
+        ("______________________________________________________________________", 17),
+        ("______________________________________________________________________", 17),
+        ("", 17),
+        ("Gerencia De produccion: _____________________________", 17),
+        ("", 17),
+        ("Gerencia General o Administrativa: _____________________________", 17),
+    ]
+
+    def __init__(self, nombre, consecutivo, fecha=None, salida=None):
+        """
+        La planilla se guarda en media/<nombre>_<consecutivo>.pdf, o en `salida`
+        (un archivo abierto en modo binario, p. ej. BytesIO) si se indica. `fecha`
+        es la que se imprime en el encabezado; por defecto, la actual.
+        """
+        self.consecutivo = consecutivo
+        self.width, self.height = letter
+        margen_cm = 1.7
+        self.margen = int(margen_cm * 28.3465)  # 1 cm = 28.3465 puntos
+        self.fecha = (fecha or datetime.datetime.now()).strftime('%d/%m/%Y %H:%M')
+        self.col_positions = [self.margen]
+        for w in self.col_widths[:-1]:
+            self.col_positions.append(self.col_positions[-1] + w)
+        self.borde_derecho = self.col_positions[-1] + self.col_widths[-1]
+        # Las columnas de cantidades (2, 3 y 4) van centradas
+        self.centros = {i: self.col_positions[i] + self.col_widths[i] // 2 for i in (2, 3, 4)}
+        if salida is None:
+            self.pdf_path = ruta_planilla(nombre, consecutivo)
+            os.makedirs(os.path.dirname(self.pdf_path), exist_ok=True)
+            salida = self.pdf_path
+        else:
+            self.pdf_path = None
+        self.c = canvas.Canvas(salida, pagesize=letter, pageCompression=1)
+        self.pagina = 1
+        self.suma_nuevo = 0
+        self.y_inicio = self.crear_plantilla()
+        self.iniciar_pagina()
+
+    def crear_plantilla(self):
+        """
+        Dibuja una sola vez, como form XObject, la parte del encabezado que se repite
+        en todas las páginas (título, consecutivo, fecha, columnas y su cuadrícula).
+        Retorna la altura donde empieza la primera fila.
+        """
+        c = self.c
+        width, height, margen = self.width, self.height, self.margen
+        col_positions, col_widths = self.col_positions, self.col_widths
+        c.beginForm('encabezado')
+        y = height - margen
+        c.setFont('Helvetica-Bold', 18)
+        c.drawCentredString(width // 2, y, "PLANILLA DE PRODUCCION")
+        y -= 32
+        c.setFont('Helvetica-Bold', 14)
+        c.drawString(margen, y, f"Reporte consecutivo: {self.consecutivo}")
+        c.drawRightString(width - margen, y, f"Fecha: {self.fecha}")
+        y -= 27
+        c.setFont('Helvetica-Bold', 12)
+        for i, col in enumerate(self.encabezado):
+            if '\n' in col:
+                lineas = col.split('\n')
+                y_offset = y
+                for idx, linea in enumerate(lineas):
+                    c.drawCentredString(col_positions[i] + col_widths[i] // 2, y_offset - (idx * 12), linea)
+            else:
+                c.drawString(col_positions[i], y, str(col))
+        y_line_top = y + 12
+        y_line_bottom = y - 12 - 22
+        c.setLineWidth(1)
+        for x in col_positions:
+            c.line(x, y_line_top, x, y_line_bottom)
+        c.line(self.borde_derecho, y_line_top, self.borde_derecho, y_line_bottom)
+        c.line(margen, y_line_bottom, self.borde_derecho, y_line_bottom)
+        c.endForm()
+        y -= 12 + 22 + 15  # AGREGADO: 15 puntos adicionales de separación
+        return y
+
+    def iniciar_pagina(self):
+        """Pone el encabezado y el número de página; las filas se acumulan en un texto y un trazo."""
+        c = self.c
+        c.doForm('encabezado')
+        c.setFont('Helvetica-Bold', 12)
+        c.drawRightString(self.width - self.margen, self.height - self.margen + 5, f"Página {self.pagina}")
+        self.y = self.y_inicio
+        self.texto = c.beginText()
+        self.texto.setFont('Helvetica', 11)
+        self.trazo = c.beginPath()
+        self.filas_pagina = 0
+
+    def terminar_pagina(self):
+        """Dibuja de una vez el texto y las líneas de todas las filas de la página."""
+        if not self.filas_pagina:
+            return
+        c = self.c
+        c.drawText(self.texto)
+        c.setLineWidth(0.5)
+        c.drawPath(self.trazo, stroke=1, fill=0)
+        # Las divisiones verticales de cada fila miden 16 puntos y quedan separadas
+        # 1 punto de las de la fila siguiente: en lugar de 8 segmentos por fila se
+        # dibuja una línea por columna con un patrón de trazos de 16 y 1.
+        y_top = self.y_inicio + 8
+        y_bottom = self.y + 17 - 8
+        divisiones = c.beginPath()
+        for x in self.col_positions + [self.borde_derecho]:
+            divisiones.moveTo(x, y_top)
+            divisiones.lineTo(x, y_bottom)
+        c.saveState()
+        c.setDash(16, 1)
+        c.drawPath(divisiones, stroke=1, fill=0)
+        c.restoreState()
+        self.filas_pagina = 0
+
+    def nueva_pagina(self):
+        self.terminar_pagina()
+        self.c.showPage()
+        self.pagina += 1
+        self.iniciar_pagina()
+
+    def agregar_filas(self, filas):
+        """Dibuja un bloque de filas, saltando de página cuando sea necesario."""
+        col_positions, centros = self.col_positions, self.centros
+        izquierda, derecha = self.margen, self.borde_derecho
+        for fila in filas:
+            valores = [fila[0], fila[1], fila[2], fila[3], fila[9], '', '']
+            try:
+                self.suma_nuevo += float(fila[9]) if fila[9] is not None else 0
+            except (ValueError, TypeError):
+                pass
+            y = self.y
+            texto, trazo = self.texto, self.trazo
+            for i, val in enumerate(valores):
+                val = str(val)
+                if not val:
+                    continue
+                if i in centros:
+                    x = centros[i] - stringWidth(val, 'Helvetica', 11) / 2
+                else:
+                    x = col_positions[i]
+                texto.setTextOrigin(x, y)
+                texto.textOut(val)
+            # Línea inferior de la fila; las divisiones verticales se dibujan al terminar la página
+            trazo.moveTo(izquierda, y - 8)
+            trazo.lineTo(derecha, y - 8)
+            self.filas_pagina += 1
+            self.y -= 17
+            if self.y < 40:
+                self.nueva_pagina()
+
+    def cerrar(self):
+        """Dibuja el total y las firmas, guarda el archivo y retorna su ruta (None si se usó `salida`)."""
+        c = self.c
+        self.terminar_pagina()
+        self.y -= 22
+        c.setFont('Helvetica-Bold', 13)
+        c.drawString(self.margen, self.y, f"Total Cantidad Producida: {self.suma_nuevo}")
+        self.y -= 44
+        espacio_pie = sum([line[1] for line in self.pie_lines]) + 12
+        if self.y - espacio_pie < 20:
+            self.nueva_pagina()
+        c.setFont('Helvetica', 12)
+        for texto, salto in self.pie_lines:
+            c.drawString(self.margen, self.y, texto)
+            self.y -= salto
+        c.save()
+        return self.pdf_path
+
+
+def generar_pdf(nombre, filas, consecutivo):
+    planilla = PlanillaPDF(nombre, consecutivo)
+    planilla.agregar_filas(filas)
+    return planilla.cerrar()
+
+
+def dibujar_pdf(consecutivo, fecha, filas):
+    """Dibuja una planilla en memoria y retorna los bytes del PDF (se puede ejecutar en el pool)."""
+    salida = io.BytesIO()
+    planilla = PlanillaPDF('planilla', consecutivo, fecha=fecha, salida=salida)
+    planilla.agregar_filas(filas)
+    planilla.cerrar()
+    return salida.getvalue()
+
+
+# Debajo de este total de filas las planillas se dibujan en serie: enviar las filas
+# a otro proceso cuesta más que dibujarlas
+MIN_FILAS_PARALELO = 500
+
+
+def generar_planillas(nombre, grupos, consecutivos, procesos=None):
+    """
+    Genera una planilla por grupo de filas y retorna las rutas de los PDFs en el
+    mismo orden. Con más de un grupo con filas, las planillas se dibujan en
+    paralelo en un pool de `procesos` procesos, así que el tiempo total es el de la
+    planilla más grande y no la suma de todas.
+    """
+    trabajos = list(zip(grupos, consecutivos))
+    con_filas = sum(1 for filas, _ in trabajos if filas)
+    total = sum(len(filas) for filas, _ in trabajos)
+    if con_filas < 2 or total < MIN_FILAS_PARALELO:
+        procesos = 0
+    return mapear(generar_pdf, [(nombre, list(filas), consecutivo) for filas, consecutivo in trabajos], procesos)
@@ -2,126 +2,578 @@
 Utilidades para el procesamiento por lotes de archivos PDF.
 """
 from pathlib import Path
-from PyPDF2 import PdfMerger, PdfReader, PdfWriter
+from PyPDF2 import PdfReader, PdfWriter
+from PyPDF2.generic import (
+    ArrayObject, DictionaryObject, FloatObject, IndirectObject, NameObject, NullObject, NumberObject,
+    StreamObject,
+)
+from array import array
+from bisect import bisect_left
+from functools import lru_cache
+import hashlib
+import math
+import mmap
 import tempfile
 import os
 from django.conf import settings
+from django.db import transaction
+from .paralelo import mapear
+
+# Motor con el que se combinan los lotes de PDFs (ver MOTORES)
+MOTOR_LOTE = getattr(settings, 'PDF_LOTE_MOTOR', 'incremental')
+
+# Procesos para combinar lotes grandes de PDFs en paralelo (0 = en serie, None = uno
+# por CPU). Por defecto en serie: con los lotes medidos (bench_lotes_pdf) el modo
+# paralelo no es más rápido; activarlo solo si en el servidor lo es
+PROCESOS_LOTE = getattr(settings, 'PDF_LOTE_PROCESOS', 0)
+if PROCESOS_LOTE is None:
+    PROCESOS_LOTE = os.cpu_count() or 1
+
+# Archivos mínimos por grupo en el modo paralelo; con menos, enviar el grupo a
+# otro proceso y unir su PDF parcial cuesta más de lo que se gana
+MIN_ARCHIVOS_GRUPO = 25
+
+# Grupos por proceso: varios grupos más pequeños reparten mejor la carga cuando
+# los archivos tienen tamaños distintos
+GRUPOS_POR_PROCESO = 4
+
+# Dígitos de los números de objeto en los PDFs parciales (ver EscritorIncremental)
+ANCHO_NUMERO = 8
+
+# Bytes copiados por lectura al unir un PDF parcial al archivo combinado
+BLOQUE_COPIA = 8 * 1024 * 1024
+
+
+# Tamaño A4, para rellenar si no se conoce el de la última página
+TAMANO_A4 = (595, 842)
+
+
+@lru_cache(maxsize=32)
+def pagina_en_blanco(ancho, alto):
+    """
+    Página en blanco de un tamaño, sin contenido. Hay una sola por tamaño en cada
+    proceso: los escritores la agregan por referencia (ver agregar_blanco) en
+    lugar de leer un PDF de disco cada vez.
+    """
+    pagina = DictionaryObject()
+    pagina[NameObject('/Type')] = NameObject('/Page')
+    pagina[NameObject('/MediaBox')] = ArrayObject([NumberObject(0), NumberObject(0), FloatObject(ancho), FloatObject(alto)])
+    pagina[NameObject('/Resources')] = DictionaryObject()
+    return pagina
+
+
+class _ReferenciaParcial(IndirectObject):
+    """Referencia escrita con el número de ancho fijo, anotando su posición en el archivo."""
+
+    def __init__(self, idnum, numeros):
+        super().__init__(idnum, 0, None)
+        self.numeros = numeros
+
+    def write_to_stream(self, stream, encryption_key):
+        self.numeros.append(stream.tell())
+        stream.write(b'%0*d 0 R' % (ANCHO_NUMERO, self.idnum))
+
+
+class EscritorIncremental:
+    """
+    Escribe un PDF combinado a medida que se agregan los archivos.
+
+    PdfMerger/PdfWriter guardan en memoria todas las páginas de todos los archivos
+    hasta el final. Aquí las páginas de cada archivo, con todo lo que usan
+    (contenidos, fuentes, imágenes), se copian al archivo de salida apenas se
+    leen, con números de objeto nuevos; en memoria solo quedan la posición de
+    cada objeto escrito y la lista de páginas, que se escriben al cerrar.
+
+    Con parcial=True se escribe solo la parte de los objetos de un PDF que
+    después se une a otro escritor con anexar() (modo paralelo): los números de
+    objeto se escriben con ANCHO_NUMERO dígitos y se anota dónde está cada uno,
+    así al unirlo se copian los bytes renumerando en su lugar, sin volver a leer
+    el PDF.
+    """
+
+    def __init__(self, salida, parcial=False):
+        self.salida = salida  # Archivo binario abierto para escritura
+        self.parcial = parcial
+        # Posición de cada objeto en el archivo (-1 si aún no se escribe; el 0 no se usa)
+        # y número de objeto de cada página; en arreglos compactos, 8 bytes por entrada
+        self.posiciones = array('q', [0])
+        self.paginas = array('q')
+        self.numeros = array('q')  # Parciales: posición de cada número de objeto escrito
+        self.tamano_ultima = TAMANO_A4  # Ancho y alto de la última página agregada
+        self.salida.write(b'%PDF-1.7\n%\xe2\xe3\xcf\xd3\n')
+        self.inicio_objetos = self.salida.tell()
+        self.raiz_paginas = self._reservar()
+
+    def _reservar(self):
+        self.posiciones.append(-1)
+        return len(self.posiciones) - 1
+
+    def _referencia(self, numero):
+        if self.parcial:
+            return _ReferenciaParcial(numero, self.numeros)
+        return IndirectObject(numero, 0, None)
+
+    def _escribir(self, numero, objeto):
+        self.posiciones[numero] = self.salida.tell()
+        if self.parcial:
+            self.numeros.append(self.salida.tell())
+            self.salida.write(b'%0*d 0 obj\n' % (ANCHO_NUMERO, numero))
+        else:
+            self.salida.write(b'%d 0 obj\n' % numero)
+        objeto.write_to_stream(self.salida, None)
+        self.salida.write(b'\nendobj\n')
+
+    def agregar(self, reader):
+        """Copia al archivo de salida todas las páginas de un PdfReader y retorna cuántas son."""
+        numeros = {}  # (idnum, generación) en el archivo de entrada -> número en la salida
+        pendientes = []
+
+        def referencia(indirecto):
+            clave = (indirecto.idnum, indirecto.generation)
+            if clave not in numeros:
+                numeros[clave] = self._reservar()
+                pendientes.append(indirecto)
+            return self._referencia(numeros[clave])
+
+        def copiar(objeto):
+            if isinstance(objeto, IndirectObject):
+                return referencia(objeto)
+            if isinstance(objeto, StreamObject):
+                copia = objeto.__class__()
+                copia._data = objeto._data  # Los datos se copian tal como vienen (comprimidos)
+            elif isinstance(objeto, DictionaryObject):
+                copia = DictionaryObject()
+            elif isinstance(objeto, ArrayObject):
+                return ArrayObject(copiar(valor) for valor in objeto)
+            else:
+                return objeto
+            for clave, valor in objeto.items():
+                copia[clave] = copiar(valor)
+            return copia
+
+        paginas = [referencia(pagina.indirect_reference).idnum for pagina in reader.pages]
+        while pendientes:
+            indirecto = pendientes.pop()
+            objeto = indirecto.get_object()
+            tipo = objeto.get('/Type') if isinstance(objeto, DictionaryObject) else None
+            if objeto is None or tipo in ('/Pages', '/Catalog'):
+                # Otro objeto apunta al árbol de páginas o al catálogo del archivo
+                # original (p. ej. un destino con nombre): no se copian
+                copia = NullObject()
+            elif tipo == '/Page':
+                # /Parent se reemplaza por el árbol de páginas de la salida; los
+                # atributos heredados ya los copió PdfReader a cada página
+                copia = copiar(DictionaryObject((clave, valor) for clave, valor in objeto.items() if clave != '/Parent'))
+                copia[NameObject('/Parent')] = self._referencia(self.raiz_paginas)
+            else:
+                copia = copiar(objeto)
+            self._escribir(numeros[(indirecto.idnum, indirecto.generation)], copia)
+        self.paginas.extend(paginas)
+        if paginas:
+            caja = reader.pages[-1].mediabox
+            self.tamano_ultima = (round(float(caja.width), 2), round(float(caja.height), 2))
+        return len(paginas)
+
+    def agregar_archivo(self, ruta):
+        """Copia las páginas del PDF en `ruta` (o en un archivo abierto) y retorna cuántas son (ver leer_pdf)."""
+        return leer_pdf(ruta, self)
+
+    def agregar_blanco(self):
+        """Agrega una página en blanco del tamaño de la última página agregada y retorna 1."""
+        # Un árbol de páginas no puede repetir el mismo objeto página: cada página en
+        # blanco es un diccionario propio que comparte su contenido con la del proceso
+        pagina = DictionaryObject(pagina_en_blanco(*self.tamano_ultima))
+        pagina[NameObject('/Parent')] = self._referencia(self.raiz_paginas)
+        numero = self._reservar()
+        self._escribir(numero, pagina)
+        self.paginas.append(numero)
+        return 1
+
+    def anexar(self, ruta, resumen):
+        """
+        Agrega las páginas de un PDF parcial (escrito con parcial=True; `resumen` es
+        lo que retornó su cerrar()). Sus objetos toman los números siguientes a los
+        de este escritor y su árbol de páginas se reemplaza por el de este.
+        """
+        base = len(self.posiciones) - 2  # El objeto 2 del parcial pasa a ser el base + 2
+        desplazamiento = self.salida.tell() - resumen['inicio']
+        self.posiciones.extend(posicion + desplazamiento for posicion in resumen['posiciones'][2:])
+        self.paginas.extend(pagina + base for pagina in resumen['paginas'])
+        numeros = resumen['numeros']
+        i = 0
+        with open(ruta, 'rb') as archivo:
+            archivo.seek(resumen['inicio'])
+            posicion = resumen['inicio']
+            while posicion < resumen['fin']:
+                fin_bloque = min(resumen['fin'], posicion + BLOQUE_COPIA)
+                j = bisect_left(numeros, fin_bloque, i)
+                if j > i and numeros[j - 1] + ANCHO_NUMERO > fin_bloque:
+                    j -= 1  # El número quedaría partido entre dos bloques
+                    fin_bloque = numeros[j]
+                bloque = bytearray(archivo.read(fin_bloque - posicion))
+                for inicio in numeros[i:j]:
+                    inicio -= posicion
+                    numero = int(bloque[inicio:inicio + ANCHO_NUMERO])
+                    numero = self.raiz_paginas if numero == 1 else numero + base
+                    bloque[inicio:inicio + ANCHO_NUMERO] = b'%0*d' % (ANCHO_NUMERO, numero)
+                self.salida.write(bloque)
+                posicion, i = fin_bloque, j
+
+    def cerrar(self):
+        """
+        Escribe el árbol de páginas, el catálogo y la tabla de referencias. En un
+        parcial solo termina los objetos y retorna el resumen que necesita anexar().
+        """
+        if self.parcial:
+            for numero, posicion in enumerate(self.posiciones):
+                if numero > 1 and posicion < 0:
+                    self._escribir(numero, NullObject())
+            return {'inicio': self.inicio_objetos, 'fin': self.salida.tell(), 'posiciones': self.posiciones,
+                    'paginas': self.paginas, 'numeros': self.numeros}
+
+        arbol = DictionaryObject()
+        arbol[NameObject('/Type')] = NameObject('/Pages')
+        arbol[NameObject('/Kids')] = ArrayObject(IndirectObject(numero, 0, None) for numero in self.paginas)
+        arbol[NameObject('/Count')] = NumberObject(len(self.paginas))
+        self._escribir(self.raiz_paginas, arbol)
+        catalogo = DictionaryObject()
+        catalogo[NameObject('/Type')] = NameObject('/Catalog')
+        catalogo[NameObject('/Pages')] = IndirectObject(self.raiz_paginas, 0, None)
+        raiz = self._reservar()
+        self._escribir(raiz, catalogo)
+        # Objetos reservados que no se alcanzaron a escribir (archivo que falló a mitad de la copia)
+        for numero, posicion in enumerate(self.posiciones):
+            if numero and posicion < 0:
+                self._escribir(numero, NullObject())
+
+        inicio_xref = self.salida.tell()
+        self.salida.write(b'xref\n0 %d\n0000000000 65535 f \n' % len(self.posiciones))
+        self.salida.write(b''.join(b'%010d 00000 n \n' % posicion for posicion in self.posiciones[1:]))
+        self.salida.write(b'trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n'
+                          % (len(self.posiciones), raiz, inicio_xref))
+
+
+class MotorPyPDF2:
+    """
+    Combina con PdfWriter de PyPDF2, como se hacía antes de EscritorIncremental:
+    cada archivo se interpreta completo y todas sus páginas quedan en memoria
+    hasta cerrar(). Se conserva como referencia para comparar (ver el comando
+    bench_motores_pdf) y por si algún PDF no se combina bien con los otros motores.
+    """
+
+    def __init__(self, salida):
+        self.salida = salida
+        self.writer = PdfWriter()
+        # PdfWriter identifica los objetos copiados por id() del PdfReader: si un
+        # reader se libera antes de escribir, otro puede tomar su id y se mezclan
+        # objetos de archivos distintos. Se conservan todos hasta cerrar()
+        self.lectores = []
+        self.tamano_ultima = TAMANO_A4
+
+    def agregar_archivo(self, ruta):
+        reader = PdfReader(ruta)
+        self.lectores.append(reader)
+        for pagina in reader.pages:
+            self.writer.add_page(pagina)
+        if reader.pages:
+            caja = reader.pages[-1].mediabox
+            self.tamano_ultima = (float(caja.width), float(caja.height))
+        return len(reader.pages)
+
+    def agregar_blanco(self):
+        self.writer.add_blank_page(*self.tamano_ultima)
+        return 1
+
+    def cerrar(self):
+        self.writer.write(self.salida)
+        self.lectores.clear()
+
+
+class MotorPdfium:
+    """
+    Combina con PDFium (paquete opcional pypdfium2): la copia de las páginas y de
+    los objetos que usan la hace la biblioteca en C, sin interpretar los
+    contenidos en Python. El documento combinado queda en memoria hasta cerrar().
+    """
+
+    def __init__(self, salida):
+        try:
+            import pypdfium2
+        except ImportError:
+            raise RuntimeError("Para el motor 'pdfium' se necesita el paquete pypdfium2 (pip install pypdfium2).")
+        self.pdfium = pypdfium2
+        self.salida = salida
+        self.documento = pypdfium2.PdfDocument.new()
+        self.tamano_ultima = TAMANO_A4
+
+    def agregar_archivo(self, ruta):
+        origen = self.pdfium.PdfDocument(ruta)
+        try:
+            paginas = len(origen)
+            if paginas:
+                self.documento.import_pages(origen)
+                self.tamano_ultima = origen.get_page_size(paginas - 1)
+            return paginas
+        finally:
+            origen.close()
+
+    def agregar_blanco(self):
+        self.documento.new_page(*self.tamano_ultima)
+        return 1
+
+    def cerrar(self):
+        self.documento.save(self.salida)
+        self.documento.close()
+
+
+# Motores para combinar lotes de PDFs (setting PDF_LOTE_MOTOR). Cada uno recibe
+# el archivo de salida abierto y ofrece agregar_archivo(ruta o archivo binario
+# abierto) -> páginas, agregar_blanco() -> 1 y cerrar(); solo 'incremental'
+# combina en paralelo.
+MOTORES = {
+    'incremental': EscritorIncremental,
+    'pypdf2': MotorPyPDF2,
+    'pdfium': MotorPdfium,
+}
+
+
+def obtener_motor(nombre=None):
+    """Clase del motor `nombre` (por defecto PDF_LOTE_MOTOR)."""
+    nombre = nombre or MOTOR_LOTE
+    try:
+        return MOTORES[nombre]
+    except KeyError:
+        raise ValueError(f"Motor de PDFs desconocido: {nombre} (opciones: {', '.join(MOTORES)})")
+
+
+def leer_pdf(ruta, escritor):
+    """
+    Lee un PDF desde un mapa en memoria (el sistema operativo carga solo lo que se
+    lee) y copia sus páginas al escritor. `ruta` también puede ser un archivo
+    binario ya abierto (p. ej. un BytesIO), que se lee tal cual. Retorna la
+    cantidad de páginas; las páginas de un PDF vacío no se copian.
+    """
+    if not isinstance(ruta, (str, os.PathLike)):
+        reader = PdfReader(ruta)
+        return escritor.agregar(reader) if len(reader.pages) else 0
+    with open(ruta, 'rb') as archivo, mmap.mmap(archivo.fileno(), 0, access=mmap.ACCESS_READ) as datos:
+        reader = PdfReader(datos)
+        if not len(reader.pages):
+            return 0
+        return escritor.agregar(reader)
+
+
+def _agregar_archivos(escritor, rutas, progreso=None, blancos=True):
+    archivos = []
+    total_paginas = 0
+    for actual, ruta in enumerate(rutas, 1):
+        print(f"Procesando archivo: {ruta}")
+        try:
+            num_pages = escritor.agregar_archivo(ruta)
+        except Exception as e:
+            print(f"Error al leer PDF {ruta}: {str(e)}")
+            num_pages = None
+        if num_pages == 0:
+            print(f"PDF sin páginas encontrado: {ruta}")
+        elif num_pages:
+            archivos.append((ruta, num_pages))
+            total_paginas += num_pages
+            # Agregar página en blanco si es necesario
+            if blancos and num_pages % 2 != 0:
+                total_paginas += escritor.agregar_blanco()
+        if progreso:
+            progreso(actual, len(rutas))
+    return archivos, total_paginas
+
+
+def combinar_en(rutas, salida, progreso=None, motor=None, blancos=True):
+    """
+    Combina los PDFs (rutas o archivos binarios abiertos) en el archivo `salida`,
+    ya abierto para escritura, con el motor `motor` (uno de MOTORES, por defecto
+    PDF_LOTE_MOTOR). Con blancos=True se agrega una página en blanco del mismo
+    tamaño después de cada archivo con páginas impares. Los archivos inválidos o
+    sin páginas se omiten; si ninguno es válido el PDF no se cierra y `salida`
+    queda incompleta. `progreso(actual, total)` se llama después de cada archivo.
+    Retorna ([(ruta, páginas), ...] de los archivos combinados, páginas totales).
+    """
+    escritor = obtener_motor(motor)(salida)
+    archivos, total_paginas = _agregar_archivos(escritor, rutas, progreso, blancos)
+    if archivos:
+        escritor.cerrar()
+    return archivos, total_paginas
+
+
+def combinar_grupo(rutas, ruta_salida, progreso=None, motor=None):
+    """
+    Combina los PDFs en ruta_salida en una sola pasada, agregando una página en
+    blanco del mismo tamaño después de cada archivo con páginas impares (ver
+    combinar_en). Si ningún archivo es válido no queda archivo de salida.
+    Retorna ([(ruta, páginas), ...] de los archivos combinados, páginas totales).
+    """
+    obtener_motor(motor)  # Un motor desconocido falla antes de crear la salida
+    with open(ruta_salida, 'wb') as salida:
+        archivos, total_paginas = combinar_en(rutas, salida, progreso, motor)
+    if not archivos:
+        os.remove(ruta_salida)
+    return archivos, total_paginas
+
+
+def _combinar_parcial(rutas, ruta_salida):
+    # Trabajo de un proceso del modo paralelo: un grupo de archivos a un PDF parcial
+    with open(ruta_salida, 'wb') as salida:
+        escritor = EscritorIncremental(salida, parcial=True)
+        archivos, total_paginas = _agregar_archivos(escritor, rutas)
+        return archivos, total_paginas, escritor.cerrar()
+
+
+def combinar_archivos(rutas, ruta_salida, procesos=None, progreso=None, motor=None):
+    """
+    Igual que combinar_grupo, pero con el motor 'incremental', `procesos` >= 2 y
+    suficientes archivos trabaja en paralelo: los archivos se reparten en grupos
+    consecutivos, cada proceso lee, valida y combina un grupo en un PDF parcial,
+    y al final los parciales se concatenan en orden en ruta_salida (copiando sus
+    bytes, sin volver a leerlos). El resultado tiene las mismas páginas que en
+    serie; `progreso` avanza a medida que se concatena cada grupo.
+    """
+    procesos = PROCESOS_LOTE if procesos is None else procesos
+    motor = motor or MOTOR_LOTE
+    rutas = [str(ruta) for ruta in rutas]
+    if not procesos or procesos < 2 or obtener_motor(motor) is not EscritorIncremental:
+        return combinar_grupo(rutas, ruta_salida, progreso, motor)
+    tamano = max(MIN_ARCHIVOS_GRUPO, math.ceil(len(rutas) / (procesos * GRUPOS_POR_PROCESO)))
+    if len(rutas) <= tamano:
+        return combinar_grupo(rutas, ruta_salida, progreso, motor)
+
+    grupos = [rutas[i:i + tamano] for i in range(0, len(rutas), tamano)]
+    archivos = []
+    total_paginas = 0
+    with tempfile.TemporaryDirectory(prefix='lote_pdf_') as carpeta:
+        parciales = [os.path.join(carpeta, f'parcial_{n}.pdf') for n in range(len(grupos))]
+        print(f"Combinando {len(rutas)} PDFs en {len(grupos)} grupos con {procesos} procesos")
+        resultados = mapear(_combinar_parcial, [(grupo, parcial) for grupo, parcial in zip(grupos, parciales)],
+                            procesos)
+        with open(ruta_salida, 'wb') as salida:
+            escritor = EscritorIncremental(salida)
+            procesados = 0
+            for grupo, parcial, (archivos_grupo, paginas_grupo, resumen) in zip(grupos, parciales, resultados):
+                if archivos_grupo:
+                    escritor.anexar(parcial, resumen)
+                    archivos += archivos_grupo
+                    total_paginas += paginas_grupo
+                procesados += len(grupo)
+                if progreso:
+                    progreso(procesados, len(rutas))
+            if archivos:
+                escritor.cerrar()
+    if not archivos:
+        os.remove(ruta_salida)
+    return archivos, total_paginas
+
+
+def huella_lote(hashes):
+    """SHA-256 de la lista ordenada de los SHA-256 de los archivos de un lote."""
+    return hashlib.sha256('\n'.join(hashes).encode()).hexdigest()
+
+
+def buscar_lote_previo(huella):
+    """Ruta del PDF combinado de un lote anterior con la misma huella si sigue en disco, o None."""
+    from .models import PDFBatch
+
+    combinados = PDFBatch.objects.filter(
+        sha256=huella, success=True
+    ).order_by('-id').values_list('filepath', flat=True)
+    for ruta in combinados[:5]:
+        if ruta and os.path.exists(ruta):
+            return ruta
+    return None
 
 
 class PDFBatchProcessor:
     """
     Clase para procesar PDFs por lotes.
     """
+
+    reutilizado = False  # True si el último combine_pdfs retornó el PDF de un lote anterior
     
-    def __init__(self):
-        """Inicializa el procesador."""
-        self.temp_dir = Path(tempfile.gettempdir())
-        self.blank_page_path = self.temp_dir / "blank_page.pdf"
-        self._create_blank_page()
-
-    def _create_blank_page(self):
-        """Crea una página en blanco para usar cuando sea necesario."""
-        with open(self.blank_page_path, 'wb') as blank_file:
-            writer = PdfWriter()
-            writer.add_blank_page(width=595, height=842)  # Tamaño A4
-            writer.write(blank_file)
-
-    def combine_pdfs(self, pdf_files, output_path=None):
+    def combine_pdfs(self, pdf_files, output_path=None, progress_callback=None, procesos=None, hashes=None,
+                     motor=None):
         """
         Combina PDFs y agrega páginas en blanco donde sea necesario.
         
         Args:
             pdf_files: Lista de rutas a PDFs para combinar.
             output_path: Ruta opcional para el PDF combinado.
+            progress_callback: Función opcional (actual, total) llamada después de
+                agregar cada PDF (o cada grupo, en paralelo) al archivo combinado.
+            procesos: Procesos para combinar en paralelo (por defecto
+                PDF_LOTE_PROCESOS; 0 o 1 = en serie).
+            hashes: SHA-256 de cada archivo, en el mismo orden. Si se indican y un
+                lote anterior tenía los mismos archivos en el mismo orden, se
+                retorna su PDF combinado sin volver a combinar.
+            motor: Motor de combinación, uno de MOTORES (por defecto PDF_LOTE_MOTOR).
             
         Returns:
             Path al PDF combinado o None si hay error.
         """
-        from .models import PDFProcessHistory
+        from .models import PDFBatch, PDFBatchMember
         import datetime
         
+        self.reutilizado = False
         if not pdf_files:
             print("No se proporcionaron archivos PDF")
             return None
+
+        huella = huella_lote(hashes) if hashes else ''
+        if huella:
+            previo = buscar_lote_previo(huella)
+            if previo:
+                print(f"Lote ya combinado ({huella[:12]}), se reutiliza {previo}")
+                self.reutilizado = True
+                return previo
             
         # Convertir output_path a string si es un objeto Path
         if isinstance(output_path, Path):
             output_path = str(output_path)
             
         if not output_path:
-            timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+            timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S_%f")
             output_dir = os.path.join(settings.MEDIA_ROOT, 'combined_pdfs')
             os.makedirs(output_dir, exist_ok=True)
             output_path = os.path.join(output_dir, f'combined_{timestamp}.pdf')
         
-        # Lista para almacenar la información de los PDFs procesados
-        processed_files_info = []
-        total_pages = 0
-        merger = PdfMerger()
-        
         try:
-            print("Iniciando procesamiento de PDFs...")
-            # Primero verificamos que todos los archivos sean válidos
-            for pdf_file in pdf_files:
-                pdf_path = str(pdf_file) if isinstance(pdf_file, Path) else pdf_file
-                print(f"Procesando archivo: {pdf_path}")
-                
-                try:
-                    with open(pdf_path, 'rb') as file:
-                        pdf = PdfReader(file)
-                        num_pages = len(pdf.pages)
-                        if num_pages > 0:
-                            processed_files_info.append({
-                                'path': pdf_path,
-                                'pages': num_pages,
-                                'filename': os.path.basename(pdf_path)
-                            })
-                            print(f"PDF válido encontrado: {pdf_path} con {num_pages} páginas")
-                        else:
-                            print(f"PDF sin páginas encontrado: {pdf_path}")
-                except Exception as e:
-                    print(f"Error al verificar PDF {pdf_path}: {str(e)}")
-                    continue
-
-            if not processed_files_info:
+            print("Combinando PDFs...")
+            # Una sola pasada: cada archivo se lee una vez, se cuentan sus páginas
+            # y se copian al archivo combinado, que se escribe a medida que avanza
+            archivos, total_pages = combinar_archivos(
+                pdf_files, output_path, procesos, progress_callback, motor
+            )
+            if not archivos:
                 print("No se encontraron PDFs válidos para procesar")
                 return None
+            print(f"PDF combinado guardado en: {output_path}")
+            sha256_por_ruta = dict(zip((str(ruta) for ruta in pdf_files), hashes or ()))
 
-            print("Combinando PDFs...")
-            # Ahora combinamos los PDFs válidos
-            for file_info in processed_files_info:
-                with open(file_info['path'], 'rb') as file:
-                    merger.append(file)
-                    total_pages += file_info['pages']
-                    
-                    # Agregar página en blanco si es necesario
-                    if file_info['pages'] % 2 != 0:
-                        with open(str(self.blank_page_path), 'rb') as blank:
-                            merger.append(blank)
-                        total_pages += 1
-
-            # Guardar el PDF combinado
-            print(f"Guardando PDF combinado en: {output_path}")
-            merger.write(output_path)
-            
-            # Registrar el PDF combinado en la base de datos
-            combined_pdf = PDFProcessHistory.objects.create(
-                filename=os.path.basename(output_path),
-                filepath=output_path,
-                pages=total_pages,
-                output_path=output_path,
-                is_batch=True
-            )
-            
-            # Registrar los archivos individuales
-            for file_info in processed_files_info:
-                PDFProcessHistory.objects.create(
-                    filename=file_info['filename'],
-                    filepath=file_info['path'],
-                    pages=file_info['pages'],
-                    output_path=output_path,
-                    is_batch=True
+            # Registrar el PDF combinado y sus archivos (estos en un solo INSERT por lotes)
+            with transaction.atomic():
+                lote = PDFBatch.objects.create(
+                    filename=os.path.basename(output_path),
+                    filepath=output_path,
+                    pages=total_pages,
+                    archivos=len(archivos),
+                    sha256=huella
                 )
+                PDFBatchMember.objects.bulk_create([
+                    PDFBatchMember(
+                        lote=lote,
+                        orden=orden,
+                        filename=os.path.basename(ruta),
+                        filepath=ruta,
+                        pages=paginas,
+                        sha256=sha256_por_ruta.get(ruta, '')
+                    )
+                    for orden, (ruta, paginas) in enumerate(archivos)
+                ], batch_size=500)
             
             print(f"Proceso completado. Se generó el archivo: {output_path}")
             return output_path
@@ -131,11 +583,4 @@ class PDFBatchProcessor:
             import traceback
             print(traceback.format_exc())
             return None
-            
-        finally:
-            merger.close()
 
-    def cleanup(self):
-        """Limpia archivos temporales."""
-        if self.blank_page_path.exists():
-            self.blank_page_path.unlink()
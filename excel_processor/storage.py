@@ -0,0 +1,76 @@
+"""
+Almacenamiento de los archivos Excel subidos, direccionado por contenido.
+"""
+import hashlib
+import os
+import tempfile
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+
+# Carpeta (relativa a MEDIA_ROOT) donde quedan los libros subidos
+DIR_EXCELS = 'excels'
+
+
+class AlmacenamientoPorContenido(FileSystemStorage):
+    """
+    Guarda cada archivo una sola vez bajo un nombre derivado de su SHA-256.
+    Si el nombre ya existe el contenido es el mismo, así que no se vuelve a escribir.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # El nombre identifica el contenido: nunca se agrega sufijo
+        return name
+
+    def _save(self, name, content):
+        full_path = self.path(name)
+        if os.path.exists(full_path):
+            return name
+        directory = os.path.dirname(full_path)
+        os.makedirs(directory, exist_ok=True)
+        # Se escribe a un temporal y se renombra: dos cargas simultáneas del mismo
+        # archivo terminan con la misma copia completa y nunca con una a medias.
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as destino:
+                for chunk in content.chunks():
+                    destino.write(chunk)
+            if self.file_permissions_mode is not None:
+                os.chmod(tmp_path, self.file_permissions_mode)
+            os.replace(tmp_path, full_path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return name
+
+
+almacenamiento_excels = AlmacenamientoPorContenido(
+    location=settings.MEDIA_ROOT,
+    base_url=settings.MEDIA_URL,
+)
+
+
+def sha256_archivo(archivo):
+    """Calcula el SHA-256 de un archivo leyéndolo por bloques."""
+    hasher = hashlib.sha256()
+    for chunk in archivo.chunks():
+        hasher.update(chunk)
+    archivo.seek(0)
+    return hasher.hexdigest()
+
+
+def nombre_por_contenido(sha256, nombre_original):
+    """Ruta relativa a MEDIA_ROOT: excels/ab/abcdef...xlsx (se conserva la extensión)."""
+    extension = os.path.splitext(nombre_original)[1].lower()
+    return f"{DIR_EXCELS}/{sha256[:2]}/{sha256}{extension}"
+
+
+def guardar_excel(archivo, sha256=''):
+    """
+    Guarda el archivo subido una sola vez y retorna su nombre en el almacenamiento,
+    listo para asignarse a ExcelProcess.archivo.
+    """
+    sha256 = sha256 or sha256_archivo(archivo)
+    nombre = almacenamiento_excels.save(nombre_por_contenido(sha256, archivo.name), archivo)
+    archivo.seek(0)
+    return nombre
@@ -0,0 +1,185 @@
+"""
+Subidas de archivos por partes, reanudables.
+
+Un lote de PDFs subido en una sola solicitud multipart puede ocupar cientos de
+MB y, si la conexión se corta, hay que empezar de nuevo. Con este protocolo el
+navegador sube cada archivo en partes de TAMANO_BLOQUE que se escriben
+directamente al final de un archivo en DIR_SUBIDAS; la memoria por solicitud
+queda acotada y lo recibido se conserva aunque la conexión se corte a mitad de
+una parte. Para reanudar basta pedir el estado: el offset es el tamaño de lo ya
+escrito.
+
+    POST pdf-batch/subidas/              nombre, tamano -> {id, offset: 0, bloque}
+    GET  pdf-batch/subidas/<id>/         -> {id, nombre, tamano, offset, completa}
+    PUT  pdf-batch/subidas/<id>/?offset=N  (cuerpo: los bytes de la parte)
+                                         -> {offset, completa}; 409 con el offset
+                                            real si N no coincide
+    POST pdf-batch/  subidas[]=<id>...   procesa el lote con los archivos completos
+
+Cada subida son dos archivos: <id>.part con los datos y <id>.json con el nombre
+y el tamaño esperado. Las subidas sin terminar se borran después de
+HORAS_SUBIDA sin recibir datos (ver temporales.limpiar_temporales).
+"""
+import datetime
+import hashlib
+import json
+import os
+import re
+import time
+import uuid
+from django.conf import settings
+
+DIR_SUBIDAS = os.path.join(settings.MEDIA_ROOT, 'subidas')
+
+# Tamaño de las partes que envía el navegador
+TAMANO_BLOQUE = getattr(settings, 'PDF_SUBIDA_BLOQUE_MB', 8) * 1024 * 1024
+
+# Tamaño máximo de cada archivo del lote
+MAX_ARCHIVO = getattr(settings, 'PDF_LOTE_MAX_ARCHIVO_MB', 500) * 1024 * 1024
+
+# Horas sin recibir datos tras las que se borra una subida sin terminar
+HORAS_SUBIDA = getattr(settings, 'PDF_SUBIDA_HORAS', 24)
+
+# Bytes leídos de la solicitud por escritura al disco
+BLOQUE_LECTURA = 64 * 1024
+
+_ID_VALIDO = re.compile(r'^[0-9a-f]{32}$')
+
+
+class ErrorSubida(Exception):
+    """Solicitud de subida inválida. `offset` se indica cuando la parte no empieza donde termina lo recibido."""
+
+    def __init__(self, mensaje, offset=None):
+        super().__init__(mensaje)
+        self.offset = offset
+
+
+def _rutas(subida_id):
+    if not _ID_VALIDO.match(subida_id or ''):
+        raise ErrorSubida('Identificador de subida inválido')
+    base = os.path.join(DIR_SUBIDAS, subida_id)
+    return base + '.part', base + '.json'
+
+
+def limpiar_subidas_abandonadas():
+    """Borra las subidas que no reciben datos hace más de HORAS_SUBIDA."""
+    limite = time.time() - HORAS_SUBIDA * 3600
+    try:
+        entradas = list(os.scandir(DIR_SUBIDAS))
+    except FileNotFoundError:
+        return 0
+    borradas = 0
+    for entrada in entradas:
+        if not entrada.name.endswith('.part'):
+            continue
+        try:
+            if entrada.stat().st_mtime >= limite:
+                continue
+            os.remove(entrada.path)
+            os.remove(entrada.path[:-len('.part')] + '.json')
+            borradas += 1
+        except OSError:
+            pass
+    if borradas:
+        print(f"{borradas} subidas sin terminar eliminadas")
+    return borradas
+
+
+def crear_subida(nombre, tamano):
+    """Registra una subida nueva y retorna su estado."""
+    nombre = os.path.basename(nombre or '')
+    if not nombre.lower().endswith('.pdf'):
+        raise ErrorSubida(f'Solo se permiten archivos PDF: {nombre}')
+    try:
+        tamano = int(tamano)
+    except (TypeError, ValueError):
+        raise ErrorSubida('Tamaño de archivo inválido')
+    if tamano <= 0 or tamano > MAX_ARCHIVO:
+        raise ErrorSubida(f'El archivo {nombre} excede el tamaño permitido ({MAX_ARCHIVO / (1024*1024):.0f}MB)')
+
+    os.makedirs(DIR_SUBIDAS, exist_ok=True)
+    subida_id = uuid.uuid4().hex
+    ruta_datos, ruta_meta = _rutas(subida_id)
+    with open(ruta_meta, 'w') as meta:
+        json.dump({'nombre': nombre, 'tamano': tamano}, meta)
+    open(ruta_datos, 'wb').close()
+    return estado_subida(subida_id)
+
+
+def estado_subida(subida_id):
+    """Nombre, tamaño esperado y bytes recibidos de una subida, o None si no existe."""
+    ruta_datos, ruta_meta = _rutas(subida_id)
+    try:
+        with open(ruta_meta) as meta:
+            datos = json.load(meta)
+        offset = os.path.getsize(ruta_datos)
+    except (OSError, ValueError):
+        return None
+    return {
+        'id': subida_id,
+        'nombre': datos['nombre'],
+        'tamano': datos['tamano'],
+        'offset': offset,
+        'completa': offset == datos['tamano'],
+        'bloque': TAMANO_BLOQUE,
+    }
+
+
+def agregar_parte(subida_id, offset, entrada, longitud):
+    """
+    Escribe `longitud` bytes leídos de `entrada` (la solicitud) a partir de
+    `offset`, que debe ser lo ya recibido. Lo que se alcance a leer queda escrito
+    aunque la conexión se corte. Retorna el estado de la subida.
+    """
+    estado = estado_subida(subida_id)
+    if estado is None:
+        raise ErrorSubida('La subida no existe o ya se procesó')
+    try:
+        offset, longitud = int(offset), int(longitud)
+    except (TypeError, ValueError):
+        raise ErrorSubida('Offset o longitud inválidos')
+    if offset != estado['offset']:
+        raise ErrorSubida('La parte no empieza donde termina lo recibido', offset=estado['offset'])
+    if longitud <= 0 or longitud > 2 * TAMANO_BLOQUE or offset + longitud > estado['tamano']:
+        raise ErrorSubida('Longitud de la parte inválida')
+
+    ruta_datos, _ = _rutas(subida_id)
+    with open(ruta_datos, 'r+b') as datos:
+        datos.seek(offset)
+        pendiente = longitud
+        try:
+            while pendiente:
+                bloque = entrada.read(min(BLOQUE_LECTURA, pendiente))
+                if not bloque:
+                    break
+                datos.write(bloque)
+                pendiente -= len(bloque)
+        except OSError as e:
+            print(f"Parte incompleta de la subida {subida_id}: {e}")
+    return estado_subida(subida_id)
+
+
+def finalizar_subida(subida_id, directorio):
+    """
+    Mueve el archivo de una subida completa a `directorio` con un nombre único,
+    calcula su SHA-256 y borra el registro de la subida.
+    Retorna (ruta, nombre original, sha256).
+    """
+    estado = estado_subida(subida_id)
+    if estado is None:
+        raise ErrorSubida('La subida no existe o ya se procesó')
+    if not estado['completa']:
+        raise ErrorSubida(f"El archivo {estado['nombre']} no terminó de subirse")
+    ruta_datos, ruta_meta = _rutas(subida_id)
+    hasher = hashlib.sha256()
+    with open(ruta_datos, 'rb') as datos:
+        for bloque in iter(lambda: datos.read(1024 * 1024), b''):
+            hasher.update(bloque)
+
+    os.makedirs(directorio, exist_ok=True)
+    timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+    safe_name = ''.join(c for c in estado['nombre'] if c.isalnum() or c in '._-')
+    ruta = os.path.join(directorio, f"{timestamp}_{safe_name}")
+    os.replace(ruta_datos, ruta)
+    os.remove(ruta_meta)
+    return ruta, estado['nombre'], hasher.hexdigest()
@@ -0,0 +1,70 @@
+"""
+Archivos temporales de los lotes de PDFs: limpieza y sincronización con el disco.
+
+Los archivos de media/temp_uploads solo existen mientras se combina el lote (la
+vista los borra al terminar); los que quedan son de solicitudes interrumpidas.
+Borrarlos no le corresponde a cada solicitud: lo hace limpiar_temporales, que
+corre en `python manage.py limpiar_temporales` (una vez o con --continuo) y
+periódicamente en el worker de procesar_trabajos. También borra las subidas por
+partes abandonadas (ver subidas.py).
+"""
+import os
+import time
+from django.conf import settings
+from .subidas import limpiar_subidas_abandonadas
+
+DIR_TEMP_UPLOADS = os.path.join(settings.MEDIA_ROOT, 'temp_uploads')
+
+# Horas que se conserva un archivo de temp_uploads antes de considerarlo abandonado
+RETENCION_TEMPORALES = getattr(settings, 'PDF_TEMP_RETENCION_HORAS', 1)
+
+# Sincronizar con el disco también los archivos temporales que se combinan en la
+# misma solicitud (los que esperan en la cola de trabajos se sincronizan siempre)
+FSYNC_TEMPORALES = getattr(settings, 'PDF_TEMP_FSYNC', False)
+
+
+def limpiar_temporales(horas=None):
+    """Borra los archivos de temp_uploads más antiguos que `horas` y las subidas abandonadas."""
+    horas = RETENCION_TEMPORALES if horas is None else horas
+    limite = time.time() - horas * 3600
+    borrados = 0
+    try:
+        entradas = list(os.scandir(DIR_TEMP_UPLOADS))
+    except FileNotFoundError:
+        entradas = []
+    for entrada in entradas:
+        try:
+            if entrada.is_file() and entrada.stat().st_mtime < limite:
+                os.remove(entrada.path)
+                borrados += 1
+        except OSError:
+            pass  # Otro proceso lo borró o está en uso
+    if borrados:
+        print(f"{borrados} archivos temporales antiguos eliminados")
+    return borrados + limpiar_subidas_abandonadas()
+
+
+def sincronizar(rutas):
+    """
+    Asegura en disco los archivos ya escritos, de una vez al final del lote: cada
+    archivo y luego cada directorio (para que sus nombres también sobrevivan a un
+    corte de energía). Mientras se escribían los siguientes, el sistema operativo
+    ya fue bajando los anteriores, así que cada fsync espera poco.
+    """
+    for ruta in rutas:
+        descriptor = os.open(ruta, os.O_RDONLY)
+        try:
+            os.fsync(descriptor)
+        finally:
+            os.close(descriptor)
+    for directorio in {os.path.dirname(ruta) for ruta in rutas}:
+        try:
+            descriptor = os.open(directorio, os.O_RDONLY)
+        except OSError:
+            continue  # En Windows no se pueden abrir directorios
+        try:
+            os.fsync(descriptor)
+        except OSError:
+            pass
+        finally:
+            os.close(descriptor)
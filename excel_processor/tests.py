@@ -1,3 +1,274 @@
-from django.test import TestCase
+import importlib.util
+import io
+import os
+import shutil
+import tempfile
+import threading
+from unittest import mock
 
-# Create your tests here.
+from django.db import connection
+from django.test import Client, SimpleTestCase, TestCase, TransactionTestCase
+from openpyxl import Workbook
+from PyPDF2 import PdfReader
+
+from excel_processor import cache_planillas, ingest, pdf_utils
+from excel_processor.hojas import LibroXlsx
+from excel_processor.models import ExcelProcess
+from excel_processor.storage import AlmacenamientoPorContenido
+from excel_processor.utils import COLUMNAS_REQUERIDAS
+
+
+def _libro_de_prueba(numero, filas=20, hojas=1):
+    """
+    Un .xlsx con las columnas requeridas y `filas` filas por hoja (la hoja n tiene
+    n filas más); `numero` lo hace distinto de los demás (otro SHA-256).
+    """
+    libro = Workbook()
+    for n in range(hojas):
+        hoja = libro.active if n == 0 else libro.create_sheet()
+        hoja.title = f'Hoja{n + 1}'
+        hoja.append(COLUMNAS_REQUERIDAS)
+        for fila in range(filas + n):
+            # Solo las filas con 'nuevo' > 0 pasan a las planillas
+            hoja.append([f'OP{numero}-{n}-{fila}', f'PR{fila}', 10, 5, 5, '', '2024-01-01', '', 0, 5,
+                         (3, 5, 7)[fila % 3]])
+    contenido = io.BytesIO()
+    libro.save(contenido)
+    return contenido.getvalue()
+
+
+def _subir(libro, nombre, **parametros):
+    archivo = io.BytesIO(libro)
+    archivo.name = nombre
+    return Client().post('/excel/upload_api/', {'archivo': archivo, **parametros})
+
+
+class MediaTemporalMixin:
+    """
+    Guarda los libros subidos y las planillas delta en una carpeta temporal en
+    lugar de media/, y dibuja las planillas en este proceso (los procesos del
+    pool no verían los cambios).
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.media = tempfile.mkdtemp(prefix='test_cargas_')
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+
+        def ruta_planilla(nombre, consecutivo):
+            return os.path.join(self.media, f'{nombre}_{consecutivo}.pdf')
+
+        parches = [
+            mock.patch('excel_processor.storage.almacenamiento_excels',
+                       AlmacenamientoPorContenido(location=self.media)),
+            mock.patch.object(ingest, 'PROCESOS_PLANILLAS', 0),
+        ] + [
+            mock.patch(f'excel_processor.{modulo}.ruta_planilla', ruta_planilla)
+            for modulo in ('ingest', 'cache_planillas', 'pdf_planilla')
+        ]
+        for parche in parches:
+            parche.start()
+            self.addCleanup(parche.stop)
+
+
+class CargasConcurrentesTests(MediaTemporalMixin, TransactionTestCase):
+    """
+    Varias cargas subidas a la vez por /excel/upload_api/ no deben repetir
+    consecutivos ni dejar huecos (ver ingest._asignar_consecutivos).
+    """
+
+    CARGAS = 8
+
+    def test_consecutivos_unicos_y_contiguos(self):
+        libros = [_libro_de_prueba(n) for n in range(self.CARGAS)]
+        respuestas = [None] * self.CARGAS
+        errores = []
+        barrera = threading.Barrier(self.CARGAS)
+
+        def subir(n):
+            try:
+                barrera.wait()  # Todas las cargas arrancan a la vez
+                respuestas[n] = _subir(libros[n], f'carga_{n}.xlsx')
+            except Exception as e:
+                errores.append(e)
+            finally:
+                connection.close()
+
+        hilos = [threading.Thread(target=subir, args=(n,)) for n in range(self.CARGAS)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        self.assertEqual(errores, [])
+        for respuesta in respuestas:
+            self.assertEqual(respuesta.status_code, 200, respuesta.content)
+            self.assertEqual(respuesta.json()['filas'], 20)
+
+        por_planilla = len(ingest.RUTAS)
+        consecutivos = sorted(ExcelProcess.objects.values_list('consecutivo', flat=True))
+        self.assertEqual(len(consecutivos), self.CARGAS * por_planilla)
+        self.assertEqual(len(set(consecutivos)), len(consecutivos), 'consecutivos repetidos')
+        self.assertEqual(consecutivos, list(range(consecutivos[0], consecutivos[0] + len(consecutivos))),
+                         'consecutivos con huecos')
+        # Las planillas de cada carga también quedan seguidas
+        for respuesta in respuestas:
+            propios = sorted(planilla['consecutivo'] for planilla in respuesta.json()['planillas'])
+            self.assertEqual(propios, list(range(propios[0], propios[0] + por_planilla)))
+
+
+class CargaReutilizadaTests(MediaTemporalMixin, TestCase):
+    """Al volver a subir el mismo libro se reutilizan sus planillas con sus conteos de filas."""
+
+    def _comparar(self, primera, segunda):
+        self.assertFalse(primera['reutilizado'])
+        self.assertTrue(segunda['reutilizado'])
+        self.assertEqual(segunda['filas'], primera['filas'])
+        self.assertEqual(
+            [(p['hoja'], p['bodega'], p['consecutivo'], p['filas']) for p in segunda['planillas']],
+            [(p['hoja'], p['bodega'], p['consecutivo'], p['filas']) for p in primera['planillas']],
+        )
+        self.assertEqual(sum(p['filas'] for p in segunda['planillas']), segunda['filas'])
+
+    def test_filas_por_planilla_al_reutilizar(self):
+        libro = _libro_de_prueba(1, hojas=2)
+        primera = _subir(libro, 'dos_hojas.xlsx').json()
+        segunda = _subir(libro, 'dos_hojas.xlsx').json()
+        self.assertEqual(len(primera['planillas']), 2 * len(ingest.RUTAS))
+        self._comparar(primera, segunda)
+
+    def test_filas_por_planilla_al_reutilizar_streaming(self):
+        libro = _libro_de_prueba(2, hojas=2)
+        primera = _subir(libro, 'dos_hojas.xlsx', streaming='1').json()
+        segunda = _subir(libro, 'dos_hojas.xlsx', streaming='1').json()
+        self._comparar(primera, segunda)
+
+
+class CargaDeltaTests(MediaTemporalMixin, TestCase):
+    """Las planillas de una carga delta se entregan por URL, nunca con su ruta en disco."""
+
+    def _assert_urls(self, respuesta):
+        for clave, valor in respuesta.items():
+            if clave.startswith('pdf_'):
+                self.assertTrue(valor.startswith('/excel/planillas/'), f'{clave}: {valor}')
+        for planilla in respuesta['planillas']:
+            self.assertEqual(planilla['pdf'], f"/excel/planillas/{planilla['consecutivo']}.pdf")
+            self.assertNotIn(self.media, planilla['pdf'])
+
+    def test_urls_de_planillas_delta(self):
+        # El mismo contenido en las dos cargas: openpyxl guarda la hora en el libro
+        libro = _libro_de_prueba(1)
+        primera = _subir(libro, 'delta.xlsx', delta='1').json()
+        self.assertTrue(primera['delta'])
+        self._assert_urls(primera)
+        respuesta = self.client.get(primera['planillas'][0]['pdf'])
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertTrue(b''.join(respuesta.streaming_content).startswith(b'%PDF'))
+
+        # La misma carga delta reutilizada también responde con URLs
+        segunda = _subir(libro, 'delta.xlsx', delta='1').json()
+        self.assertTrue(segunda['reutilizado'])
+        self._assert_urls(segunda)
+
+    def test_listado_sin_enlace_a_delta_borrada(self):
+        planillas = _subir(_libro_de_prueba(1), 'delta.xlsx', delta='1').json()['planillas']
+        borrada, conservada = planillas[0]['consecutivo'], planillas[1]['consecutivo']
+        os.remove(os.path.join(self.media, f'planilla_{borrada}.pdf'))
+        enlaces = {proceso.consecutivo: proceso.pdf_path
+                   for proceso in self.client.get('/excel/pdfs/').context['procesos']}
+        self.assertIsNone(enlaces[borrada])
+        self.assertEqual(enlaces[conservada], f'/excel/planillas/{conservada}.pdf')
+
+
+class LecturaParcialTests(MediaTemporalMixin, TestCase):
+    """La lectura de solo algunas columnas de un xlsx entrega lo mismo que openpyxl en esas columnas."""
+
+    def test_columnas_pedidas_iguales_a_lectura_completa(self):
+        libro = LibroXlsx(io.BytesIO(_libro_de_prueba(1, hojas=2)))
+        try:
+            for hoja in libro.hojas:
+                completas = list(libro.filas(hoja))
+                solo = {0, 1, 9, 10}
+                parciales = list(libro.filas(hoja, solo=solo))
+                self.assertEqual(len(parciales), len(completas))
+                for parcial, completa in zip(parciales, completas):
+                    self.assertEqual(parcial, tuple(v if i in solo else None for i, v in enumerate(completa)))
+        finally:
+            libro.cerrar()
+
+    def test_vista_previa_cuenta_igual_que_la_carga(self):
+        libro = _libro_de_prueba(3, hojas=2)
+        previa = _subir(libro, 'previa.xlsx', preview='1').json()
+        carga = _subir(libro, 'previa.xlsx').json()
+        self.assertTrue(previa['vista_previa'])
+        self.assertEqual(previa['filas'], carga['filas'])
+        self.assertEqual([(p['hoja'], p['bodega'], p['filas']) for p in previa['planillas']],
+                         [(p['hoja'], p['bodega'], p['filas']) for p in carga['planillas']])
+
+
+class ReimpresionTests(MediaTemporalMixin, TestCase):
+    """La reimpresión combina las planillas con los motores de pdf_utils, sin páginas en blanco entre ellas."""
+
+    def setUp(self):
+        super().setUp()
+        parche = mock.patch.object(cache_planillas, 'DIR_CACHE', os.path.join(self.media, 'cache'))
+        parche.start()
+        self.addCleanup(parche.stop)
+
+    def _paginas(self, respuesta):
+        self.assertEqual(respuesta.status_code, 200)
+        return len(PdfReader(io.BytesIO(b''.join(respuesta.streaming_content))).pages)
+
+    def test_reimpresion_con_cada_motor(self):
+        carga = _subir(_libro_de_prueba(1, hojas=2), 'reimpresion.xlsx').json()
+        consecutivos = sorted(planilla['consecutivo'] for planilla in carga['planillas'])
+        rango = {'desde': consecutivos[0], 'hasta': consecutivos[-1]}
+        for motor in pdf_utils.MOTORES:
+            if motor == 'pdfium' and importlib.util.find_spec('pypdfium2') is None:
+                continue
+            with self.subTest(motor=motor), mock.patch.object(pdf_utils, 'MOTOR_LOTE', motor):
+                shutil.rmtree(cache_planillas.DIR_CACHE, ignore_errors=True)
+                # La primera vez las planillas se dibujan en memoria; la segunda salen de la caché
+                dibujadas = self._paginas(self.client.get('/excel/planillas/reimprimir/', rango))
+                en_cache = self._paginas(self.client.get('/excel/planillas/reimprimir/', rango))
+                por_planilla = sum(self._paginas(self.client.get(planilla['pdf'])) for planilla in carga['planillas'])
+                self.assertEqual(dibujadas, por_planilla)
+                self.assertEqual(en_cache, por_planilla)
+
+    def test_fecha_invalida(self):
+        for fecha in ('abc', '2024-02-30'):
+            with self.subTest(fecha=fecha):
+                respuesta = self.client.get('/excel/planillas/reimprimir/', {'fecha_inicio': fecha})
+                self.assertEqual(respuesta.status_code, 400)
+                self.assertIn('error', respuesta.json())
+
+    def test_planillas_ilegibles(self):
+        _subir(_libro_de_prueba(2), 'ilegible.xlsx')
+        with mock.patch('excel_processor.views.reunir_planillas', return_value=([io.BytesIO(b'no es un pdf')], 0)):
+            respuesta = self.client.get('/excel/planillas/reimprimir/', {'fecha_inicio': '2000-01-01'})
+        self.assertEqual(respuesta.status_code, 404)
+
+
+class RecorteCacheTests(SimpleTestCase):
+    """La caché de planillas se recorre solo al superar su tamaño máximo, no con cada planilla guardada."""
+
+    def setUp(self):
+        carpeta = tempfile.mkdtemp(prefix='test_cache_')
+        self.addCleanup(shutil.rmtree, carpeta, ignore_errors=True)
+        for parche in (mock.patch.object(cache_planillas, 'DIR_CACHE', carpeta),
+                       mock.patch.object(cache_planillas, 'TAMANO_CACHE', 100 * 1024),
+                       mock.patch.object(cache_planillas, '_tamano_cache', None)):
+            parche.start()
+            self.addCleanup(parche.stop)
+
+    def test_recorridos_y_tamano(self):
+        scandir = os.scandir
+        with mock.patch('excel_processor.cache_planillas.os.scandir', side_effect=scandir) as recorridos:
+            for n in range(300):
+                cache_planillas._guardar_en_cache(os.path.join(cache_planillas.DIR_CACHE, f'{n}_v1.pdf'), b'x' * 1024)
+        # Un recorrido al empezar y uno cada vez que se supera el límite, no uno por planilla
+        self.assertLess(recorridos.call_count, 30)
+        tamano = sum(entrada.stat().st_size for entrada in os.scandir(cache_planillas.DIR_CACHE))
+        self.assertLessEqual(tamano, cache_planillas.TAMANO_CACHE)
+        # Quedan las planillas guardadas más recientemente
+        self.assertTrue(os.path.exists(os.path.join(cache_planillas.DIR_CACHE, '299_v1.pdf')))
@@ -0,0 +1,218 @@
+"""
+Cola de trabajos en segundo plano respaldada por la base de datos.
+
+Las vistas encolan un Trabajo y responden de inmediato con su id; el comando
+`python manage.py procesar_trabajos` los toma uno a uno y los ejecuta. No se
+necesita ningún broker externo: la tabla Trabajo es la cola.
+"""
+import datetime
+import os
+import traceback
+from django.conf import settings
+from django.core.files import File
+from django.db.models import F
+from django.utils import timezone
+from .ingest import _parametro_activo, procesar_carga
+from .models import Trabajo
+from .pdf_utils import PDFBatchProcessor
+
+# Directorio donde se guardan los archivos subidos mientras esperan al worker
+DIR_TRABAJOS = os.path.join(settings.MEDIA_ROOT, 'trabajos')
+
+# Segundos tras los cuales un trabajo en_proceso se considera abandonado
+# (el worker se detuvo a mitad de camino) y vuelve a quedar pendiente
+TIMEOUT_TRABAJO = getattr(settings, 'TRABAJOS_TIMEOUT', 3600)
+
+# Intentos máximos antes de marcar como error un trabajo que sigue abandonándose
+MAX_INTENTOS = 3
+
+
+def en_segundo_plano(request):
+    """Indica si la solicitud se debe encolar (parámetro `async` o settings)."""
+    activo = _parametro_activo(request, 'async')
+    if activo is not None:
+        return activo
+    return getattr(settings, 'TRABAJOS_EN_SEGUNDO_PLANO', False)
+
+
+def guardar_archivo_trabajo(uploaded_file):
+    """Copia un archivo subido a DIR_TRABAJOS y retorna su ruta."""
+    os.makedirs(DIR_TRABAJOS, exist_ok=True)
+    timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+    safe_name = ''.join(c for c in os.path.basename(uploaded_file.name) if c.isalnum() or c in '._-')
+    file_path = os.path.join(DIR_TRABAJOS, f"{timestamp}_{safe_name}")
+    with open(file_path, 'wb') as dest_file:
+        for chunk in uploaded_file.chunks():
+            dest_file.write(chunk)
+    return file_path
+
+
+def encolar(tipo, **parametros):
+    """Crea un trabajo pendiente y lo retorna."""
+    trabajo = Trabajo.objects.create(tipo=tipo, parametros=parametros, mensaje='En cola')
+    print(f"Trabajo {trabajo.id} ({tipo}) encolado")
+    return trabajo
+
+
+def actualizar_progreso(trabajo, progreso, mensaje=''):
+    """Guarda el avance (0-100) de un trabajo en curso."""
+    progreso = max(0, min(100, int(progreso)))
+    Trabajo.objects.filter(pk=trabajo.pk).update(progreso=progreso, mensaje=mensaje[:255])
+
+
+def tomar_siguiente():
+    """
+    Toma el trabajo pendiente más antiguo y lo marca en_proceso.
+    El cambio de estado es un UPDATE condicionado al estado pendiente, así que si
+    hay varios workers solo uno de ellos se queda con cada trabajo.
+    """
+    for trabajo_id in Trabajo.objects.filter(estado='pendiente').order_by('id').values_list('id', flat=True)[:10]:
+        tomado = Trabajo.objects.filter(id=trabajo_id, estado='pendiente').update(
+            estado='en_proceso',
+            fecha_inicio=timezone.now(),
+            mensaje='Procesando',
+            intentos=F('intentos') + 1,
+        )
+        if tomado:
+            return Trabajo.objects.get(id=trabajo_id)
+    return None
+
+
+def recuperar_abandonados():
+    """
+    Devuelve a pendiente los trabajos en_proceso que superaron TIMEOUT_TRABAJO;
+    los que ya agotaron MAX_INTENTOS se marcan como error.
+    """
+    limite = timezone.now() - datetime.timedelta(seconds=TIMEOUT_TRABAJO)
+    abandonados = Trabajo.objects.filter(estado='en_proceso', fecha_inicio__lt=limite)
+    fallidos = abandonados.filter(intentos__gte=MAX_INTENTOS).update(
+        estado='error',
+        error='El trabajo se interrumpió demasiadas veces',
+        fecha_fin=timezone.now(),
+    )
+    reintentos = abandonados.update(estado='pendiente', mensaje='Reintentando')
+    if fallidos or reintentos:
+        print(f"Trabajos abandonados: {reintentos} reencolados, {fallidos} marcados con error")
+    return reintentos
+
+
+def _ejecutar_excel(trabajo):
+    parametros = trabajo.parametros
+    ruta = parametros['ruta']
+    actualizar_progreso(trabajo, 10, 'Leyendo archivo Excel')
+    try:
+        with open(ruta, 'rb') as f:
+            archivo = File(f, name=parametros.get('nombre') or os.path.basename(ruta))
+            resultado = procesar_carga(
+                archivo,
+                streaming=parametros.get('streaming', False),
+                sha256=parametros.get('sha256', ''),
+                forzar=parametros.get('forzar', False),
+                delta=parametros.get('delta', False),
+            )
+    finally:
+        try:
+            os.remove(ruta)
+        except OSError:
+            pass
+    return resultado
+
+
+def _ejecutar_pdf_lote(trabajo):
+    rutas = trabajo.parametros['rutas']
+    output_path = trabajo.parametros.get('output_path')
+
+    def progreso(actual, total):
+        actualizar_progreso(trabajo, actual * 90 // max(total, 1), f"Combinando PDF {actual} de {total}")
+
+    processor = PDFBatchProcessor()
+    try:
+        result = processor.combine_pdfs(rutas, output_path, progress_callback=progreso,
+                                        hashes=trabajo.parametros.get('hashes'))
+    finally:
+        for file_path in rutas:
+            try:
+                if os.path.exists(file_path):
+                    os.remove(file_path)
+            except Exception as e:
+                print(f"Error al eliminar archivo temporal {file_path}: {e}")
+    if not result:
+        raise RuntimeError('Error al procesar los PDFs')
+    return {'output_path': result, 'reutilizado': processor.reutilizado}
+
+
+EJECUTORES = {
+    'excel': _ejecutar_excel,
+    'pdf_lote': _ejecutar_pdf_lote,
+}
+
+
+def ejecutar(trabajo):
+    """Ejecuta un trabajo ya tomado y guarda su resultado o su error."""
+    print(f"Ejecutando trabajo {trabajo.id} ({trabajo.tipo})")
+    try:
+        resultado = EJECUTORES[trabajo.tipo](trabajo)
+    except Exception as e:
+        print(f"Error en el trabajo {trabajo.id}: {str(e)}")
+        print(traceback.format_exc())
+        Trabajo.objects.filter(pk=trabajo.pk).update(
+            estado='error',
+            error=str(e),
+            mensaje='Error',
+            fecha_fin=timezone.now(),
+        )
+        return False
+    Trabajo.objects.filter(pk=trabajo.pk).update(
+        estado='completado',
+        resultado=resultado,
+        progreso=100,
+        mensaje='Completado',
+        fecha_fin=timezone.now(),
+    )
+    print(f"Trabajo {trabajo.id} completado")
+    return True
+
+
+def url_media(ruta):
+    """
+    Convierte una ruta absoluta dentro de MEDIA_ROOT en su URL pública. Lo que
+    no está en MEDIA_ROOT (p. ej. la URL de una planilla) se retorna sin cambios.
+    """
+    if not ruta:
+        return None
+    media_root = os.path.abspath(settings.MEDIA_ROOT)
+    absoluta = os.path.abspath(ruta)
+    if absoluta.startswith(media_root):
+        return settings.MEDIA_URL + absoluta[len(media_root):].replace('\\', '/').lstrip('/')
+    return ruta
+
+
+def estado_trabajo(trabajo):
+    """Representación JSON de un trabajo para el endpoint de estado."""
+    resultado = trabajo.resultado
+    if resultado:
+        resultado = {
+            clave: url_media(valor) if (clave.startswith('pdf_') or clave == 'output_path') and valor else valor
+            for clave, valor in resultado.items()
+        }
+        if resultado.get('planillas'):
+            resultado['planillas'] = [
+                dict(planilla, pdf=url_media(planilla['pdf'])) for planilla in resultado['planillas']
+            ]
+        if resultado.get('hojas'):
+            resultado['hojas'] = [
+                dict(hoja, planillas=[dict(planilla, pdf=url_media(planilla['pdf'])) for planilla in hoja['planillas']])
+                for hoja in resultado['hojas']
+            ]
+    return {
+        'id': trabajo.id,
+        'tipo': trabajo.tipo,
+        'estado': trabajo.estado,
+        'progreso': trabajo.progreso,
+        'mensaje': trabajo.mensaje,
+        'resultado': resultado,
+        'error': trabajo.error,
+        'fecha_creacion': trabajo.fecha_creacion.isoformat(),
+        'fecha_inicio': trabajo.fecha_inicio.isoformat() if trabajo.fecha_inicio else None,
+        'fecha_fin': trabajo.fecha_fin.isoformat() if trabajo.fecha_fin else None,
+    }
@@ -0,0 +1,29 @@
+"""
+Manejadores de subida de archivos.
+"""
+import hashlib
+from django.core.files.uploadhandler import FileUploadHandler
+
+
+class HashingUploadHandler(FileUploadHandler):
+    """
+    Calcula el SHA-256 de cada archivo mientras se recibe, sin almacenar nada.
+
+    Debe ir primero en FILE_UPLOAD_HANDLERS: deja pasar los datos intactos a los
+    siguientes manejadores y deja los hashes en request.upload_hashes, una lista
+    por nombre de campo en el mismo orden de request.FILES.getlist(campo).
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.hasher = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.hasher.update(raw_data)
+        return raw_data
+
+    def file_complete(self, file_size):
+        if not hasattr(self.request, 'upload_hashes'):
+            self.request.upload_hashes = {}
+        self.request.upload_hashes.setdefault(self.field_name, []).append(self.hasher.hexdigest())
+        return None
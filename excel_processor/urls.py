@@ -9,6 +9,11 @@ urlpatterns = [
     path('exportar_excel_historico/', views.exportar_excel_historico, name='exportar_excel_historico'),
     path('upload_api/', views.upload_excel, name='upload_excel'),
     path('pdfs/', views.pdf_list, name='pdf_list'),
+    path('planillas/<int:consecutivo>.pdf', views.planilla_pdf, name='planilla_pdf'),
+    path('planillas/reimprimir/', views.reimprimir_planillas, name='reimprimir_planillas'),
+    path('trabajos/<int:trabajo_id>/', views.estado_trabajo_view, name='estado_trabajo'),
     path('pdf-batch/', views_batch.pdf_batch_process, name='pdf_batch_process'),
+    path('pdf-batch/subidas/', views_batch.crear_subida_pdf, name='crear_subida_pdf'),
+    path('pdf-batch/subidas/<str:subida_id>/', views_batch.subida_pdf, name='subida_pdf'),
     path('homs/', views.manhoms, name='manhoms'),
 ]
@@ -1,32 +1,55 @@
-def validar_formato_excel(ws):
+# Lista de columnas requeridas (nombres exactos). Este orden es también el orden
+# canónico en el que quedan las filas después de clasificarlas.
+COLUMNAS_REQUERIDAS = [
+    'Nro.Ord.Prod',
+    'PRODUC.',
+    'CANT. ORIGINAL',
+    'SALDO P ENTREGAR',
+    'Ctd.Producid',
+    'Observacion',
+    'FC.PREVISTA',
+    'concat',
+    'anterior',
+    'nuevo',
+    'iny'
+]
+
+
+def _normalizar(nombre):
+    return str(nombre).strip().lower() if nombre is not None else ''
+
+
+def resolver_columnas(encabezado):
     """
-    Valida que el archivo Excel tenga las columnas requeridas.
-    Retorna (bool, str) - (es_valido, mensaje_error)
+    Busca cada columna requerida en la fila de encabezado, sin distinguir mayúsculas.
+    Retorna (columnas, faltantes) donde columnas es {nombre requerido: índice}.
     """
-    # Lista de columnas requeridas (nombres exactos)
-    COLUMNAS_REQUERIDAS = [
-        'Nro.Ord.Prod',
-        'PRODUC.',
-        'CANT. ORIGINAL',
-        'SALDO P ENTREGAR',
-        'Ctd.Producid',
-        'Observacion',
-        'FC.PREVISTA',
-        'concat',
-        'anterior',
-        'nuevo',
-        'iny'
-    ]
-    
-    # Obtener los nombres de las columnas del Excel (primera fila)
-    columnas_excel = [str(cell.value).strip() if cell.value else '' for cell in ws[1]]
-    
-    # Verificar cada columna requerida
-    columnas_faltantes = []
+    posiciones = {}
+    for idx, nombre in enumerate(encabezado):
+        posiciones.setdefault(_normalizar(nombre), idx)
+
+    columnas = {}
+    faltantes = []
     for columna in COLUMNAS_REQUERIDAS:
-        if columna not in columnas_excel:
-            columnas_faltantes.append(columna)
-    
+        idx = posiciones.get(_normalizar(columna))
+        if idx is None:
+            faltantes.append(columna)
+        else:
+            columnas[columna] = idx
+    return columnas, faltantes
+
+
+def validar_encabezado(encabezado):
+    """
+    Valida que la fila de encabezado (lista de valores) tenga las columnas requeridas.
+    Retorna (bool, str, dict) - (es_valido, mensaje_error, columnas) donde columnas
+    es el mapa {nombre de columna: índice} que usa la clasificación de filas.
+    """
+    columnas_excel = [str(valor).strip() if valor else '' for valor in encabezado]
+
+    # Verificar cada columna requerida
+    columnas, columnas_faltantes = resolver_columnas(columnas_excel)
+
     if columnas_faltantes:
         mensaje = (
             f"El archivo Excel no tiene el formato correcto.\n\n"
@@ -36,6 +59,7 @@ def validar_formato_excel(ws):
             f"- {', '.join(columnas_faltantes)}\n\n"
             f"Nota: El campo 'Cant. Produc' se generará automáticamente durante el procesamiento."
         )
-        return False, mensaje
-    
-    return True, "Formato válido"
\ No newline at end of file
+        return False, mensaje, None
+
+    return True, "Formato válido", columnas
+
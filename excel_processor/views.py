@@ -1,5 +1,5 @@
 from django.views.decorators.http import require_GET
-from django.utils.dateparse import parse_datetime
+from django.utils.dateparse import parse_date, parse_datetime
 from django.http import HttpResponse, JsonResponse
 import io
 import openpyxl
@@ -133,159 +133,217 @@ import openpyxl
 from reportlab.lib.pagesizes import letter
 from reportlab.pdfgen import canvas
 import os
+import time
+from django.conf import settings
 from django.core.paginator import Paginator
+from django.shortcuts import get_object_or_404
+from django.http import FileResponse, Http404
+from django.urls import reverse
+from .models import Trabajo
+from .cache_planillas import (abrir_planilla, buscar_proceso, combinar_planillas, planilla_disponible, reunir_planillas,
+                              url_planilla)
+from .trabajos import en_segundo_plano, encolar, estado_trabajo, guardar_archivo_trabajo, url_media
+from .ingest import (
+    ErrorFormatoExcel,
+    forzar_reproceso,
+    modo_delta,
+    modo_streaming,
+    modo_vista_previa,
+    previsualizar_carga,
+    procesar_carga,
+    sha256_de_carga,
+)
+
+def _encolar_carga(request, archivo):
+    """Guarda el archivo subido y encola su procesamiento en segundo plano."""
+    return encolar(
+        'excel',
+        ruta=guardar_archivo_trabajo(archivo),
+        nombre=archivo.name,
+        streaming=modo_streaming(request),
+        sha256=sha256_de_carga(request, archivo),
+        forzar=forzar_reproceso(request),
+        delta=modo_delta(request),
+    )
 
 @csrf_exempt
 def upload_excel(request):
     if request.method == 'POST' and request.FILES.get('archivo'):
         archivo = request.FILES['archivo']
-        wb = openpyxl.load_workbook(archivo)
-        ws = wb.active
-        # Filtrar filas para cada PDF
-        doc_iny_3_7 = []
-        doc_iny_otros = []
-        for row in ws.iter_rows(min_row=2, values_only=True):
+        if modo_vista_previa(request):
+            # Solo lectura: conteos y totales por planilla, sin guardar ni generar PDFs
             try:
-                nuevo_val = float(row[9]) if row[9] is not None else 0
-            except (ValueError, TypeError):
-                nuevo_val = 0
-            if nuevo_val > 0:
-                try:
-                    iny_val = int(row[10]) if row[10] is not None else 0
-                except (ValueError, TypeError):
-                    iny_val = 0
-                if iny_val in (3, 7):
-                    doc_iny_3_7.append(row)
-                else:
-                    doc_iny_otros.append(row)
-        ultimo = ExcelProcess.objects.order_by('-consecutivo').first()
-        consecutivo_3_7 = (ultimo.consecutivo + 1) if ultimo else 1
-        excel_obj_3_7 = ExcelProcess.objects.create(archivo=archivo, consecutivo=consecutivo_3_7)
-        for row in doc_iny_3_7:
-            RegistroExcel.objects.create(
-                proceso=excel_obj_3_7,
-                orden=row[0],
-                produccion=row[1],
-                cant_orig=row[2],
-                saldo_entregar=row[3],
-                cant_produc=row[9],
-                iny=row[10] if len(row) > 10 else '',
-                otros='' # puedes mapear más campos si lo deseas
-            )
-        ultimo = ExcelProcess.objects.order_by('-consecutivo').first()
-        consecutivo_otros = (ultimo.consecutivo + 1) if ultimo else consecutivo_3_7 + 1
-        excel_obj_otros = ExcelProcess.objects.create(archivo=archivo, consecutivo=consecutivo_otros)
-        for row in doc_iny_otros:
-            RegistroExcel.objects.create(
-                proceso=excel_obj_otros,
-                orden=row[0],
-                produccion=row[1],
-                cant_orig=row[2],
-                saldo_entregar=row[3],
-                cant_produc=row[9],
-                iny=row[10] if len(row) > 10 else '',
-                otros='' # puedes mapear más campos si lo deseas
+                return JsonResponse(previsualizar_carga(archivo, sha256=sha256_de_carga(request, archivo)))
+            except ErrorFormatoExcel as e:
+                return JsonResponse({'error': str(e)}, status=400)
+        if en_segundo_plano(request):
+            trabajo = _encolar_carga(request, archivo)
+            return JsonResponse({
+                'trabajo_id': trabajo.id,
+                'estado': trabajo.estado,
+                'url_estado': reverse('estado_trabajo', args=[trabajo.id])
+            }, status=202)
+        try:
+            resultado = procesar_carga(
+                archivo,
+                streaming=modo_streaming(request),
+                sha256=sha256_de_carga(request, archivo),
+                forzar=forzar_reproceso(request),
+                delta=modo_delta(request),
             )
+        except ErrorFormatoExcel as e:
+            return JsonResponse({'error': str(e)}, status=400)
 
-        pdf_3_7 = generar_pdf('planilla', doc_iny_3_7, consecutivo_3_7)
-        pdf_otros = generar_pdf('planilla', doc_iny_otros, consecutivo_otros)
-
-        return JsonResponse({
-            'pdf_3_7': pdf_3_7,
-            'pdf_otros': pdf_otros,
-            'consecutivo_3_7': consecutivo_3_7,
-            'consecutivo_otros': consecutivo_otros
+        # pdf_<bodega> y consecutivo_<bodega> (pdf_3_7, pdf_otros, ...) por cada planilla
+        respuesta = {
+            clave: valor for clave, valor in resultado.items()
+            if clave.startswith(('pdf_', 'consecutivo_'))
+        }
+        respuesta.update({
+            'planillas': resultado['planillas'],
+            'hojas': resultado['hojas'],
+            'hojas_omitidas': resultado.get('hojas_omitidas', []),
+            'filas': resultado['filas'],
+            'filas_por_segundo': resultado['filas_por_segundo'],
+            'reutilizado': resultado['reutilizado'],
+            'delta': resultado.get('delta', False),
+            'nuevas': resultado.get('nuevas'),
+            'actualizadas': resultado.get('actualizadas')
         })
+        return JsonResponse(respuesta)
     return JsonResponse({'error': 'Método no permitido o archivo no enviado'}, status=400)
 
 def home(request):
     return render(request, 'excel_processor/home.html')
 
-from .utils import validar_formato_excel
 
 def upload_excel_web(request):
-    pdf_3_7 = pdf_otros = None
-    error_message = None
+    planillas = []
+    reutilizado = False
+    resultado = None
     
     if request.method == 'POST' and request.FILES.get('archivo'):
         archivo = request.FILES['archivo']
-        try:
-            wb = openpyxl.load_workbook(archivo)
-            ws = wb.active
-            
-            # Validar formato del Excel
-            es_valido, mensaje = validar_formato_excel(ws)
-            if not es_valido:
+        if modo_vista_previa(request):
+            try:
+                vista_previa = previsualizar_carga(archivo, sha256=sha256_de_carga(request, archivo))
+            except ErrorFormatoExcel as e:
                 return render(request, 'excel_processor/upload.html', {
-                    'error': mensaje,
-                    'pdf_3_7': None,
-                    'pdf_otros': None
+                    'error': str(e),
+                    'planillas': []
                 })
+            return render(request, 'excel_processor/upload.html', {
+                'vista_previa': vista_previa,
+                'varias_hojas': len(vista_previa['hojas']) > 1,
+            })
+        if en_segundo_plano(request):
+            trabajo = _encolar_carga(request, archivo)
+            return render(request, 'excel_processor/upload.html', {
+                'trabajo_id': trabajo.id,
+                'url_estado': reverse('estado_trabajo', args=[trabajo.id])
+            })
+        try:
+            resultado = procesar_carga(
+                archivo,
+                streaming=modo_streaming(request),
+                sha256=sha256_de_carga(request, archivo),
+                forzar=forzar_reproceso(request),
+                delta=modo_delta(request),
+            )
+        except ErrorFormatoExcel as e:
+            return render(request, 'excel_processor/upload.html', {
+                'error': str(e),
+                'planillas': []
+            })
         except Exception as e:
             return render(request, 'excel_processor/upload.html', {
                 'error': f'Error al procesar el archivo Excel: {str(e)}',
-                'pdf_3_7': None,
-                'pdf_otros': None
+                'planillas': []
             })
-        doc_iny_3_7 = []
-        doc_iny_otros = []
-        for row in ws.iter_rows(min_row=2, values_only=True):
-            try:
-                nuevo_val = float(row[9]) if row[9] is not None else 0
-            except (ValueError, TypeError):
-                nuevo_val = 0
-            if nuevo_val > 0:
-                try:
-                    iny_val = int(row[10]) if row[10] is not None else 0
-                except (ValueError, TypeError):
-                    iny_val = 0
-                if iny_val in (3, 7):
-                    doc_iny_3_7.append(row)
-                else:
-                    doc_iny_otros.append(row)
-        from .models import ExcelProcess, RegistroExcel
-        ultimo = ExcelProcess.objects.order_by('-consecutivo').first()
-        consecutivo_3_7 = (ultimo.consecutivo + 1) if ultimo else 1
-        excel_obj_3_7 = ExcelProcess.objects.create(archivo=archivo, consecutivo=consecutivo_3_7)
-        for row in doc_iny_3_7:
-            RegistroExcel.objects.create(
-                proceso=excel_obj_3_7,
-                orden=row[0],
-                produccion=row[1],
-                cant_orig=row[2],
-                saldo_entregar=row[3],
-                cant_produc=row[9],
-                iny=row[10] if len(row) > 10 else '',
-                otros=''
-            )
-        ultimo = ExcelProcess.objects.order_by('-consecutivo').first()
-        consecutivo_otros = (ultimo.consecutivo + 1) if ultimo else consecutivo_3_7 + 1
-        excel_obj_otros = ExcelProcess.objects.create(archivo=archivo, consecutivo=consecutivo_otros)
-        for row in doc_iny_otros:
-            RegistroExcel.objects.create(
-                proceso=excel_obj_otros,
-                orden=row[0],
-                produccion=row[1],
-                cant_orig=row[2],
-                saldo_entregar=row[3],
-                cant_produc=row[9],
-                iny=row[10] if len(row) > 10 else '',
-                otros=''
-            )
-        # Generar PDFs usando la función existente
-        import os
-        from django.conf import settings
-        pdf_3_7_path = generar_pdf('planilla', doc_iny_3_7, consecutivo_3_7)
-        pdf_otros_path = generar_pdf('planilla', doc_iny_otros, consecutivo_otros)
         # Convertir rutas absolutas a rutas relativas para MEDIA_URL
-        def rel_path(abs_path):
-            media_root = os.path.abspath(settings.MEDIA_ROOT)
-            if abs_path.startswith(media_root):
-                return settings.MEDIA_URL + abs_path[len(media_root):].replace('\\','/').lstrip('/')
-            return abs_path
-        pdf_3_7 = rel_path(pdf_3_7_path) if pdf_3_7_path else None
-        pdf_otros = rel_path(pdf_otros_path) if pdf_otros_path else None
-    return render(request, 'excel_processor/upload.html', {'pdf_3_7': pdf_3_7, 'pdf_otros': pdf_otros})
+        planillas = [
+            dict(planilla, url=url_media(planilla['pdf']))
+            for planilla in resultado['planillas'] if planilla['pdf']
+        ]
+        reutilizado = resultado['reutilizado']
+    return render(request, 'excel_processor/upload.html', {
+        'varias_hojas': len({planilla['hoja'] for planilla in planillas}) > 1,
+        'planillas': planillas,
+        'reutilizado': reutilizado,
+        'resultado': resultado
+    })
+
+@require_GET
+def planilla_pdf(request, consecutivo):
+    """Entrega la planilla PDF de un consecutivo; si no está en la caché se dibuja en ese momento."""
+    proceso = buscar_proceso(consecutivo)
+    archivo = abrir_planilla(proceso) if proceso else None
+    if archivo is None:
+        raise Http404('Planilla no encontrada')
+    return FileResponse(archivo, content_type='application/pdf', filename=f'planilla_{consecutivo}.pdf')
+
+# Máximo de planillas en una reimpresión
+MAX_REIMPRESION = getattr(settings, 'EXCEL_REIMPRESION_MAX', 1000)
+
+def _fecha(valor):
+    # parse_date retorna None si el formato no es AAAA-MM-DD y lanza ValueError si la fecha no existe
+    fecha = parse_date(valor)
+    if fecha is None:
+        raise ValueError(valor)
+    return fecha
+
+@require_GET
+def reimprimir_planillas(request):
+    """
+    Reimpresión masiva: un solo PDF con las planillas de un rango de consecutivos
+    (desde, hasta) y/o de fechas de carga (fecha_inicio, fecha_fin), opcionalmente
+    de una bodega. Las planillas en caché se reutilizan y las demás se dibujan en paralelo.
+    """
+    desde = request.GET.get('desde')
+    hasta = request.GET.get('hasta')
+    fecha_inicio = request.GET.get('fecha_inicio')
+    fecha_fin = request.GET.get('fecha_fin')
+    bodega = request.GET.get('bodega')
+    if not any((desde, hasta, fecha_inicio, fecha_fin)):
+        return JsonResponse({'error': 'Indique un rango de consecutivos (desde, hasta) o de fechas'}, status=400)
+    procesos = ExcelProcess.objects.select_related('carga').order_by('consecutivo', 'id')
+    try:
+        if desde:
+            procesos = procesos.filter(consecutivo__gte=int(desde))
+        if hasta:
+            procesos = procesos.filter(consecutivo__lte=int(hasta))
+    except ValueError:
+        return JsonResponse({'error': 'Los consecutivos deben ser números'}, status=400)
+    try:
+        if fecha_inicio:
+            procesos = procesos.filter(fecha_carga__date__gte=_fecha(fecha_inicio))
+        if fecha_fin:
+            procesos = procesos.filter(fecha_carga__date__lte=_fecha(fecha_fin))
+    except ValueError:
+        return JsonResponse({'error': 'Las fechas deben tener el formato AAAA-MM-DD'}, status=400)
+    if bodega:
+        procesos = procesos.filter(bodega=bodega)
+    procesos = list(procesos[:MAX_REIMPRESION + 1])
+    if len(procesos) > MAX_REIMPRESION:
+        return JsonResponse({'error': f'El rango tiene más de {MAX_REIMPRESION} planillas; redúzcalo'}, status=400)
+
+    inicio = time.perf_counter()
+    fuentes, dibujadas = reunir_planillas(procesos)
+    if not fuentes:
+        raise Http404('No hay planillas en el rango indicado')
+    try:
+        salida = combinar_planillas(fuentes)
+    except ValueError as e:
+        raise Http404(str(e))
+    print(f"Reimpresión de {len(fuentes)} planillas ({dibujadas} dibujadas) en {time.perf_counter() - inicio:.3f}s")
+    nombre = f"planillas_{procesos[0].consecutivo}_{procesos[-1].consecutivo}.pdf"
+    return FileResponse(salida, content_type='application/pdf', filename=nombre)
+
+@require_GET
+def estado_trabajo_view(request, trabajo_id):
+    """Estado, progreso y resultado de un trabajo en segundo plano."""
+    trabajo = get_object_or_404(Trabajo, pk=trabajo_id)
+    return JsonResponse(estado_trabajo(trabajo))
 
 def historico(request):
     # Obtener parámetros de filtrado
@@ -308,142 +366,17 @@ def historico(request):
     registros_page = paginator.get_page(page)
     return render(request, 'excel_processor/historico.html', {'registros': registros_page})
 
-def generar_pdf(nombre, filas, consecutivo):
-    import datetime
-    import os
-    from reportlab.lib.pagesizes import letter
-    from reportlab.pdfgen import canvas
-    width, height = letter
-    margen_cm = 1.7
-    margen = int(margen_cm * 28.3465)  # 1 cm = 28.3465 puntos
-    y = height - margen
-    fecha = datetime.datetime.now().strftime('%d/%m/%Y %H:%M')
-    encabezado = [
-        'ORDEN',
-        'PRODUC.',
-        'CANT.\nORIG',
-        'SALDO P\nENTREGAR',
-        'CANT.\nPRODUC',
-        'ENTREGA',
-        'FALTA\nNTES'
-    ]
-    col_widths = [50, 140, 60, 80, 70, 60, 60]
-    col_positions = [margen]
-    for w in col_widths[:-1]:
-        col_positions.append(col_positions[-1] + w)
-    pdf_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'media')
-    os.makedirs(pdf_dir, exist_ok=True)
-    pdf_path = os.path.abspath(os.path.join(pdf_dir, f'{nombre}_{consecutivo}.pdf'))
-    c = canvas.Canvas(pdf_path, pagesize=letter)
-    def dibujar_encabezado(y, pagina):
-        c.setFont('Helvetica-Bold', 18)
-        c.drawCentredString(width // 2, y, "PLANILLA DE PRODUCCION")
-        y -= 32
-        c.setFont('Helvetica-Bold', 14)
-        c.drawString(margen, y, f"Reporte consecutivo: {consecutivo}")
-        c.drawRightString(width - margen, y, f"Fecha: {fecha}")
-        y -= 27
-        c.setFont('Helvetica-Bold', 12)
-        max_lines = 1
-        for col in encabezado:
-            max_lines = max(max_lines, len(col.split('\n')))
-        for i, col in enumerate(encabezado):
-            if '\n' in col:
-                lineas = col.split('\n')
-                y_offset = y
-                for idx, linea in enumerate(lineas):
-                    c.drawCentredString(col_positions[i] + col_widths[i] // 2, y_offset - (idx * 12), linea)
-            else:
-                c.drawString(col_positions[i], y, str(col))
-        c.setFont('Helvetica-Bold', 12)
-        c.drawRightString(width - margen, height - margen + 5, f"Página {pagina}")
-        y_line_top = y + 12
-        y_line_bottom = y - 12 - 22
-        for x in col_positions:
-            c.setLineWidth(1)
-            c.line(x, y_line_top, x, y_line_bottom)
-        c.line(col_positions[-1] + col_widths[-1], y_line_top, col_positions[-1] + col_widths[-1], y_line_bottom)
-        c.setLineWidth(1)
-        c.line(margen, y_line_bottom, col_positions[-1] + col_widths[-1], y_line_bottom)
-        y -= 12 + 22 + 15  # AGREGADO: 15 puntos adicionales de separación
-        return y
-    pagina = 1
-    y = dibujar_encabezado(y, pagina)
-    suma_nuevo = 0
-    c.setFont('Helvetica', 11)
-    for fila in filas:
-        valores = [fila[0], fila[1], fila[2], fila[3], fila[9], '', '']
-        try:
-            suma_nuevo += float(fila[9]) if fila[9] is not None else 0
-        except (ValueError, TypeError):
-            pass
-        for i, val in enumerate(valores):
-            if i in [2, 3, 4]:
-                col_center = col_positions[i] + col_widths[i] // 2
-                c.drawCentredString(col_center, y, str(val))
-            else:
-                c.drawString(col_positions[i], y, str(val))
-        y_line_top = y + 8
-        y_line_bottom = y - 8
-        for x in col_positions:
-            c.setLineWidth(0.5)
-            c.line(x, y_line_top, x, y_line_bottom)
-        c.line(col_positions[-1] + col_widths[-1], y_line_top, col_positions[-1] + col_widths[-1], y_line_bottom)
-        c.setLineWidth(0.5)
-        c.line(margen, y_line_bottom, col_positions[-1] + col_widths[-1], y_line_bottom)
-        y -= 17
-        if y < 40:
-            c.showPage()
-            pagina += 1
-            y = height - margen
-            y = dibujar_encabezado(y, pagina)
-            c.setFont('Helvetica', 11)
-    y -= 22
-    c.setFont('Helvetica-Bold', 13)
-    c.drawString(margen, y, f"Total Cantidad Producida: {suma_nuevo}")
-    y -= 44
-    pie_lines = [
-        ("Firma Responsable: _____________________________", 27),
-        ("Firma Quien recibe: ______________________________", 27),
-        ("Verificado seguridad: ______________________________", 27),
-        ("Comentarios: ___________________________________________________________", 17),
-        ("______________________________________________________________________", 17),
-        ("______________________________________________________________________", 17),
-        ("", 17),
-        ("Gerencia De produccion: _____________________________", 17),
-        ("", 17),
-        ("Gerencia General o Administrativa: _____________________________", 17),
-    ]
-    espacio_pie = sum([line[1] for line in pie_lines]) + 12
-    if y - espacio_pie < 20:
-        c.showPage()
-        pagina += 1
-        y = height - margen
-        y = dibujar_encabezado(y, pagina)
-        c.setFont('Helvetica', 11)
-    c.setFont('Helvetica', 12)
-    for texto, salto in pie_lines:
-        c.drawString(margen, y, texto)
-        y -= salto
-    c.save()
-    return pdf_path
-
 import os
 
 def pdf_list(request):
     consecutivo = request.GET.get('consecutivo')
-    procesos = ExcelProcess.objects.all().order_by('-fecha_carga')
+    procesos = ExcelProcess.objects.select_related('carga').order_by('-fecha_carga')
     if consecutivo:
         procesos = procesos.filter(consecutivo=consecutivo)
-    from django.conf import settings
     for proc in procesos:
-        pdf_name = f"planilla_{proc.consecutivo}.pdf"
-        pdf_path = os.path.join('media', pdf_name)
-        abs_pdf_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', pdf_path)
-        if os.path.exists(abs_pdf_path):
-            proc.pdf_path = f"/{pdf_path.replace('\\','/')}"
-        else:
-            proc.pdf_path = None
+        # Las planillas se dibujan al abrir el enlace (ver cache_planillas); las
+        # delta cuyo PDF ya no está en disco no se pueden entregar
+        proc.pdf_path = url_planilla(proc.consecutivo) if planilla_disponible(proc) else None
     return render(request, 'excel_processor/pdf_list.html', {'procesos': procesos})
 
 def manhoms(request):
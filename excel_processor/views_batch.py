@@ -2,53 +2,75 @@
 Vistas para el procesamiento por lotes de PDFs
 """
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_http_methods, require_POST
 from django.http import JsonResponse
 from django.shortcuts import render
+from django.urls import reverse
 from django.core.paginator import Paginator
 from django.conf import settings
-from django.db import models
 from pathlib import Path
 import os
 import datetime
+import hashlib
 import traceback
 
-from .models import PDFProcessHistory
+from .models import PDFBatch, PDFBatchMember
 from .pdf_utils import PDFBatchProcessor
+from .subidas import MAX_ARCHIVO, ErrorSubida, agregar_parte, crear_subida, estado_subida, finalizar_subida
+from .temporales import DIR_TEMP_UPLOADS, FSYNC_TEMPORALES, sincronizar
+from .trabajos import DIR_TRABAJOS, en_segundo_plano, encolar
 
-def handle_uploaded_files(files):
+def _paginar(request, queryset, por_pagina, parametro):
     """
-    Maneja los archivos subidos y los guarda en el directorio temporal.
-    Retorna una lista de las rutas de los archivos guardados.
+    Página de `queryset` indicada por el parámetro GET `parametro`. Agrega a la
+    página `rango` (números con "…" en lugar de la lista completa) y `consulta`
+    (los demás parámetros GET, para conservarlos en los enlaces).
+    """
+    pagina = Paginator(queryset, por_pagina).get_page(request.GET.get(parametro))
+    pagina.rango = pagina.paginator.get_elided_page_range(pagina.number, on_each_side=2, on_ends=1)
+    consulta = request.GET.copy()
+    consulta.pop(parametro, None)
+    pagina.consulta = consulta.urlencode()
+    pagina.parametro = parametro
+    return pagina
+
+def handle_uploaded_files(files, temp_dir=None, hashes=None, durable=False):
+    """
+    Maneja los archivos subidos y los guarda en el directorio temporal
+    (o en temp_dir si se indica). Con durable=True (archivos que esperan en la
+    cola de trabajos) o PDF_TEMP_FSYNC se sincronizan con el disco al final.
+    Los temporales abandonados los borra limpiar_temporales, no cada solicitud.
+
+    `hashes` son los SHA-256 que calculó HashingUploadHandler durante la subida,
+    en el orden de `files`; si no se indican se calculan mientras se guarda cada
+    archivo. Los archivos repetidos (mismo contenido que uno anterior del lote)
+    no se guardan.
+    Retorna (rutas guardadas, sus SHA-256, nombres de los archivos repetidos).
     """
     saved_files = []
-    temp_dir = os.path.join(settings.MEDIA_ROOT, 'temp_uploads')
+    saved_hashes = []
+    duplicados = []
+    if hashes is not None and len(hashes) != len(files):
+        hashes = None
+    temp_dir = temp_dir or DIR_TEMP_UPLOADS
     os.makedirs(temp_dir, exist_ok=True)
     
-    # Limpiar archivos temporales antiguos
-    try:
-        for old_file in os.listdir(temp_dir):
-            file_path = os.path.join(temp_dir, old_file)
-            if os.path.isfile(file_path):
-                file_age = datetime.datetime.now() - datetime.datetime.fromtimestamp(os.path.getmtime(file_path))
-                if file_age.total_seconds() > 3600:  # Más de 1 hora
-                    try:
-                        os.remove(file_path)
-                        print(f"Archivo temporal antiguo eliminado: {file_path}")
-                    except:
-                        pass
-    except Exception as e:
-        print(f"Error al limpiar archivos temporales: {e}")
-    
-    for uploaded_file in files:
+    for i, uploaded_file in enumerate(files):
         try:
             if not uploaded_file.name.lower().endswith('.pdf'):
                 print(f"Archivo ignorado (no es PDF): {uploaded_file.name}")
                 continue
             
             # Validar tamaño del archivo
-            if uploaded_file.size > settings.FILE_UPLOAD_MAX_MEMORY_SIZE:
+            if uploaded_file.size > MAX_ARCHIVO:
                 print(f"Archivo demasiado grande ignorado: {uploaded_file.name}")
                 continue
+
+            sha256 = hashes[i] if hashes else None
+            if sha256 and sha256 in saved_hashes:
+                print(f"Archivo repetido omitido: {uploaded_file.name}")
+                duplicados.append(uploaded_file.name)
+                continue
                 
             timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S_%f')
             safe_name = ''.join(c for c in uploaded_file.name if c.isalnum() or c in '._-')
@@ -59,14 +81,25 @@ def handle_uploaded_files(files):
             
             # Guardar directamente en la ubicación final
             try:
+                hasher = None if sha256 else hashlib.sha256()
                 with open(file_path, 'wb') as dest_file:
                     for chunk in uploaded_file.chunks(chunk_size=1024*1024):  # 1MB chunks
                         dest_file.write(chunk)
-                    dest_file.flush()
-                    os.fsync(dest_file.fileno())  # Asegurar que los datos se escriban en disco
+                        if hasher:
+                            hasher.update(chunk)
+
+                if hasher:
+                    sha256 = hasher.hexdigest()
+                    if sha256 in saved_hashes:
+                        # Sin el hash de la subida solo se sabe que es repetido después de guardarlo
+                        print(f"Archivo repetido omitido: {uploaded_file.name}")
+                        duplicados.append(uploaded_file.name)
+                        os.remove(file_path)
+                        continue
                     
                 if os.path.exists(file_path) and os.path.getsize(file_path) > 0:
                     saved_files.append(file_path)
+                    saved_hashes.append(sha256)
                     print(f"Archivo guardado exitosamente: {file_path}")
             except Exception as e:
                 print(f"Error al guardar archivo {uploaded_file.name}: {str(e)}")
@@ -83,8 +116,64 @@ def handle_uploaded_files(files):
         except Exception as e:
             print(f"Error al guardar archivo {uploaded_file.name}: {str(e)}")
             print(traceback.format_exc())
-            
-    return saved_files
+
+    if durable or FSYNC_TEMPORALES:
+        sincronizar(saved_files)
+    return saved_files, saved_hashes, duplicados
+
+def handle_chunked_uploads(ids, temp_dir=None, durable=False):
+    """
+    Igual que handle_uploaded_files, para archivos ya subidos por partes (ver
+    subidas.py): los mueve al directorio temporal (o a temp_dir) sin copiarlos.
+    Lanza ErrorSubida si alguno no existe o no terminó de subirse.
+    """
+    temp_dir = temp_dir or DIR_TEMP_UPLOADS
+    for subida_id in ids:
+        estado = estado_subida(subida_id)
+        if estado is None:
+            raise ErrorSubida('Una de las subidas no existe o ya se procesó')
+        if not estado['completa']:
+            raise ErrorSubida(f"El archivo {estado['nombre']} no terminó de subirse")
+
+    saved_files = []
+    saved_hashes = []
+    duplicados = []
+    for subida_id in dict.fromkeys(ids):  # El mismo archivo elegido dos veces tiene el mismo id
+        file_path, nombre, sha256 = finalizar_subida(subida_id, temp_dir)
+        if sha256 in saved_hashes:
+            print(f"Archivo repetido omitido: {nombre}")
+            duplicados.append(nombre)
+            os.remove(file_path)
+            continue
+        saved_files.append(file_path)
+        saved_hashes.append(sha256)
+        print(f"Archivo recibido por partes: {file_path}")
+    if durable or FSYNC_TEMPORALES:
+        sincronizar(saved_files)
+    return saved_files, saved_hashes, duplicados
+
+@require_POST
+def crear_subida_pdf(request):
+    """Inicia la subida por partes de un PDF (nombre, tamano)."""
+    try:
+        return JsonResponse(crear_subida(request.POST.get('nombre'), request.POST.get('tamano')), status=201)
+    except ErrorSubida as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+
+@require_http_methods(['GET', 'PUT'])
+def subida_pdf(request, subida_id):
+    """Estado de una subida por partes (GET) o envío de la parte que empieza en ?offset= (PUT)."""
+    try:
+        estado = estado_subida(subida_id)
+        if estado is None:
+            return JsonResponse({'success': False, 'error': 'La subida no existe o ya se procesó'}, status=404)
+        if request.method == 'PUT':
+            estado = agregar_parte(subida_id, request.GET.get('offset'), request, request.META.get('CONTENT_LENGTH'))
+    except ErrorSubida as e:
+        if e.offset is not None:
+            return JsonResponse({'success': False, 'error': str(e), 'offset': e.offset}, status=409)
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    return JsonResponse(estado)
 
 @csrf_exempt
 def pdf_batch_process(request):
@@ -105,12 +194,20 @@ def pdf_batch_process(request):
                 pdf_url = settings.MEDIA_URL + relative_path.replace('\\', '/')
                 return JsonResponse({'success': True, 'url': pdf_url})
             
-            # Procesar la carga de archivos PDF
+            # Procesar la carga de archivos PDF: adjuntos a la solicitud o ya
+            # subidos por partes (subidas[], ver subidas.py)
             print("Procesando carga de archivos PDF")
+            subidas = request.POST.getlist('subidas[]')
             uploaded_files = request.FILES.getlist('pdf_files[]')
-            print(f"Archivos recibidos: {len(uploaded_files)}")
+            print(f"Archivos recibidos: {len(uploaded_files) or len(subidas)}")
             
-            if not uploaded_files:
+            if len(subidas) > settings.DATA_UPLOAD_MAX_NUMBER_FILES:
+                return JsonResponse({
+                    'success': False,
+                    'error': f'Se permite un máximo de {settings.DATA_UPLOAD_MAX_NUMBER_FILES} archivos'
+                })
+
+            if not uploaded_files and not subidas:
                 return JsonResponse({
                     'success': False,
                     'error': 'No se recibieron archivos PDF'
@@ -124,8 +221,22 @@ def pdf_batch_process(request):
                     'error': f'El tamaño total de los archivos ({total_size / (1024*1024):.1f}MB) excede el límite permitido ({settings.DATA_UPLOAD_MAX_MEMORY_SIZE / (1024*1024):.1f}MB)'
                 })
 
-            # Procesar los archivos subidos
-            saved_files = handle_uploaded_files(uploaded_files)
+            # Procesar los archivos subidos. Si se van a procesar en segundo plano se
+            # guardan fuera de temp_uploads para que la limpieza no los borre
+            # mientras esperan en la cola.
+            asincrono = en_segundo_plano(request)
+            if subidas:
+                try:
+                    saved_files, hashes, duplicados = handle_chunked_uploads(
+                        subidas, DIR_TRABAJOS if asincrono else None, durable=asincrono
+                    )
+                except ErrorSubida as e:
+                    return JsonResponse({'success': False, 'error': str(e)})
+            else:
+                saved_files, hashes, duplicados = handle_uploaded_files(
+                    uploaded_files, DIR_TRABAJOS if asincrono else None,
+                    getattr(request, 'upload_hashes', {}).get('pdf_files[]'), durable=asincrono,
+                )
             
             if not saved_files:
                 return JsonResponse({
@@ -133,32 +244,43 @@ def pdf_batch_process(request):
                     'error': 'No se pudo guardar ningún archivo PDF'
                 })
             
+            if asincrono:
+                trabajo = encolar('pdf_lote', rutas=saved_files, hashes=hashes)
+                return JsonResponse({
+                    'success': True,
+                    'trabajo_id': trabajo.id,
+                    'url_estado': reverse('estado_trabajo', args=[trabajo.id]),
+                    'message': f'{len(saved_files)} PDFs en cola para procesar'
+                               + (f' ({len(duplicados)} archivos repetidos omitidos)' if duplicados else ''),
+                    'duplicados': duplicados
+                }, status=202)
+            
             # Procesar los PDFs
             processor = PDFBatchProcessor()
             try:
                 # Crear directorios si no existen
                 output_dir = os.path.join(settings.MEDIA_ROOT, 'combined_pdfs')
                 os.makedirs(output_dir, exist_ok=True)
-                os.makedirs(os.path.join(settings.MEDIA_ROOT, 'temp_uploads'), exist_ok=True)
+                os.makedirs(DIR_TEMP_UPLOADS, exist_ok=True)
                 
                 # Generar nombre único para el archivo combinado
-                timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+                timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S_%f")
                 output_path = os.path.join(output_dir, f'combined_{timestamp}.pdf')
                 
-                result = processor.combine_pdfs(saved_files, output_path)
-                
-                # Limpiar archivos temporales
-                for file_path in saved_files:
-                    try:
-                        if os.path.exists(file_path):
-                            os.remove(file_path)
-                    except Exception as e:
-                        print(f"Error al eliminar archivo temporal {file_path}: {e}")
+                result = processor.combine_pdfs(saved_files, output_path, hashes=hashes)
                 
                 if result:
+                    if processor.reutilizado:
+                        message = f'Este lote ya se había combinado. Archivo: {os.path.basename(result)}'
+                    else:
+                        message = f'PDFs procesados exitosamente. Archivo generado: {os.path.basename(result)}'
+                    if duplicados:
+                        message += f' (se omitieron {len(duplicados)} archivos repetidos: {", ".join(duplicados)})'
                     return JsonResponse({
                         'success': True,
-                        'message': f'PDFs procesados exitosamente. Archivo generado: {os.path.basename(result)}'
+                        'message': message,
+                        'reutilizado': processor.reutilizado,
+                        'duplicados': duplicados
                     })
                 else:
                     return JsonResponse({
@@ -166,7 +288,13 @@ def pdf_batch_process(request):
                         'error': 'Error al procesar los PDFs'
                     })
             finally:
-                processor.cleanup()
+                # Limpiar archivos temporales
+                for file_path in saved_files:
+                    try:
+                        if os.path.exists(file_path):
+                            os.remove(file_path)
+                    except Exception as e:
+                        print(f"Error al eliminar archivo temporal {file_path}: {e}")
                 
         except Exception as e:
             print(f"Error durante el procesamiento: {str(e)}")
@@ -177,26 +305,21 @@ def pdf_batch_process(request):
             })
     
     # Manejar solicitud GET
-    # Obtener solo los PDFs combinados finales (no los individuales)
-    pdfs_generados = PDFProcessHistory.objects.filter(
-        is_batch=True,
-        filepath=models.F('output_path')  # Solo los PDFs que son el resultado de la combinación
-    ).order_by('-process_date')
-
-    # Obtener historial de PDFs procesados con paginación
-    history = PDFProcessHistory.objects.all().order_by('-process_date')
+    # PDFs combinados, los más recientes primero (índice por fecha)
+    pdfs_generados = PDFBatch.objects.order_by('-process_date')
+
+    # Historial de los archivos de cada lote, del lote más reciente al más antiguo
+    # y en su orden dentro del lote (índice por lote y orden)
+    history = PDFBatchMember.objects.select_related('lote').order_by('-lote_id', 'orden')
     
     # Filtrar por nombre de archivo si se especifica
     filename_filter = request.GET.get('filename')
     if filename_filter:
         history = history.filter(filename__icontains=filename_filter)
-    
-    # Paginación
-    paginator = Paginator(history, 50)  # 50 items por página
-    page = request.GET.get('page')
-    history_page = paginator.get_page(page)
 
     return render(request, 'excel_processor/pdf_batch.html', {
-        'history': history_page,
-        'pdfs_generados': pdfs_generados
+        'history': _paginar(request, history, 50, 'page'),
+        'pdfs_generados': _paginar(request, pdfs_generados, 20, 'pagina_pdfs'),
+        'max_archivos': settings.DATA_UPLOAD_MAX_NUMBER_FILES,
+        'max_archivo_mb': MAX_ARCHIVO // (1024 * 1024),
     })
\ No newline at end of file
@@ -1,29 +1,14 @@
 import io
-from reportlab.lib import colors
 from reportlab.lib.pagesizes import landscape, letter
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.platypus.frames import Frame
-from reportlab.pdfgen import canvas
 from django.http import HttpResponse
+from backend.pdf_tabla import TablaPDF
 from .size_utils import sort_sizes
 
 def generate_pdf(production_sheet, context):
     # Crear un buffer para el PDF
     buffer = io.BytesIO()
     
-    # Configurar el documento
-    doc = SimpleDocTemplate(
-        buffer,
-        pagesize=landscape(letter),
-        rightMargin=30,
-        leftMargin=30,
-        topMargin=80,  # Aumentar el margen superior para el encabezado
-        bottomMargin=30
-    )
-    
-    def header_footer(canvas, doc):
+    def header_footer(canvas):
         canvas.saveState()
         width, height = landscape(letter)
         
@@ -44,52 +29,33 @@ def generate_pdf(production_sheet, context):
         
         canvas.restoreState()
     
-    # Contenedor para los elementos del PDF
-    elements = []
-    
-    # Preparar datos para la tabla
     headers = ['OP', 'REF'] + [str(size) for size in context['sizes']] + ['TOTAL']
-    table_data = [headers]
-    
-    for row in context['table_data']:
-        row_data = [row['op'], row['ref']]
-        for size in context['sizes']:
-            row_data.append(str(row.get(size, '-')))
-        row_data.append(str(row['total']))
-        table_data.append(row_data)
     
-    # Agregar fila de totales
+    # Fila de totales al final de la tabla
     totals_row = ['TOTAL GENERAL', '']
     for size in context['sizes']:
         totals_row.append(str(context['size_totals'].get(size, 0)))
     totals_row.append(str(context['grand_total']))
-    table_data.append(totals_row)
     
-    # Crear tabla
-    table = Table(table_data)
+    # OP y REF más largas de toda la planilla: los anchos no dependen solo de las primeras filas
+    longest = [max((str(row[key]) for row in context['table_data']), key=len, default=None)
+               for key in ('op', 'ref')]
     
-    # Estilo de la tabla
-    style = TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 12),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, -1), (-1, -1), colors.grey),
-        ('TEXTCOLOR', (0, -1), (-1, -1), colors.whitesmoke),
-        ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, -1), (-1, -1), 12),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-    ])
-    table.setStyle(style)
-    
-    elements.append(table)
-    
-    # Generar PDF con encabezado en cada página
-    doc.build(elements, onFirstPage=header_footer, onLaterPages=header_footer)
+    # Tabla dibujada página por página, con el encabezado en cada página
+    tabla = TablaPDF(
+        buffer,
+        headers,
+        pagesize=landscape(letter),
+        margenes=(30, 30, 80, 30),  # Margen superior amplio para el encabezado
+        pie=totals_row,
+        al_iniciar_pagina=header_footer,
+        mas_largos=longest + [None] * (len(headers) - 2)
+    )
+    tabla.agregar_filas(
+        [row['op'], row['ref']] + [row.get(size, '-') for size in context['sizes']] + [row['total']]
+        for row in context['table_data']
+    )
+    tabla.cerrar()
     
     # Obtener el valor del buffer
     pdf = buffer.getvalue()